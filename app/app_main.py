@@ -1,6 +1,10 @@
 import streamlit as st
 import os
-import streamlit as st
+
+# モデルのウォームアップ（WARMUP_MODELS=1 のときだけ。プロセスで1回バックグラウンドでロード）
+if os.environ.get("WARMUP_MODELS") == "1":
+    from model_registry import start_warmup  # torchを読むので、ウォームアップするときだけimportする
+    start_warmup()
 
 # PW設定
 PASSWORD = os.environ.get("APP_PASSWORD")
@@ -8,7 +12,6 @@ pw = st.text_input("パスワードを入力してください", type="password"
 if pw != PASSWORD:
     st.stop()
 
-
 pages = {
     "Japanese Text Analyzer": [
         st.Page("app_home.py", title="Top Page"),
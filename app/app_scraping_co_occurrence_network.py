@@ -1,6 +1,16 @@
 import streamlit as st
-from scraping_co_occurrence_network import (make_search_url, get_search_results, get_article_data,
-morph_for_cooccurrence, make_word_pairs, plot_cooccurrence_network)
+import streamlit.components.v1 as components
+from scraping_co_occurrence_network import make_search_url, get_search_results, stream_cooccurrence, plot_cooccurrence_network, cooccurrence_network_json
+from network_view import render_network_html
+from cooccurrence_engine import rank_pairs
+from article_fetcher import ArticleFetcher
+from article_store import get_article_store
+from job_queue import get_scheduler
+from job_ui import submit_job, poll_job, profile_option, show_metrics
+from instrumentation import track_run
+from functools import partial
+import pandas as pd
+import datetime, io
 
 # ページタイトル
 st.title("Co-occurrence Network")
@@ -9,26 +19,132 @@ st.write("PR TIMESの記事からキーワードの共起関係を抽出し、
 # ===== PR TIMESの検索KW入力 =====
 keyword = st.text_input("キーワードを半角スペース区切りで入力")
 
+# ===== 記事取得の設定 =====
+with st.expander("記事取得の設定"):
+    max_pages = st.number_input("検索結果のページ数（1ページ40記事）", min_value=1, max_value=50, value=2)
+    requests_per_second = st.number_input("1秒あたりのリクエスト数", min_value=0.1, max_value=10.0, value=2.0, step=0.5)
+    concurrency = st.number_input("並列数", min_value=1, max_value=16, value=4)
+    max_age_days = st.number_input("保存済み記事を取り直すまでの日数", min_value=0.0, value=30.0, step=1.0)
+    refresh_every = st.number_input("ネットワークを更新する間隔（記事数）", min_value=1, max_value=100, value=10)
+
+# ===== 共起の単位 =====
+unit_label = st.radio("共起の単位", ["記事", "文", "k語ウィンドウ"], horizontal=True)
+window = None
+if unit_label == "k語ウィンドウ":
+    window = st.number_input("ウィンドウ幅（語）", min_value=2, max_value=50, value=5)
+
+# ===== ペアの順位付け =====
+measure_labels = {"共起回数": "count", "PMI": "pmi", "NPMI": "npmi", "Jaccard": "jaccard", "Dice": "dice"}
+measure = measure_labels[st.selectbox("ペアの順位付けに使う指標", list(measure_labels))]
+min_count = st.number_input("最低共起回数", min_value=1, value=2 if measure != "count" else 1)
+min_word_count = st.number_input("単語の最低出現数", min_value=1, value=3 if measure != "count" else 1)
+
+# ===== ネットワークの設定 =====
+with st.expander("ネットワークの設定"):
+    top_n = st.number_input("描画するペア数", min_value=10, max_value=10000, value=200, step=100)
+    layout_labels = {"spring（標準）": "spring", "スペクトル初期化＋高速力学モデル（大規模向け）": "spectral"}
+    layout = layout_labels[st.selectbox("レイアウト", list(layout_labels))]
+    k_core = st.number_input("k-core（次数k未満のノードを除外、1で無効）", min_value=1, max_value=20, value=1)
+    render_mode = st.radio("描画方式", ["ブラウザ（ズーム・絞り込み・ホバー）", "画像（matplotlib）"], horizontal=True)
+
 # ===== スクレイピング =====
-if st.button("実行"):
-    with st.spinner("作成中..."):
-        # 一覧結果のURL作成
-        search_url = make_search_url(keyword)
+# 取得と集計はサーバー側のジョブで動かす（ページが再実行されても続き、同じ日・同じ設定なら結果を使い回す）
+def run_cooccurrence_job(context, keyword: str, max_pages: int, requests_per_second: float, concurrency: int,
+                         max_age_days: float, refresh_every: int, unit: str, window: int | None, measure: str,
+                         top_n: int, min_count: int, min_word_count: int, date: str):
+    # 一覧結果のURL作成
+    search_url = make_search_url(keyword)
+
+    # 検索結果一覧から会社名と記事URLを取得
+    fetcher = ArticleFetcher(requests_per_second=requests_per_second, concurrency=concurrency)
+    try:
+        context.report(message="検索結果を取得中")
+        articles_list_df = get_search_results(search_url, max_pages=max_pages, fetcher=fetcher)
+
+        # キーワードごとの記事一覧を記録（検索できなかったときは前回までの一覧を使う）
+        store = get_article_store()
+        if len(articles_list_df) > 0:
+            store.add_keyword_results(keyword, list(articles_list_df.itertuples(index=False, name=None)))
+        else:
+            articles_list_df = pd.DataFrame(store.keyword_results(keyword), columns=["company_name", "url"])
 
-        # 検索結果一覧から会社名と記事URLを取得
-        articles_list_df = get_search_results(search_url)
+        # 記事が届くたびに形態素解析・共起の集計を進め、refresh_every件ごとに上位のペアを途中結果として報告（保存済みの記事は取得しない）
+        articles, top200 = [], []
+        for articles, accumulator in stream_cooccurrence(
+            articles_list_df, fetcher, store=store, max_age_days=max_age_days, unit=unit, window=window,
+            refresh_every=refresh_every
+        ):
+            # 単語同士のペアを作成してTOP200を抽出
+            top200 = rank_pairs(accumulator.snapshot(), measure, top_n, min_count, min_word_count)
+            context.report(len(articles) / max(len(articles_list_df), 1),
+                           f"{len(articles)} / {len(articles_list_df)} 記事を集計済み", preview=(len(articles), top200))
+        return {"articles": articles, "top200": top200, "latency": {**fetcher.latency_stats(), "stored": store.stats()}}
+    finally:
+        fetcher.close()
 
-        # 検索結果一覧から取得したlinkから記事本文を取得してデータフレームで表示
-        articles_detail_df = get_article_data(articles_list_df)
-        st.dataframe(articles_detail_df, use_container_width=True)
 
-        # 形態素解析
-        all_tokens = morph_for_cooccurrence(articles_detail_df)
+# 共起ネットワーク描画（更新のたびに前回の配置を使い回す）。画像ならPNG、ブラウザ描画ならHTMLを返す
+def render_network(top200) -> tuple[str, bytes | str]:
+    if render_mode == "画像（matplotlib）":
+        import matplotlib.pyplot as plt  # 画像で描画したときだけ（plot_cooccurrence_networkの中でimport済み）
+        fig = plot_cooccurrence_network(top200, measure=measure, layout=layout, k_core=int(k_core),
+                                        layout_key=(keyword, unit_label, measure))
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format="png", bbox_inches="tight")
+        plt.close(fig)
+        return "image", buffer.getvalue()
+    # 配置まで計算したJSONを渡して、描画・ズーム・絞り込み・ホバーはブラウザ側に任せる
+    graph_json = cooccurrence_network_json(top200, measure=measure, layout=layout, k_core=int(k_core),
+                                           layout_key=(keyword, unit_label, measure))
+    return "html", render_network_html(graph_json)
+
+
+def show_network(rendered: tuple[str, bytes | str]):
+    kind, content = rendered
+    if kind == "image":
+        st.image(content)
+    else:
+        components.html(content, height=700)
+
+
+# 途中経過の描画。進捗の表示は1秒ごとに再実行されるので、記事数か描画の設定が変わったときだけ描き直し、
+# それ以外は前回の画像・HTMLをそのまま出す（同じHTMLならiframeは読み直されず、ズーム・パンもそのまま）
+def show_network_preview(preview):
+    n_articles, top200 = preview
+    key = (st.session_state.get("cooccurrence_job"), n_articles, render_mode, measure, layout, int(k_core))
+    cached = st.session_state.get("cooccurrence_preview")
+    if cached is None or cached[0] != key:
+        cached = (key, render_network(top200))
+        st.session_state["cooccurrence_preview"] = cached
+    show_network(cached[1])
+
+
+profile = profile_option()
+if st.button("実行"):
+    settings = dict(
+        keyword=keyword, max_pages=int(max_pages), requests_per_second=float(requests_per_second),
+        concurrency=int(concurrency), max_age_days=float(max_age_days), refresh_every=int(refresh_every),
+        unit="sentence" if unit_label == "文" else "document", window=int(window) if window else None,
+        measure=measure, top_n=int(top_n), min_count=int(min_count), min_word_count=int(min_word_count),
+        date=datetime.date.today().isoformat(),  # 記事は日々増えるので、結果の使い回しは同じ日のうちだけ
+    )
+    submit_job("cooccurrence_job", "cooccurrence", partial(run_cooccurrence_job, **settings),
+               tuple(settings.values()), profile=profile)
 
-        # 単語同士のペアを作成してTOP200を抽出
-        top200 = make_word_pairs(all_tokens)
+job = poll_job("cooccurrence_job", render_preview=show_network_preview)
+if job is not None:
+    st.session_state.pop("cooccurrence_preview", None)  # 途中経過の描画はもう使わない
+    # 配置の計算と描画はページの再実行ごとに行うので、その時間はジョブとは別に計る
+    with track_run("cooccurrence_render") as render_run:
+        show_network(render_network(job.result["top200"]))
 
-        # 共起ネットワーク描画
-        fig = plot_cooccurrence_network(top200)
-        st.pyplot(fig)
-    st.success("完了しました！")
\ No newline at end of file
+    # 記事一覧をデータフレームで表示
+    articles_detail_df = pd.DataFrame(job.result["articles"], columns=["company_name", "title", "main_text", "url"])
+    st.dataframe(articles_detail_df, use_container_width=True)
+    if job.metrics is not None and job.metrics.counters.get("search_selenium_fallbacks"):
+        st.warning("検索結果をHTTPで取得できなかったので、ブラウザ（Selenium）で取得しました。"
+                   "ページ送りのパラメータ（PRTIMES_PAGE_PARAM）が変わっていないか確認してください。")
+    with st.expander("記事取得のレイテンシ"):
+        st.json({**job.result["latency"], "jobs": get_scheduler().stats()})
+    show_metrics(job.metrics, render_run)
+    st.success("完了しました！")
@@ -1,6 +1,12 @@
 import streamlit as st
 import pandas as pd
-from sentiment_analysis import sentiment_analysis
+from sentiment_analysis import sentiment_analysis_stream, sentiment_analysis_chunked
+from model_registry import model_stats, parity_check, BACKENDS, DEFAULT_BACKEND, SENTIMENT_MODEL
+from csv_stream import read_csv_preview, iter_text_chunks, read_progress
+from job_queue import get_scheduler, file_digest
+from job_ui import submit_job, poll_job, profile_option, show_metrics
+from functools import partial
+import io
  
 # ページタイトル
 st.title("Sentiment Analysis")
@@ -9,8 +15,8 @@ st.write("CSV内のテキストを感情分析し、Positive/Neutral/Negative 
 # ===== データ読み込み & プレビュー =====
 uploaded_file = st.file_uploader("CSVファイルをアップロードしてください。", type=["csv"])
 if uploaded_file is not None:
-    df_sentiment = pd.read_csv(uploaded_file)
-    st.success(f"ファイルが正常にアップロードされました。データ行数: {len(df_sentiment)}")
+    df_sentiment = read_csv_preview(uploaded_file)  # 先頭チャンクだけ読む（本体は実行時にチャンクごとに読む）
+    st.success(f"ファイルが正常にアップロードされました。ファイルサイズ: {uploaded_file.size / 1024 / 1024:.1f} MB")
     
     # データのプレビュー
     st.subheader("データプレビュー")
@@ -20,17 +26,69 @@ if uploaded_file is not None:
     st.subheader("テキスト設定")
     selected_col = st.selectbox("分析する.csvの列名を選択", df_sentiment.columns)
 
+    # バッチサイズ（文字数の近いテキストを何件ずつまとめて推論するか）
+    batch_size = st.number_input("バッチサイズ", min_value=1, max_value=512, value=32, step=8)
+
+    # 推論バックエンド（fp32：そのまま / int8：動的量子化 / onnx：ONNX Runtime。初回はONNXへの書き出しに時間がかかる）
+    backend = st.selectbox("推論バックエンド", BACKENDS, index=BACKENDS.index(DEFAULT_BACKEND),
+                           help=None if "onnx" in BACKENDS else "onnxを使うには pip install optimum[onnxruntime] が必要です。")
+
+    # 長文の扱い（512トークンで切り詰め / スライディングウィンドウで全文を読む）
+    long_text_mode = st.radio("長文の扱い", ["512トークンで切り詰め", "スライディングウィンドウ（全文）"], horizontal=True)
+    if long_text_mode == "スライディングウィンドウ（全文）":
+        aggregation_labels = {"平均": "mean", "最大": "max", "トークン数で重み付け": "weighted"}
+        aggregation = aggregation_labels[st.selectbox("ウィンドウのスコアのまとめ方", list(aggregation_labels))]
+        stride = st.number_input("ウィンドウのずらし幅（トークン）", min_value=64, max_value=510, value=384, step=32)
+        max_windows = st.number_input("ウィンドウ数の上限（読み込みチャンクごとの合計）", min_value=1, value=50_000, step=1000,
+                                      help="長い文書のウィンドウは等間隔に間引きます。チャンクの文書数より小さいと、上限を超えた文書はスコアなし（空欄）になります。")
+
 else:
     st.warning("CSVファイルをアップロードしてください。")
     st.stop()
 
 # ===== ポジネガ分類 =====
+# 分析はサーバー側のジョブで動かす（ページが再実行されても続き、結果は同じ入力・設定なら使い回す）
+# window_options：スライディングウィンドウの設定（Noneなら512トークンで切り詰め）
+def run_sentiment_job(context, file_bytes: bytes, column: str, batch_size: int, backend: str,
+                      window_options: dict | None):
+    # 選択された列だけをチャンクごとに読み込み（欠損値行削除、文字列に）、終わったバッチから順に進捗と途中結果を報告
+    file = io.BytesIO(file_bytes)
+    batches = []
+    offset = 0  # これまでのチャンクの行数（元の行番号にするため）
+    for input_texts in iter_text_chunks(file, column):
+        if window_options is not None:
+            df_chunk = sentiment_analysis_chunked(input_texts, batch_size=batch_size, backend=backend, **window_options)
+            df_chunk.index = df_chunk.index + offset
+            batches.append(df_chunk)
+            context.report(preview=df_chunk)
+        else:
+            for done, df_batch in sentiment_analysis_stream(input_texts, batch_size=batch_size, backend=backend):
+                df_batch.index = df_batch.index + offset
+                batches.append(df_batch)
+                context.report(read_progress(file), f"{offset + done}件", preview=df_batch)  # 今終わったバッチの行
+        offset += len(input_texts)
+        context.report(read_progress(file), f"{offset}件")
+    return pd.concat(batches).sort_index() if batches else None  # 元の行順に戻す
+
+profile = profile_option()
 if st.button("実行"):
-    with st.spinner("作成中..."):
-        # 選択された列をリスト化（欠損値行削除、文字列に）
-        input_texts = df_sentiment[selected_col].dropna().astype(str).tolist()
-        # 推論
-        sentiment_analysis_data = sentiment_analysis(input_texts)
+    window_options = None
+    if long_text_mode == "スライディングウィンドウ（全文）":
+        window_options = {"aggregation": aggregation, "stride": int(stride), "max_windows": int(max_windows)}
+    # アップロードされたファイルはページの再実行で変わるので、中身と設定をジョブに渡す
+    # getvalue()はアップロードされたファイルのバッファそのもの（コピーしない）で、ジョブが終われば手放す。
+    # 結果のキャッシュのキーには中身ではなくハッシュを使う
+    settings = dict(column=selected_col, batch_size=int(batch_size), backend=backend, window_options=window_options)
+    submit_job("sentiment_job", "sentiment", partial(run_sentiment_job, file_bytes=uploaded_file.getvalue(), **settings),
+               (file_digest(uploaded_file), *settings.values()), heavy=True, profile=profile)
+
+job = poll_job("sentiment_job", render_preview=st.dataframe)
+if job is not None:
+    sentiment_analysis_data = job.result
+    if sentiment_analysis_data is not None:
+        unscored = int(sentiment_analysis_data.drop(columns="text").isna().all(axis=1).sum())
+        if unscored:
+            st.warning(f"{unscored}件の文書はウィンドウ数の上限を超えたため分類していません。上限を増やしてください。")
         # 画面にデータフレームを表示
         st.dataframe(sentiment_analysis_data.head())
         
@@ -41,4 +99,28 @@ if st.button("実行"):
             file_name="output_sentiment_analysis.csv", # ダウンロードされるファイル名
             mime="text/csv" # ファイルのMIMEタイプを指定
         )
-    st.success("完了しました！")
\ No newline at end of file
+
+    # ロード済みモデルの情報（ロード時間、メモリ使用量）とジョブの状況
+    with st.expander("ロード済みモデル"):
+        st.dataframe(pd.DataFrame(model_stats()), use_container_width=True)
+        st.json({"jobs": get_scheduler().stats()})
+    show_metrics(job.metrics)
+    st.success("完了しました！")
+
+# ===== バックエンドの一致確認（先頭の数行で、fp32とのラベル確率の差と処理時間を比べる） =====
+def run_parity_job(context, texts: list[str], tolerance: float):
+    context.report(message=f"{len(texts)}件を各バックエンドで推論中")
+    return pd.DataFrame(parity_check("sentiment-analysis", SENTIMENT_MODEL, texts, tolerance=tolerance))
+
+with st.expander("推論バックエンドの比較"):
+    parity_size = st.number_input("比較に使う行数（先頭から）", min_value=1, max_value=2000, value=100)
+    tolerance = st.number_input("許容する確率の差", min_value=0.0, max_value=1.0, value=0.02, step=0.01)
+    if st.button("比較する"):
+        # 全バックエンドのモデルをロードして推論するので、分析と同じくジョブで動かす
+        settings = dict(texts=df_sentiment[selected_col].dropna().astype(str).tolist()[:int(parity_size)],
+                        tolerance=float(tolerance))
+        submit_job("parity_job", "parity_check", partial(run_parity_job, **settings), tuple(settings.values()),
+                   heavy=True)
+    parity_job = poll_job("parity_job")
+    if parity_job is not None:
+        st.dataframe(parity_job.result, use_container_width=True)
@@ -1,7 +1,12 @@
 import streamlit as st
 import re
-import pandas as pd
-from wordfrequency_wordcloud import list_matplotlib_colors, morph_for_freq_wordcloud, plot_word_frequency, counter_df, make_wordcloud
+from wordfrequency_wordcloud import list_matplotlib_colors, morph_chunks_for_freq_wordcloud, plot_word_frequency, counter_df, wordcloud_image, wordcloud_ready
+from csv_stream import read_csv_preview, iter_text_chunks, read_progress
+from job_queue import file_digest
+from job_ui import submit_job, poll_job, profile_option, show_metrics
+from instrumentation import track_run, stage
+from functools import partial
+import io
 
 # ページタイトル
 st.title("Word Frequency & Word Cloud")
@@ -10,8 +15,8 @@ st.write("CSV内のテキストを形態素解析して単語頻度を集計し
 # ===== データ読み込み & プレビュー =====
 uploaded_file = st.file_uploader("CSVファイルをアップロードしてください。", type=["csv"])
 if uploaded_file is not None:
-    df_wf = pd.read_csv(uploaded_file)
-    st.success(f"ファイルが正常にアップロードされました。データ行数: {len(df_wf)}")
+    df_wf = read_csv_preview(uploaded_file)  # 先頭チャンクだけ読む（本体は実行時にチャンクごとに読む）
+    st.success(f"ファイルが正常にアップロードされました。ファイルサイズ: {uploaded_file.size / 1024 / 1024:.1f} MB")
     
     # データのプレビュー
     st.subheader("データプレビュー")
@@ -34,22 +39,69 @@ else:
     st.stop()
 
 # ===== 分析処理 =====
+# 形態素解析はサーバー側のジョブで動かし、job_idをsession_stateに残す（カラーマップを変えても形態素解析はやり直さない）
+def run_wordfreq_job(context, file_bytes: bytes, column: str, stopwords: list[str]):
+    file = io.BytesIO(file_bytes)
+
+    # 選択列だけをチャンクごとに読み込んで形態素解析へ（1チャンク終わるごとに進捗を報告）
+    def text_chunks():
+        n_done = 0
+        for texts in iter_text_chunks(file, column):
+            yield texts
+            n_done += len(texts)
+            context.report(read_progress(file), f"{n_done}件")
+
+    return morph_chunks_for_freq_wordcloud(text_chunks(), stopwords)
+
+# ワードクラウドの配置もジョブで作る。先に縮小版を途中経過として出しておき、本番サイズができたら差し替える
+def run_wordcloud_job(context, corpus, color: str):
+    with stage("wordcloud_preview"):
+        context.report(0.3, "縮小版", preview=wordcloud_image(corpus, color, preview=True))
+    with stage("wordcloud"):
+        return wordcloud_image(corpus, color)
+
+# ファイル・列・ストップワードが変わったら前回の結果は出さない
+result_key = (uploaded_file.name, uploaded_file.size, selected_col, input_stopwords)
+profile = profile_option()
 if st.button("実行"):
-    with st.spinner("作成中..."):
-        # データクレンジング,、形態素解析
-        all_tokens_flattened = morph_for_freq_wordcloud(df_wf, selected_col, free_stopwords)
+    # getvalue()はアップロードされたファイルのバッファそのもの（コピーしない）で、ジョブが終われば手放す。
+    # 結果のキャッシュのキーには中身ではなくハッシュを使う
+    settings = dict(column=selected_col, stopwords=free_stopwords)
+    submit_job("wordfreq_job", "wordfreq", partial(run_wordfreq_job, file_bytes=uploaded_file.getvalue(), **settings),
+               (file_digest(uploaded_file), *settings.values()), profile=profile)
+    st.session_state["wordfreq_job_key"] = result_key
+
+job = poll_job("wordfreq_job") if st.session_state.get("wordfreq_job_key") == result_key else None
+if job is not None:
+    corpus = job.result
+    st.success("完了しました！")
 
+    # グラフとワードクラウドはページの再実行ごとに描くので、その時間はジョブとは別に計る
+    with track_run("wordfreq_render") as render_run:
         # 単語頻度グラフ
         st.subheader("単語頻度グラフ")
-        fig = plot_word_frequency(all_tokens_flattened, selected_color)
-        st.pyplot(fig)
+        with stage("bar_chart"):
+            fig = plot_word_frequency(corpus, selected_color)
+            st.pyplot(fig)
 
         # データフレームの表示
-        df_top30 = counter_df(all_tokens_flattened)
+        df_top30 = counter_df(corpus)
         st.dataframe(df_top30, use_container_width=True)
 
-        # ワードクラウド生成
+        # ワードクラウド生成（配置があれば色を塗り直すだけなのでその場で描く。なければジョブで作り、縮小版を先に出す）
         st.subheader("ワードクラウド")
-        fig_wc = make_wordcloud(all_tokens_flattened, selected_color)
-        st.pyplot(fig_wc)
-    st.success("完了しました！")
\ No newline at end of file
+        wordcloud_job = None
+        if wordcloud_ready(corpus):
+            with stage("wordcloud"):
+                st.image(wordcloud_image(corpus, selected_color), use_container_width=True)
+        else:
+            wordcloud_key = (job.key, selected_color)
+            if st.session_state.get("wordcloud_job_key") != wordcloud_key:
+                submit_job("wordcloud_job", "wordcloud", partial(run_wordcloud_job, corpus=corpus, color=selected_color),
+                           wordcloud_key)
+                st.session_state["wordcloud_job_key"] = wordcloud_key
+            wordcloud_job = poll_job("wordcloud_job",
+                                     render_preview=lambda image: st.image(image, use_container_width=True))
+            if wordcloud_job is not None:
+                st.image(wordcloud_job.result, use_container_width=True)
+    show_metrics(job.metrics, wordcloud_job.metrics if wordcloud_job is not None else None, render_run)
@@ -1,7 +1,12 @@
 import streamlit as st
 import pandas as pd
-from zero_shot_classification import zero_shot_classification
-import re
+from zero_shot_classification import zero_shot_classification, compare_modes, hypothesis_cache
+from model_registry import model_stats, BACKENDS, DEFAULT_BACKEND
+from csv_stream import read_csv_preview, iter_text_chunks, read_progress
+from job_queue import get_scheduler, file_digest
+from job_ui import submit_job, poll_job, profile_option, show_metrics
+from functools import partial
+import io, re
  
 # ページタイトル
 st.title("Topic Classification")
@@ -10,8 +15,8 @@ st.write("CSV内のテキストをZero-shotで分類し、各トピックに対
 # ===== データ読み込み & プレビュー =====
 uploaded_file = st.file_uploader("CSVファイルをアップロードしてください。", type=["csv"])
 if uploaded_file is not None:
-    df_topic = pd.read_csv(uploaded_file)
-    st.success(f"ファイルが正常にアップロードされました。データ行数: {len(df_topic)}")
+    df_topic = read_csv_preview(uploaded_file)  # 先頭チャンクだけ読む（本体は実行時にチャンクごとに読む）
+    st.success(f"ファイルが正常にアップロードされました。ファイルサイズ: {uploaded_file.size / 1024 / 1024:.1f} MB")
     
     # データのプレビュー
     st.subheader("データプレビュー")
@@ -28,26 +33,96 @@ if uploaded_file is not None:
     )
     colcategories = re.split(r"[, 　]+", input_colcategories)  # カンマ、半角/全角スペースで分割してリストに変換
 
+    # バッチサイズ（テキスト×トピックのペアを何組ずつまとめて推論するか）
+    batch_size = st.number_input("バッチサイズ", min_value=1, max_value=512, value=32, step=8)
+
+    # 推論バックエンド（fp32：そのまま / int8：動的量子化 / onnx：ONNX Runtime。onnxは高速モードの埋め込みには使えない）
+    backend = st.selectbox("推論バックエンド", BACKENDS, index=BACKENDS.index(DEFAULT_BACKEND),
+                           help=None if "onnx" in BACKENDS else "onnxを使うには pip install optimum[onnxruntime] が必要です。")
+
+    # 推論モード（高速モードはカテゴリの埋め込みをキャッシュして、テキストとの類似度を行列積1回で計算）
+    mode_labels = {
+        "厳密（全ペアをNLIで推論）": "exact",
+        "高速（埋め込みの類似度）": "embedding",
+        "高速＋上位k件だけNLIで再計算": "rerank",
+    }
+    mode = mode_labels[st.radio(
+        "推論モード", list(mode_labels),
+        help="高速モードの埋め込みは、NLI用のモデルのエンコーダーの[CLS]ベクトルです。文の埋め込みとして学習したものではないので、"
+             "類似度は確率ではなく目安です（精度が必要なら厳密モードか、上位k件の再計算を使ってください）。",
+    )]
+    top_k = 3
+    if mode == "rerank":
+        top_k = st.number_input("NLIで再計算するカテゴリ数（k）", min_value=1, max_value=20, value=3)
+
 else:
     st.warning("CSVファイルをアップロードしてください。")
     st.stop()
 
 # ===== ゼロショット分類 =====
+# 分析はサーバー側のジョブで動かす（ページが再実行されても続き、結果は同じ入力・設定なら使い回す）
+def run_zero_shot_job(context, file_bytes: bytes, column: str, categories: list[str], batch_size: int, mode: str,
+                      top_k: int, backend: str):
+    # 選択された列だけをチャンクごとに読み込み（欠損値行削除、文字列に）、チャンクごとに推論
+    file = io.BytesIO(file_bytes)
+    chunk_results = []
+    n_done = 0
+    for input_texts in iter_text_chunks(file, column):
+        df_chunk = zero_shot_classification(input_texts, categories, batch_size=batch_size, mode=mode, top_k=top_k,
+                                            backend=backend)
+        chunk_results.append(df_chunk)
+        n_done += len(input_texts)
+        context.report(read_progress(file), f"{n_done}件", preview=df_chunk.head())
+    return pd.concat(chunk_results, ignore_index=True) if chunk_results else pd.DataFrame()
+
+profile = profile_option()
 if st.button("実行"):
-    with st.spinner("作成中..."):
-        # 選択された列をリスト化（欠損値行削除、文字列に）
-        input_texts = df_topic[selected_col].dropna().astype(str).tolist()
-        # 推論
-        topic_classification_data = zero_shot_classification(input_texts, colcategories)
-        # 画面にデータフレームを表示
-        st.dataframe(topic_classification_data.head())
-        
-        # CSVファイル出力
-        st.download_button(
-            label = "CSVファイルをダウンロード",
-            data= topic_classification_data.to_csv().encode(),  # CSV形式の文字列に変換しバイト列にエンコード
-            file_name="output_topic_classification.csv", # ダウンロードされるファイル名
-            mime="text/csv" # ファイルのMIMEタイプを指定
-        )
-    st.snow()
-    st.success("完了しました！")
\ No newline at end of file
+    # アップロードされたファイルはページの再実行で変わるので、中身と設定をジョブに渡す
+    # getvalue()はアップロードされたファイルのバッファそのもの（コピーしない）で、ジョブが終われば手放す。
+    # 結果のキャッシュのキーには中身ではなくハッシュを使う
+    settings = dict(column=selected_col, categories=colcategories, batch_size=int(batch_size), mode=mode,
+                    top_k=int(top_k), backend=backend)
+    submit_job("zero_shot_job", "zero_shot", partial(run_zero_shot_job, file_bytes=uploaded_file.getvalue(), **settings),
+               (file_digest(uploaded_file), *settings.values()), heavy=True, profile=profile)
+
+job = poll_job("zero_shot_job", render_preview=st.dataframe)
+if job is not None:
+    topic_classification_data = job.result
+    # 画面にデータフレームを表示
+    st.dataframe(topic_classification_data.head())
+    
+    # CSVファイル出力
+    st.download_button(
+        label = "CSVファイルをダウンロード",
+        data= topic_classification_data.to_csv().encode(),  # CSV形式の文字列に変換しバイト列にエンコード
+        file_name="output_topic_classification.csv", # ダウンロードされるファイル名
+        mime="text/csv" # ファイルのMIMEタイプを指定
+    )
+
+    # ロード済みモデルの情報（ロード時間、メモリ使用量）とジョブの状況
+    with st.expander("ロード済みモデル"):
+        st.dataframe(pd.DataFrame(model_stats()), use_container_width=True)
+        st.json({"hypothesis_cache": hypothesis_cache.stats(), "jobs": get_scheduler().stats()})
+    show_metrics(job.metrics)
+    if st.session_state.get("zero_shot_snow") != job.job_id:  # 雪は終わった直後の1回だけ
+        st.session_state["zero_shot_snow"] = job.job_id
+        st.snow()
+    st.success("完了しました！")
+
+# ===== 高速モードと厳密モードの比較（先頭の数行で処理時間と1位の一致率を測る） =====
+def run_compare_job(context, texts: list[str], categories: list[str], batch_size: int, top_k: int, backend: str):
+    context.report(message=f"{len(texts)}件を各モードで推論中")
+    return compare_modes(texts, categories, batch_size=batch_size, top_k=top_k, backend=backend)
+
+with st.expander("高速モードと厳密モードの比較"):
+    sample_size = st.number_input("比較に使う行数（先頭から）", min_value=1, max_value=2000, value=100)
+    compare_k = st.number_input("上位k件", min_value=1, max_value=20, value=3, key="compare_k")
+    if st.button("比較する"):
+        # 全モードで推論するので、分析と同じくジョブで動かす
+        settings = dict(texts=df_topic[selected_col].dropna().astype(str).tolist()[:int(sample_size)],
+                        categories=colcategories, batch_size=int(batch_size), top_k=int(compare_k), backend=backend)
+        submit_job("compare_job", "compare_modes", partial(run_compare_job, **settings), tuple(settings.values()),
+                   heavy=True)
+    compare_job = poll_job("compare_job")
+    if compare_job is not None:
+        st.dataframe(compare_job.result, use_container_width=True)
@@ -0,0 +1,122 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from instrumentation import stage, count, in_current_context
+import requests, threading, time
+
+HEADERS = {"User-Agent": "Mozilla/5.0"}  # サーバーに「ブラウザですよ」と伝える。（requestsの時に必要）
+RETRY_STATUS = {429, 500, 502, 503, 504}  # リトライするステータスコード
+MAX_BACKOFF = 30.0  # リトライ前に待つ最長の秒数（Retry-Afterがこれより長くても、ここで打ち切る）
+
+
+# ===== トークンバケット方式のレート制限（1秒あたりrate回、最大capacity回まで連続OK） =====
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float = 1.0):
+        if rate <= 0:
+            raise ValueError(f"rate must be positive: {rate}")
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate  # 1回分たまるまでの時間
+            time.sleep(wait)
+
+
+# ===== 接続を使い回しながら、並列・レート制限・リトライ付きでページを取得 =====
+class ArticleFetcher:
+    def __init__(self, requests_per_second: float = 2.0, concurrency: int = 4, max_retries: int = 3,
+                 backoff: float = 1.0, timeout: float = 10.0, headers: dict = HEADERS,
+                 max_backoff: float = MAX_BACKOFF):
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.bucket = TokenBucket(requests_per_second, capacity=concurrency)
+
+        # keep-aliveで同じホストへの接続を使い回す（並列数分の接続をプール）
+        self.session = requests.Session()
+        self.session.headers.update(headers)
+        adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.latencies = []  # リクエストごとの記録 {"url", "status", "seconds", "attempts", "bytes"}
+        self._latency_lock = threading.Lock()
+
+    # 1ページ取得（429/5xx・通信エラーは指数バックオフでリトライ。Retry-Afterがあればそれに従う）
+    # どちらの待ち時間もmax_backoffで打ち切る（おかしなRetry-Afterで取得のスレッドとジョブが何時間も止まらないように）
+    def fetch(self, url: str) -> requests.Response:
+        with stage("fetch"):
+            for attempt in range(self.max_retries + 1):
+                with stage("rate_limit_wait"):
+                    self.bucket.acquire()
+                start = time.perf_counter()
+                count("requests")
+                try:
+                    response = self.session.get(url, timeout=self.timeout)
+                except requests.RequestException:
+                    if attempt == self.max_retries:
+                        raise
+                    with stage("retry_sleep"):
+                        time.sleep(min(self.backoff * 2 ** attempt, self.max_backoff))
+                    continue
+                seconds = time.perf_counter() - start
+                with self._latency_lock:
+                    self.latencies.append({"url": url, "status": response.status_code, "seconds": seconds,
+                                           "attempts": attempt + 1, "bytes": len(response.content)})
+                count("bytes_fetched", len(response.content))
+
+                if response.status_code in RETRY_STATUS and attempt < self.max_retries:
+                    retry_after = response.headers.get("Retry-After", "")
+                    wait = float(retry_after) if retry_after.isdigit() else self.backoff * 2 ** attempt
+                    with stage("retry_sleep"):
+                        time.sleep(min(wait, self.max_backoff))
+                    continue
+                response.raise_for_status()
+                return response
+
+    # 複数URLを並列に取得し、終わった順に (url, response または例外) を返す
+    def fetch_all(self, urls: list[str]):
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            fetch = in_current_context(self.fetch)  # スレッドで取得しても、取得バイト数などは今の実行に記録する
+            futures = {executor.submit(fetch, url): url for url in urls}
+            for future in as_completed(futures):
+                url = futures[future]
+                try:
+                    yield url, future.result()
+                except Exception as e:
+                    yield url, e
+
+    # レイテンシの集計（件数、平均、p50、p95、最大、取得バイト数）
+    def latency_stats(self) -> dict:
+        with self._latency_lock:
+            seconds = sorted(r["seconds"] for r in self.latencies)
+            total_bytes = sum(r["bytes"] for r in self.latencies)
+        if not seconds:
+            return {"requests": 0}
+
+        def percentile(p):
+            return seconds[min(int(len(seconds) * p), len(seconds) - 1)]
+
+        return {
+            "requests": len(seconds),
+            "mean_sec": round(sum(seconds) / len(seconds), 3),
+            "p50_sec": round(percentile(0.5), 3),
+            "p95_sec": round(percentile(0.95), 3),
+            "max_sec": round(seconds[-1], 3),
+            "bytes": total_bytes,
+        }
+
+    def close(self):
+        self.session.close()
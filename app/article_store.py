@@ -0,0 +1,90 @@
+from pathlib import Path
+import sqlite3, threading, time, os
+
+# 保存先と、取り直すまでの日数（これより古い記事は再取得する）
+DEFAULT_STORE_PATH = Path(os.environ.get("ARTICLE_STORE_PATH", Path(__file__).parent / ".cache" / "articles.sqlite3"))
+DEFAULT_MAX_AGE_DAYS = float(os.environ.get("ARTICLE_MAX_AGE_DAYS", "30"))
+
+_SQL_BATCH = 500  # 1回のSQLに渡すURLの数（SQLiteの変数上限対策）
+
+
+# ===== PR TIMES記事の保存先（URLをキーにSQLiteへ保存、キーワードごとの記事一覧も持つ） =====
+class ArticleStore:
+    def __init__(self, path: Path = DEFAULT_STORE_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS articles ("
+            "url TEXT PRIMARY KEY, company_name TEXT, title TEXT, main_text TEXT, fetched_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS keyword_articles ("
+            "keyword TEXT NOT NULL, url TEXT NOT NULL, company_name TEXT, last_seen REAL NOT NULL, "
+            "PRIMARY KEY (keyword, url))"
+        )
+        self._conn.commit()
+
+    # 保存済みで古くなっていない記事だけ {url: (company_name, title, main_text)} で返す
+    def get_fresh(self, urls: list[str], max_age_days: float = DEFAULT_MAX_AGE_DAYS) -> dict[str, tuple[str, str, str]]:
+        threshold = time.time() - max_age_days * 24 * 60 * 60
+        found = {}
+        with self._lock:
+            for start in range(0, len(urls), _SQL_BATCH):
+                batch = urls[start:start + _SQL_BATCH]
+                rows = self._conn.execute(
+                    f"SELECT url, company_name, title, main_text FROM articles "
+                    f"WHERE fetched_at >= ? AND url IN ({','.join('?' * len(batch))})",
+                    [threshold] + batch,
+                ).fetchall()
+                for url, company_name, title, main_text in rows:
+                    found[url] = (company_name, title, main_text)
+        return found
+
+    # rows: (url, company_name, title, main_text)
+    def put_many(self, rows: list[tuple[str, str, str, str]]):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO articles VALUES (?, ?, ?, ?, ?)",
+                [(url, company_name, title, main_text, now) for url, company_name, title, main_text in rows],
+            )
+            self._conn.commit()
+
+    # キーワードの検索結果に出てきた記事を記録する。results: (company_name, url)
+    def add_keyword_results(self, keyword: str, results: list[tuple[str, str]]):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO keyword_articles VALUES (?, ?, ?, ?)",
+                [(keyword, url, company_name, now) for company_name, url in results],
+            )
+            self._conn.commit()
+
+    # キーワードで過去に見つかった記事 (company_name, url) を新しい順に返す
+    def keyword_results(self, keyword: str) -> list[tuple[str, str]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT company_name, url FROM keyword_articles WHERE keyword = ? ORDER BY last_seen DESC", (keyword,)
+            ).fetchall()
+        return [(company_name, url) for company_name, url in rows]
+
+    def stats(self) -> dict:
+        with self._lock:
+            articles = self._conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+            keywords = self._conn.execute("SELECT COUNT(DISTINCT keyword) FROM keyword_articles").fetchone()[0]
+        return {"articles": articles, "keywords": keywords}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+# ===== プロセスで共有する記事ストア =====
+def get_article_store() -> ArticleStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ArticleStore()
+        return _store
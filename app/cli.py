@@ -0,0 +1,318 @@
+# ===== コマンドラインからの実行（Streamlitなしで、CSV / Parquetを夜間バッチなどで処理する） =====
+# 使い方（appフォルダで実行）:
+#   python cli.py sentiment input.csv --column text --output sentiment.parquet
+#   python cli.py zeroshot input.parquet --column text --categories 経済,スポーツ,天気 --output topics.csv
+#   python cli.py wordfreq input.csv --column text --output wordfreq.csv --wordcloud wordcloud.png
+#   python cli.py cooccurrence input.csv --column text --output pairs.csv --html network.html
+# 途中で止まっても --resume を付けて同じコマンドを実行すれば、最後に終わったチャンクの続きから再開する
+# --metrics metrics.json でステージごとの時間とカウンターを、--profile cprofile でプロファイラーの結果を書き出す
+from pathlib import Path
+from csv_stream import iter_file_text_chunks, DEFAULT_CHUNKSIZE
+from instrumentation import track_run, PROFILERS
+import pandas as pd
+import argparse, json, os, shutil, sys, time
+
+
+# ===== 再開用のチェックポイント（<出力>.checkpoint.json。終わったチャンク数と出力ファイルのサイズを持つ） =====
+class Checkpoint:
+    def __init__(self, output: Path, job: str, params: dict, resume: bool):
+        self.path = output.with_name(output.name + ".checkpoint.json")
+        self.state = {"job": job, "params": params, "chunks_done": 0, "rows_done": 0, "output_bytes": 0,
+                      "completed": False}
+        self.resumed = False
+        if resume and self.path.exists():
+            saved = json.loads(self.path.read_text(encoding="utf-8"))
+            if saved["job"] != job or saved["params"] != params:
+                raise SystemExit(f"checkpoint {self.path} was written with different settings; delete it to start over")
+            self.state = saved
+            self.resumed = True
+
+    @property
+    def chunks_done(self) -> int:
+        return self.state["chunks_done"]
+
+    def save(self, **updates):
+        self.state.update(updates)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        tmp_path.write_text(json.dumps(self.state, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, self.path)  # 書き込み途中で止まっても壊れたファイルが残らないように
+
+
+# ===== チャンクごとの結果を出力に追記（CSVはそのまま追記、Parquetはチャンクごとのファイルにして最後に1つにまとめる） =====
+class ChunkWriter:
+    def __init__(self, output: Path, checkpoint: Checkpoint):
+        self.output = output
+        self.checkpoint = checkpoint
+        self.parquet = output.suffix.lower() == ".parquet"
+        self.parts_dir = output.with_name(output.name + ".parts")
+
+        if checkpoint.resumed:
+            # 最後のチェックポイントより後に書かれた分（途中で止まったチャンク）を捨てる
+            if self.parquet:
+                for part in self.parts_dir.glob("part-*.parquet"):
+                    if int(part.stem.split("-")[1]) >= checkpoint.chunks_done:
+                        part.unlink()
+            elif output.exists():
+                with open(output, "r+b") as f:
+                    f.truncate(checkpoint.state["output_bytes"])
+        else:
+            shutil.rmtree(self.parts_dir, ignore_errors=True)
+            output.unlink(missing_ok=True)
+        if self.parquet:
+            self.parts_dir.mkdir(parents=True, exist_ok=True)
+
+    # 書き込んだあとの出力ファイルのサイズを返す（CSVの再開位置）
+    def write(self, chunk_no: int, df: pd.DataFrame) -> int:
+        if self.parquet:
+            df.to_parquet(self.parts_dir / f"part-{chunk_no:06d}.parquet", index=False)
+            return 0
+        header = not self.output.exists() or self.output.stat().st_size == 0
+        df.to_csv(self.output, mode="a", header=header, index=False)
+        return self.output.stat().st_size
+
+    def finish(self):
+        if not self.parquet:
+            self.output.touch()
+            return
+        import pyarrow.parquet as pq
+        parts = sorted(self.parts_dir.glob("part-*.parquet"))
+        writer = None
+        for part in parts:
+            table = pq.read_table(part)
+            if writer is None:
+                writer = pq.ParquetWriter(self.output, table.schema)
+            writer.write_table(table.cast(writer.schema))
+        if writer is not None:
+            writer.close()
+        else:
+            pd.DataFrame().to_parquet(self.output)
+        shutil.rmtree(self.parts_dir, ignore_errors=True)
+
+
+# ===== 表を1つ書き出す（集計系のジョブの最終結果） =====
+def write_table(df: pd.DataFrame, output: Path):
+    if output.suffix.lower() == ".parquet":
+        df.to_parquet(output, index=False)
+    else:
+        df.to_csv(output, index=False)
+
+
+def _log(job: str, message: str):
+    print(f"[{job}] {message}", file=sys.stderr, flush=True)
+
+
+# ===== 行ごとに結果が出るジョブ（感情分析・トピック分類）：チャンクごとに推論して追記 =====
+def _run_row_job(args, job: str, params: dict, analyze):
+    output = Path(args.output)
+    checkpoint = Checkpoint(output, job, params, args.resume)
+    if checkpoint.state["completed"]:
+        _log(job, f"already completed: {output}")
+        return
+    writer = ChunkWriter(output, checkpoint)
+    rows_done = rows_at_start = checkpoint.state["rows_done"]
+    start = time.perf_counter()
+    for chunk_no, rows, texts in iter_file_text_chunks(args.input, args.column, args.chunksize,
+                                                       skip_chunks=checkpoint.chunks_done):
+        output_bytes = checkpoint.state["output_bytes"]
+        if texts:
+            df_chunk = analyze(texts).reset_index(drop=True)
+            df_chunk.insert(0, "row", rows)  # 入力ファイルの行番号（0始まり）
+            output_bytes = writer.write(chunk_no, df_chunk)
+        rows_done += len(texts)
+        checkpoint.save(chunks_done=chunk_no + 1, rows_done=rows_done, output_bytes=output_bytes)
+        _log(job, f"chunk {chunk_no}: {rows_done} rows ({(rows_done - rows_at_start) / (time.perf_counter() - start):.1f} rows/s)")
+    writer.finish()
+    checkpoint.save(completed=True)
+    _log(job, f"done: {output}")
+
+
+def run_sentiment(args):
+    from sentiment_analysis import sentiment_analysis, sentiment_analysis_chunked
+
+    params = {"input": str(args.input), "column": args.column, "chunksize": args.chunksize,
+              "batch_size": args.batch_size, "backend": args.backend, "long_text": args.long_text,
+              "aggregation": args.aggregation, "stride": args.stride, "max_windows": args.max_windows}
+
+    def analyze(texts):
+        if args.long_text:
+            return sentiment_analysis_chunked(texts, aggregation=args.aggregation, stride=args.stride,
+                                              max_windows=args.max_windows, batch_size=args.batch_size,
+                                              backend=args.backend)
+        return sentiment_analysis(texts, batch_size=args.batch_size, backend=args.backend)
+
+    _run_row_job(args, "sentiment", params, analyze)
+
+
+def run_zeroshot(args):
+    from zero_shot_classification import zero_shot_classification
+
+    categories = [c for c in args.categories.split(",") if c]
+    params = {"input": str(args.input), "column": args.column, "chunksize": args.chunksize,
+              "categories": categories, "batch_size": args.batch_size, "mode": args.mode, "top_k": args.top_k,
+              "backend": args.backend}
+    _run_row_job(args, "zeroshot", params, lambda texts: zero_shot_classification(
+        texts, categories, batch_size=args.batch_size, mode=args.mode, top_k=args.top_k, backend=args.backend))
+
+
+# ===== 全体を集計するジョブ（単語頻度・共起）：途中の集計結果を<出力>.stateに保存しながら進める =====
+def _run_aggregate_job(args, job: str, params: dict, state_suffix: str, load_state, save_state, add_chunk):
+    output = Path(args.output)
+    checkpoint = Checkpoint(output, job, params, args.resume)
+    state_path = output.with_name(output.name + state_suffix)
+    state = load_state(state_path if checkpoint.resumed else None)  # チェックポイントは集計結果を保存したあとに書くので、必ずある
+    if checkpoint.state["completed"]:
+        _log(job, f"already completed, rewriting the result: {output}")
+        return state, checkpoint
+
+    rows_done = checkpoint.state["rows_done"]
+    for chunk_no, _, texts in iter_file_text_chunks(args.input, args.column, args.chunksize,
+                                                    skip_chunks=checkpoint.chunks_done):
+        if texts:
+            add_chunk(state, texts)
+        rows_done += len(texts)
+        save_state(state, state_path)
+        checkpoint.save(chunks_done=chunk_no + 1, rows_done=rows_done)
+        _log(job, f"chunk {chunk_no}: {rows_done} rows")
+    return state, checkpoint
+
+
+def run_wordfreq(args):
+    from wordfrequency_wordcloud import morph_chunks_for_freq_wordcloud
+
+    stopwords = [w for w in args.stopwords.split(",") if w]
+    params = {"input": str(args.input), "column": args.column, "chunksize": args.chunksize, "stopwords": stopwords}
+
+    def load_state(path):
+        return json.loads(Path(path).read_text(encoding="utf-8")) if path else {}
+
+    def save_state(counts, path):
+        tmp_path = path.with_name(path.name + ".tmp")
+        tmp_path.write_text(json.dumps(counts, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, path)
+
+    def add_chunk(counts, texts):
+        corpus = morph_chunks_for_freq_wordcloud([texts], stopwords)
+        for word, count in zip(corpus.vocab, corpus.counts.tolist()):
+            counts[word] = counts.get(word, 0) + count
+
+    counts, checkpoint = _run_aggregate_job(args, "wordfreq", params, ".state.json", load_state, save_state, add_chunk)
+    df = pd.DataFrame(sorted(counts.items(), key=lambda x: -x[1]), columns=["words", "Frequency"])
+    if args.top > 0:
+        df = df.head(args.top)
+    write_table(df, Path(args.output))
+
+    if args.wordcloud:
+        from wordcloud_engine import get_wordcloud_cache
+        from PIL import Image
+        top_words = dict(df.head(100).itertuples(index=False, name=None))
+        Image.fromarray(get_wordcloud_cache().render(top_words, args.colormap)).save(args.wordcloud)
+    checkpoint.save(completed=True)
+    _log("wordfreq", f"done: {args.output}")
+
+
+def run_cooccurrence(args):
+    from scraping_co_occurrence_network import morph_texts_for_cooccurrence, cooccurrence_network_json
+    from cooccurrence_engine import CooccurrenceAccumulator, rank_pairs
+
+    params = {"input": str(args.input), "column": args.column, "chunksize": args.chunksize, "unit": args.unit,
+              "window": args.window}
+
+    def load_state(path):
+        return CooccurrenceAccumulator.load(path) if path else CooccurrenceAccumulator(args.window)
+
+    def save_state(accumulator, path):
+        tmp_path = path.with_name(path.name + ".tmp.npz")
+        accumulator.save(tmp_path)
+        os.replace(tmp_path, path)
+
+    def add_chunk(accumulator, texts):
+        accumulator.add(morph_texts_for_cooccurrence(texts, args.unit))
+
+    accumulator, checkpoint = _run_aggregate_job(args, "cooccurrence", params, ".state.npz", load_state, save_state,
+                                                 add_chunk)
+    top_pairs = rank_pairs(accumulator.snapshot(), args.measure, args.top, args.min_count, args.min_word_count)
+    df = pd.DataFrame([(w1, w2, score) for (w1, w2), score in top_pairs], columns=["word1", "word2", args.measure])
+    write_table(df, Path(args.output))
+
+    if args.html:
+        from network_view import render_network_html
+        graph_json = cooccurrence_network_json(top_pairs, measure=args.measure, layout="spectral")
+        Path(args.html).write_text(render_network_html(graph_json), encoding="utf-8")
+    checkpoint.save(completed=True)
+    _log("cooccurrence", f"done: {args.output}")
+
+
+# ===== 引数 =====
+def build_parser() -> argparse.ArgumentParser:
+    from model_registry import BACKENDS, DEFAULT_BACKEND
+    from cooccurrence_engine import MEASURES
+
+    parser = argparse.ArgumentParser(description="Japanese Text Analyzer のバッチ実行")
+    subparsers = parser.add_subparsers(dest="job", required=True)
+
+    def add_common(sub):
+        sub.add_argument("input", help="入力ファイル（.csv / .parquet）")
+        sub.add_argument("--column", required=True, help="分析する列名")
+        sub.add_argument("--output", required=True, help="出力ファイル（.csv / .parquet）")
+        sub.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="1回に読み込む行数（再開の単位）")
+        sub.add_argument("--resume", action="store_true", help="チェックポイントがあれば続きから再開する")
+        sub.add_argument("--metrics", help="ステージごとの時間とカウンターのJSONの保存先")
+        sub.add_argument("--profile", choices=PROFILERS, help="この実行をプロファイルする（結果はPROFILE_DIRに保存）")
+
+    sub = subparsers.add_parser("sentiment", help="感情分析")
+    add_common(sub)
+    sub.add_argument("--batch-size", type=int, default=32)
+    sub.add_argument("--backend", choices=BACKENDS, default=DEFAULT_BACKEND)
+    sub.add_argument("--long-text", action="store_true", help="スライディングウィンドウで全文を読む")
+    sub.add_argument("--aggregation", choices=["mean", "max", "weighted"], default="mean")
+    sub.add_argument("--stride", type=int, default=384)
+    sub.add_argument("--max-windows", type=int, default=50_000, help="チャンクごとのウィンドウ総数の上限")
+    sub.set_defaults(func=run_sentiment)
+
+    sub = subparsers.add_parser("zeroshot", help="トピック分類（ゼロショット）")
+    add_common(sub)
+    sub.add_argument("--categories", required=True, help="カンマ区切りのカテゴリ")
+    sub.add_argument("--batch-size", type=int, default=32)
+    sub.add_argument("--mode", choices=["exact", "embedding", "rerank"], default="exact",
+                     help="embeddingはNLIモデルの[CLS]ベクトルの類似度（文埋め込みとして学習したものではない・目安）")
+    sub.add_argument("--top-k", type=int, default=3)
+    sub.add_argument("--backend", choices=BACKENDS, default=DEFAULT_BACKEND)
+    sub.set_defaults(func=run_zeroshot)
+
+    sub = subparsers.add_parser("wordfreq", help="単語頻度（とワードクラウド）")
+    add_common(sub)
+    sub.add_argument("--stopwords", default="", help="カンマ区切りのストップワード")
+    sub.add_argument("--top", type=int, default=0, help="上位何語を出力するか（0なら全部）")
+    sub.add_argument("--wordcloud", help="ワードクラウドのPNGの保存先")
+    sub.add_argument("--colormap", default="viridis")
+    sub.set_defaults(func=run_wordfreq)
+
+    sub = subparsers.add_parser("cooccurrence", help="共起ペア（とネットワークのHTML）")
+    add_common(sub)
+    sub.add_argument("--unit", choices=["document", "sentence"], default="document")
+    sub.add_argument("--window", type=int, help="k語ウィンドウで数える場合のk")
+    sub.add_argument("--measure", choices=MEASURES, default="count")
+    sub.add_argument("--top", type=int, default=200)
+    sub.add_argument("--min-count", type=int, default=1)
+    sub.add_argument("--min-word-count", type=int, default=1)
+    sub.add_argument("--html", help="ネットワークのHTMLの保存先")
+    sub.set_defaults(func=run_cooccurrence)
+    return parser
+
+
+def main(argv: list[str] | None = None):
+    args = build_parser().parse_args(argv)
+    with track_run(args.job, profile=args.profile) as run:
+        args.func(args)
+    metrics = run.to_dict()
+    for s in metrics["stages"]:
+        _log(args.job, f"{s['stage']}: {s['seconds']:.2f}s ({s['calls']} calls)")
+    _log(args.job, f"total {metrics['wall_seconds']:.2f}s, peak RSS {metrics['peak_rss_mb']} MB, {metrics['counters']}")
+    if metrics["profile_path"]:
+        _log(args.job, f"profile: {metrics['profile_path']}")
+    if args.metrics:
+        Path(args.metrics).write_text(json.dumps(metrics, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+from dataclasses import dataclass
+from scipy import sparse
+from instrumentation import stage, count
+from token_ids import encode_tokens, top_k_indices
+import numpy as np
+
+
+# ===== 共起カウントの結果（単語ID i < j のペアごとの回数と、単語ごとの出現数） =====
+@dataclass
+class CooccurrenceCounts:
+    vocab: list[str]          # 単語ID -> 単語
+    rows: np.ndarray          # ペアの単語ID（小さい方）
+    cols: np.ndarray          # ペアの単語ID（大きい方）
+    counts: np.ndarray        # ペアの共起回数
+    word_counts: np.ndarray   # 単語ごとの出現数（文書モード：出現した文書数 / ウィンドウモード：出現回数）
+    n_units: int              # 文書数（ウィンドウモードは総トークン数）
+
+
+# ===== 文書×単語の疎行列（出現したら1） =====
+def doc_term_matrix(ids: np.ndarray, offsets: np.ndarray, vocab_size: int) -> sparse.csr_matrix:
+    data = np.ones(len(ids), dtype=np.int32)
+    X = sparse.csr_matrix((data, ids, offsets), shape=(len(offsets) - 1, vocab_size))
+    X.sum_duplicates()
+    X.data[:] = 1  # 文書内の重複は1回として数える
+    return X
+
+
+# ===== 文書単位の共起：Xᵀ·X の上三角（対角＝単語自身は除く） =====
+def _document_cooccurrence(ids, offsets, vocab_size):
+    X = doc_term_matrix(ids, offsets, vocab_size)
+    C = sparse.triu(X.T @ X, k=1).tocoo()
+    word_counts = np.asarray(X.sum(axis=0)).ravel()  # 単語ごとの出現文書数
+    return C.row, C.col, C.data, word_counts, X.shape[0]
+
+
+# ===== ウィンドウ単位の共起：同じ文書内でk語以内に並んだ単語のペアを数える =====
+def _window_cooccurrence(ids, offsets, vocab_size, window):
+    doc_of_token = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    lo_parts, hi_parts = [], []
+    for d in range(1, window):
+        a, b = ids[:-d], ids[d:]
+        keep = (doc_of_token[:-d] == doc_of_token[d:]) & (a != b)  # 文書をまたがない・同じ単語同士は除く
+        lo_parts.append(np.minimum(a[keep], b[keep]))
+        hi_parts.append(np.maximum(a[keep], b[keep]))
+    lo = np.concatenate(lo_parts) if lo_parts else np.zeros(0, dtype=np.int32)
+    hi = np.concatenate(hi_parts) if hi_parts else np.zeros(0, dtype=np.int32)
+    C = sparse.coo_matrix((np.ones(len(lo), dtype=np.int64), (lo, hi)), shape=(vocab_size, vocab_size)).tocsr().tocoo()  # 重複を合算
+    word_counts = np.bincount(ids, minlength=vocab_size)  # 単語ごとの出現回数
+    return C.row, C.col, C.data, word_counts, len(ids)
+
+
+def _count_pairs(ids, offsets, vocab_size, window):
+    with stage("pair_counting"):
+        if window is None:
+            rows, cols, counts, word_counts, n_units = _document_cooccurrence(ids, offsets, vocab_size)
+        else:
+            rows, cols, counts, word_counts, n_units = _window_cooccurrence(ids, offsets, vocab_size, window)
+    count("pairs", int(counts.sum()))
+    return rows, cols, counts, word_counts, n_units
+
+
+# ===== 共起回数を数える（window=Noneなら文書単位、window=kならk語の窓単位） =====
+def count_cooccurrence(all_tokens: list[list[str]], window: int | None = None) -> CooccurrenceCounts:
+    vocab, ids, offsets = encode_tokens(all_tokens)
+    rows, cols, counts, word_counts, n_units = _count_pairs(ids, offsets, len(vocab), window)
+    return CooccurrenceCounts(vocab, rows, cols, counts, word_counts, n_units)
+
+
+# ===== 記事が届くたびに共起回数を足し込んでいく集計器 =====
+class CooccurrenceAccumulator:
+    def __init__(self, window: int | None = None):
+        self.window = window
+        self.word_to_id = {}
+        self._pairs = sparse.csr_matrix((0, 0), dtype=np.int64)  # 上三角だけ持つ単語×単語の共起回数
+        self._word_counts = np.zeros(0, dtype=np.int64)
+        self.n_units = 0
+
+    def add(self, all_tokens: list[list[str]]):
+        _, ids, offsets = encode_tokens(all_tokens, self.word_to_id)
+        vocab_size = len(self.word_to_id)
+        rows, cols, counts, word_counts, n_units = _count_pairs(ids, offsets, vocab_size, self.window)
+
+        # 語彙が増えた分だけ行列を広げてから足す
+        batch = sparse.coo_matrix((counts.astype(np.int64), (rows, cols)), shape=(vocab_size, vocab_size)).tocsr()
+        self._pairs.resize((vocab_size, vocab_size))
+        self._pairs = self._pairs + batch
+        self._word_counts = np.pad(self._word_counts, (0, vocab_size - len(self._word_counts)))
+        self._word_counts += word_counts
+        self.n_units += n_units
+
+    # 今の時点の集計結果
+    def snapshot(self) -> CooccurrenceCounts:
+        C = self._pairs.tocoo()
+        return CooccurrenceCounts(list(self.word_to_id), C.row, C.col, C.data, self._word_counts.copy(), self.n_units)
+
+    # 途中経過をファイルに保存・復元（コマンドラインのジョブを途中から再開する用）
+    def save(self, path):
+        C = self._pairs.tocoo()
+        np.savez(path, vocab=np.array(list(self.word_to_id), dtype=str), rows=C.row, cols=C.col, counts=C.data,
+                 word_counts=self._word_counts, n_units=self.n_units, window=-1 if self.window is None else self.window)
+
+    @classmethod
+    def load(cls, path) -> "CooccurrenceAccumulator":
+        with np.load(path) as saved:
+            window = int(saved["window"])
+            accumulator = cls(None if window < 0 else window)
+            accumulator.word_to_id = {word: i for i, word in enumerate(saved["vocab"].tolist())}
+            vocab_size = len(accumulator.word_to_id)
+            accumulator._pairs = sparse.coo_matrix(
+                (saved["counts"], (saved["rows"], saved["cols"])), shape=(vocab_size, vocab_size)
+            ).tocsr()
+            accumulator._word_counts = saved["word_counts"].astype(np.int64)
+            accumulator.n_units = int(saved["n_units"])
+        return accumulator
+
+
+# ===== 上位k件のペア（スコア降順） =====
+# candidatesを渡すと、scoresはそのペア番号に対応するスコアとして扱う
+def top_k_pairs(cooc: CooccurrenceCounts, k: int = 200, scores: np.ndarray | None = None,
+                candidates: np.ndarray | None = None) -> list[tuple[tuple[str, str], float]]:
+    if scores is None:
+        scores = cooc.counts if candidates is None else cooc.counts[candidates]
+    idx = top_k_indices(scores, k)
+    pair_idx = idx if candidates is None else candidates[idx]
+    return [((cooc.vocab[cooc.rows[p]], cooc.vocab[cooc.cols[p]]), scores[i].item()) for i, p in zip(idx, pair_idx)]
+
+
+# ===== 関連度指標（PMI / NPMI / Jaccard / Dice / 回数） =====
+MEASURES = ["count", "pmi", "npmi", "jaccard", "dice"]
+
+# 先に最低出現数でペアを絞り込んでから、全指標をまとめてベクトル計算する
+def association_measures(cooc: CooccurrenceCounts, min_count: int = 1,
+                         min_word_count: int = 1) -> tuple[np.ndarray, dict[str, np.ndarray]]:
+    f_i = cooc.word_counts[cooc.rows]
+    f_j = cooc.word_counts[cooc.cols]
+    candidates = np.flatnonzero((cooc.counts >= min_count) & (f_i >= min_word_count) & (f_j >= min_word_count))
+
+    c = cooc.counts[candidates].astype(np.float64)
+    f_i = f_i[candidates].astype(np.float64)
+    f_j = f_j[candidates].astype(np.float64)
+    n = float(max(cooc.n_units, 1))
+
+    pmi = np.log(c * n / (f_i * f_j))
+    p_ij = c / n
+    with np.errstate(divide="ignore", invalid="ignore"):
+        npmi = np.where(p_ij < 1, pmi / -np.log(p_ij), 1.0)  # 全単位で共起しているときは1
+    # ウィンドウモードでは共起回数が出現回数を超えることがあるので、分母と上限を押さえる
+    jaccard = c / np.maximum(f_i + f_j - c, c)
+    dice = np.minimum(2 * c / (f_i + f_j), 1.0)
+
+    measures = {"count": cooc.counts[candidates], "pmi": pmi, "npmi": npmi, "jaccard": jaccard, "dice": dice}
+    return candidates, measures
+
+
+# ===== 指定した指標で上位k件のペアを返す =====
+def rank_pairs(cooc: CooccurrenceCounts, measure: str = "count", k: int = 200,
+               min_count: int = 1, min_word_count: int = 1) -> list[tuple[tuple[str, str], float]]:
+    if measure not in MEASURES:
+        raise ValueError(f"measure must be one of {MEASURES}: {measure}")
+    with stage("rank_pairs"):
+        candidates, measures = association_measures(cooc, min_count, min_word_count)
+        return top_k_pairs(cooc, k, scores=measures[measure], candidates=candidates)
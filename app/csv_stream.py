@@ -0,0 +1,62 @@
+from pathlib import Path
+from instrumentation import timed_iter
+import pandas as pd
+
+# 1回に読み込む行数（メモリ使用量はファイルサイズではなくこの行数で決まる）
+DEFAULT_CHUNKSIZE = 10_000
+
+
+# ===== 先頭チャンクだけ読んでプレビューと列名に使う =====
+def read_csv_preview(uploaded_file, chunksize: int = DEFAULT_CHUNKSIZE) -> pd.DataFrame:
+    uploaded_file.seek(0)
+    with pd.read_csv(uploaded_file, chunksize=chunksize) as reader:
+        first_chunk = next(reader, None)
+    uploaded_file.seek(0)
+    if first_chunk is None:
+        return pd.DataFrame()
+    return first_chunk
+
+
+# ===== 選択した列だけをチャンクごとに読み込み、テキストのリストで返す（欠損値行削除、文字列に） =====
+def iter_text_chunks(uploaded_file, column: str, chunksize: int = DEFAULT_CHUNKSIZE):
+    uploaded_file.seek(0)
+    with pd.read_csv(uploaded_file, usecols=[column], chunksize=chunksize) as reader:
+        for chunk in timed_iter(reader, "read_input"):
+            texts = chunk[column].dropna().astype(str).tolist()
+            if texts:
+                yield texts
+
+
+# ===== 読み込みの進み具合（0～1、ファイル位置から概算） =====
+def read_progress(uploaded_file) -> float:
+    size = getattr(uploaded_file, "size", 0)
+    if not size and hasattr(uploaded_file, "getbuffer"):  # ジョブに渡したBytesIO
+        size = uploaded_file.getbuffer().nbytes
+    if not size:
+        return 0.0
+    return min(uploaded_file.tell() / size, 1.0)
+
+
+# ===== ファイルパス（CSV / Parquet）から選択列をチャンクごとに読む（コマンドライン用） =====
+# (チャンク番号, 元の行番号のリスト, テキストのリスト) を返す。skip_chunks件目までは読み飛ばす（再開用）
+def iter_file_text_chunks(path, column: str, chunksize: int = DEFAULT_CHUNKSIZE, skip_chunks: int = 0):
+    path = Path(path)
+    if path.suffix.lower() == ".parquet":
+        import pyarrow.parquet as pq
+        batches = pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=[column])
+        chunks = (batch.to_pandas()[column] for batch in batches)
+        yield from _numbered_text_chunks(chunks, skip_chunks)
+    else:
+        with pd.read_csv(path, usecols=[column], chunksize=chunksize) as reader:
+            yield from _numbered_text_chunks((chunk[column] for chunk in reader), skip_chunks)
+
+
+def _numbered_text_chunks(chunks, skip_chunks: int):
+    start = 0  # このチャンクの先頭の行番号
+    for chunk_no, series in enumerate(timed_iter(chunks, "read_input")):
+        n_rows = len(series)
+        if chunk_no >= skip_chunks:
+            series = series.set_axis(range(start, start + n_rows)).dropna().astype(str)  # 欠損値行削除、文字列に
+            yield chunk_no, series.index.tolist(), series.tolist()
+        start += n_rows
+
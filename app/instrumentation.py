@@ -0,0 +1,177 @@
+from contextlib import contextmanager
+from pathlib import Path
+import contextvars, json, os, sys, threading, time
+
+try:
+    import resource  # Windowsにはない（そのときピークメモリはNone）
+except ImportError:
+    resource = None
+
+# プロファイラーの出力先と、1回の実行ごとのメトリクスをJSON Linesで追記するファイル（監視用。未指定なら書かない）
+PROFILERS = ["cprofile", "pyinstrument"]
+PROFILE_DIR = Path(os.environ.get("PROFILE_DIR", Path(__file__).parent / ".cache" / "profiles"))
+METRICS_LOG = os.environ.get("METRICS_LOG")
+
+
+# ===== プロセスのピークメモリ（RSS、MB）。起動からの最大値 =====
+def peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024  # macOSはバイト、Linuxはキロバイト
+
+
+# ===== 1回の実行の計測結果（ステージごとの回数・時間と、件数のカウンター） =====
+class RunMetrics:
+    def __init__(self, name: str):
+        self.name = name
+        self.stages = {}    # "親 > 子" -> [回数, 秒]（入れ子のステージの時間は親にも含まれる）
+        self.counters = {}  # "docs", "tokens", "pairs", "batches", "bytes_fetched" など
+        self.started_at = time.time()
+        self.wall_seconds = None
+        self.peak_rss_mb = None
+        self.profile_path = None  # プロファイラーの出力ファイル
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()  # 記事の取得などは複数スレッドから足し込む
+
+    def add_stage(self, stage: str, seconds: float):
+        with self._lock:
+            entry = self.stages.setdefault(stage, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+    def count(self, name: str, n: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def finish(self):
+        self.wall_seconds = time.perf_counter() - self._start
+        self.peak_rss_mb = peak_rss_mb()
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            wall = self.wall_seconds if self.wall_seconds is not None else time.perf_counter() - self._start
+            return {
+                "name": self.name,
+                "started_at": self.started_at,
+                "wall_seconds": round(wall, 4),
+                "peak_rss_mb": None if self.peak_rss_mb is None else round(self.peak_rss_mb, 1),
+                "stages": [
+                    {"stage": stage, "calls": calls, "seconds": round(seconds, 4),
+                     "share": round(seconds / wall, 3) if wall > 0 else 0.0}
+                    for stage, (calls, seconds) in self.stages.items()
+                ],
+                "counters": dict(self.counters),
+                "profile_path": self.profile_path,
+            }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False)
+
+
+# 今の実行と、今いるステージ（スレッドやジョブごとに別々。track_runの外では何も記録しない）
+_current_run = contextvars.ContextVar("current_run", default=None)
+_current_stage = contextvars.ContextVar("current_stage", default=())
+
+
+def current_run() -> RunMetrics | None:
+    return _current_run.get()
+
+
+# ===== ステージの時間を計る（with stage("tokenize"): ...） =====
+@contextmanager
+def stage(name: str):
+    run = _current_run.get()
+    if run is None:
+        yield
+        return
+    path = _current_stage.get() + (name,)
+    token = _current_stage.set(path)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        run.add_stage(" > ".join(path), time.perf_counter() - start)
+        _current_stage.reset(token)
+
+
+# ===== イテレーターの次の要素を待つ時間をステージとして計る（ファイルの読み込みや記事の取得待ち） =====
+_END = object()
+
+def timed_iter(iterable, name: str):
+    iterator = iter(iterable)
+    while True:
+        with stage(name):
+            item = next(iterator, _END)
+        if item is _END:
+            return
+        yield item
+
+
+# ===== 件数を数える（文書数、トークン数、ペア数、バッチ数、取得バイト数など） =====
+def count(name: str, n: int = 1):
+    run = _current_run.get()
+    if run is not None:
+        run.count(name, n)
+
+
+# ===== 別スレッドで動かす関数に、今の実行を引き継ぐ（executor.submit(in_current_context(f), ...)） =====
+# ステージは親と別に数える（並列に動くので、ステージの合計時間が全体の時間を超えることがある）
+def in_current_context(func):
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        _current_stage.set(())
+        return func(*args, **kwargs)
+
+    return lambda *args, **kwargs: context.copy().run(run, *args, **kwargs)
+
+
+# ===== 1回の実行を計測する。profileを指定するとその実行だけプロファイラーの結果をPROFILE_DIRに書き出す =====
+@contextmanager
+def track_run(name: str, profile: str | None = None):
+    if profile is not None and profile not in PROFILERS:
+        raise ValueError(f"profile must be one of {PROFILERS}: {profile}")
+    run = RunMetrics(name)
+    token = _current_run.set(run)
+    stage_token = _current_stage.set(())
+    profiler = _start_profiler(profile)
+    try:
+        yield run
+    finally:
+        if profiler is not None:
+            run.profile_path = str(_stop_profiler(profile, profiler, name))
+        run.finish()
+        _current_stage.reset(stage_token)
+        _current_run.reset(token)
+        if METRICS_LOG:
+            with open(METRICS_LOG, "a", encoding="utf-8") as f:
+                f.write(run.to_json() + "\n")
+
+
+def _start_profiler(profile: str | None):
+    if profile == "cprofile":
+        import cProfile
+        profiler = cProfile.Profile()  # 呼び出したスレッドだけを計測する
+        profiler.enable()
+        return profiler
+    if profile == "pyinstrument":
+        from pyinstrument import Profiler  # プロファイルするときだけ必要（pip install pyinstrument）
+        profiler = Profiler()
+        profiler.start()
+        return profiler
+    return None
+
+
+def _stop_profiler(profile: str, profiler, name: str) -> Path:
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    stem = f"{name}-{time.strftime('%Y%m%d-%H%M%S')}"
+    if profile == "cprofile":
+        profiler.disable()
+        path = PROFILE_DIR / f"{stem}.prof"  # snakevizやpstatsで開く
+        profiler.dump_stats(path)
+    else:
+        profiler.stop()
+        path = PROFILE_DIR / f"{stem}.html"
+        path.write_text(profiler.output_html(), encoding="utf-8")
+    return path
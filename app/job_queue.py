@@ -0,0 +1,201 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable
+from instrumentation import track_run, RunMetrics
+import hashlib, os, threading, time, traceback, uuid
+
+# 同時に動かすジョブ数、そのうちモデルを使う重いジョブの数、結果を覚えておくジョブ数
+DEFAULT_JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+DEFAULT_HEAVY_JOBS = int(os.environ.get("HEAVY_JOB_LIMIT", "1"))
+DEFAULT_RESULT_CACHE = int(os.environ.get("JOB_RESULT_CACHE", "32"))
+_JOB_HISTORY = 200  # 終わったジョブの情報を何件まで残すか（結果を持つジョブは結果のキャッシュにある分だけ）
+_DIGEST_BLOCK = 1024 * 1024  # ファイルのハッシュを計算するときに1回に読む大きさ
+
+FINISHED = ("done", "failed", "cancelled")
+
+
+# ===== 入力のハッシュ（同じ入力・同じ設定のジョブは結果を使い回す） =====
+def input_hash(*parts) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        data = part if isinstance(part, bytes) else repr(part).encode("utf-8")
+        h.update(len(data).to_bytes(8, "little"))  # 区切りがずれて別の入力と同じにならないように長さも入れる
+        h.update(data)
+    return h.hexdigest()
+
+
+# ===== アップロードされたファイルの中身のハッシュ（少しずつ読むのでコピーを作らない。ジョブのキーに使う） =====
+def file_digest(file) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with file.getbuffer() as view:
+        for start in range(0, view.nbytes, _DIGEST_BLOCK):
+            h.update(view[start:start + _DIGEST_BLOCK])
+    return h.hexdigest()
+
+
+# ===== ジョブの状態 =====
+@dataclass
+class Job:
+    job_id: str
+    kind: str
+    key: str
+    heavy: bool
+    status: str = "queued"     # queued / waiting（重いジョブの空き待ち） / running / done / failed / cancelled
+    progress: float = 0.0      # 0～1
+    message: str = ""
+    preview: Any = None        # 途中経過（ページで表示する用）
+    result: Any = None
+    error: str | None = None
+    cached: bool = False       # 以前の結果を使い回したか
+    profile: str | None = None         # プロファイラー（cprofile / pyinstrument）。指定したジョブだけ出力を書き出す
+    metrics: RunMetrics | None = None  # ステージごとの時間とカウンター（使い回した結果なら元の実行のもの）
+    submitted_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+    cancel_event: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+
+class JobCancelled(Exception):
+    pass
+
+
+# ===== ジョブの関数に渡す。進捗の報告とキャンセルの確認に使う =====
+class JobContext:
+    def __init__(self, job: Job):
+        self._job = job
+
+    def report(self, progress: float | None = None, message: str | None = None, preview: Any = None):
+        if self._job.cancel_event.is_set():
+            raise JobCancelled()
+        if progress is not None:
+            self._job.progress = min(max(progress, 0.0), 1.0)
+        if message is not None:
+            self._job.message = message
+        if preview is not None:
+            self._job.preview = preview
+
+    @property
+    def cancelled(self) -> bool:
+        return self._job.cancel_event.is_set()
+
+
+# ===== ジョブスケジューラー（スレッドプールで実行。モデルはレジストリ経由でジョブ間で共有） =====
+class JobScheduler:
+    def __init__(self, workers: int = DEFAULT_JOB_WORKERS, heavy_jobs: int = DEFAULT_HEAVY_JOBS,
+                 result_cache: int = DEFAULT_RESULT_CACHE):
+        self._executor = ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="job")
+        self._heavy = threading.Semaphore(max(heavy_jobs, 1))  # モデルを使うジョブはこの数までしか同時に動かさない
+        self.result_cache_size = max(result_cache, 1)  # 終わったジョブの結果を少なくとも1回は見せられるように
+        self._jobs = OrderedDict()     # job_id -> Job
+        self._results = OrderedDict()  # 入力のハッシュ -> 結果
+        self._inflight = {}            # 入力のハッシュ -> 実行中のjob_id（同じジョブを2回走らせない）
+        self._lock = threading.Lock()
+
+    # funcは JobContext を受け取って結果を返す関数。key_partsは結果のキャッシュに使う入力と設定
+    # profileを指定したときは、結果を使い回さずに実際に実行する
+    def submit(self, kind: str, func: Callable[[JobContext], Any], key_parts: tuple, heavy: bool = False,
+               profile: str | None = None) -> str:
+        key = input_hash(kind, *key_parts)
+        with self._lock:
+            if key in self._results and profile is None:
+                self._results.move_to_end(key)
+                result, metrics = self._results[key]
+                job = Job(uuid.uuid4().hex, kind, key, heavy, status="done", progress=1.0, result=result,
+                          cached=True, metrics=metrics, finished_at=time.time())
+                self._add_job(job)
+                return job.job_id
+            if key in self._inflight and profile is None:
+                return self._inflight[key]
+            job = Job(uuid.uuid4().hex, kind, key, heavy, profile=profile)
+            self._add_job(job)
+            self._inflight.setdefault(key, job.job_id)
+        self._executor.submit(self._run, job, func)
+        return job.job_id
+
+    def _add_job(self, job: Job):
+        self._jobs[job.job_id] = job
+        # 古い終わったジョブから消す
+        finished = [job_id for job_id, j in self._jobs.items() if j.finished]
+        for job_id in finished[:max(len(self._jobs) - _JOB_HISTORY, 0)]:
+            del self._jobs[job_id]
+
+    def _run(self, job: Job, func):
+        context = JobContext(job)
+        acquired = False
+        try:
+            if job.heavy:
+                job.status = "waiting"
+                while not acquired:
+                    if job.cancel_event.is_set():
+                        raise JobCancelled()
+                    acquired = self._heavy.acquire(timeout=0.5)
+            try:
+                if job.cancel_event.is_set():
+                    raise JobCancelled()
+                job.status = "running"
+                job.started_at = time.time()
+                with track_run(job.kind, profile=job.profile) as run:
+                    job.metrics = run
+                    result = func(context)
+            finally:
+                if acquired:
+                    self._heavy.release()
+            job.result = result
+            job.progress = 1.0
+            job.status = "done"
+            with self._lock:
+                self._results[job.key] = (result, job.metrics)
+                self._results.move_to_end(job.key)
+                while len(self._results) > self.result_cache_size:
+                    evicted_key, _ = self._results.popitem(last=False)
+                    self._forget_jobs(evicted_key)
+        except JobCancelled:
+            job.status = "cancelled"
+        except Exception:
+            job.error = traceback.format_exc()
+            job.status = "failed"
+        finally:
+            job.preview = None  # 途中経過は終わったら使わない
+            job.finished_at = time.time()
+            with self._lock:
+                if self._inflight.get(job.key) == job.job_id:
+                    del self._inflight[job.key]
+
+    # 結果のキャッシュから追い出した入力のジョブは履歴からも消す（結果を持ったジョブが残ってメモリが減らないのを防ぐ）
+    def _forget_jobs(self, key: str):
+        for job_id in [job_id for job_id, j in self._jobs.items() if j.key == key and j.finished]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str):
+        job = self.get(job_id)
+        if job is not None and not job.finished:
+            job.cancel_event.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+            return {
+                "jobs": {status: statuses.count(status) for status in sorted(set(statuses))},
+                "cached_results": len(self._results),
+            }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+# ===== プロセスで共有するスケジューラー（全ユーザー・全ページで1つ） =====
+def get_scheduler() -> JobScheduler:
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = JobScheduler()
+        return _scheduler
@@ -0,0 +1,89 @@
+import streamlit as st
+import pandas as pd
+from typing import Any, Callable
+from job_queue import get_scheduler, Job, JobContext
+from instrumentation import RunMetrics, PROFILERS
+import json
+
+POLL_INTERVAL = 1.0  # 進捗を見に行く間隔（秒）
+
+STATUS_LABELS = {"queued": "順番待ち", "waiting": "他の分析が終わるのを待っています", "running": "作成中..."}
+
+
+# ===== ジョブを投げて、job_idをsession_stateに覚えておく（ボタンを押したときだけ呼ぶ） =====
+def submit_job(session_key: str, kind: str, func: Callable[[JobContext], Any], key_parts: tuple,
+               heavy: bool = False, profile: str | None = None) -> str:
+    job_id = get_scheduler().submit(kind, func, key_parts, heavy=heavy, profile=profile)
+    st.session_state[session_key] = job_id
+    return job_id
+
+
+# ===== 実行中ならその場で進捗を表示し、終わっていればジョブを返す =====
+# 他のウィジェットを触ってページが再実行されても、job_idから同じジョブを見に行くだけなので分析はやり直さない
+def poll_job(session_key: str, render_preview: Callable[[Any], None] | None = None) -> Job | None:
+    job_id = st.session_state.get(session_key)
+    if job_id is None:
+        return None
+    job = get_scheduler().get(job_id)
+    if job is None:  # 古くなって消えたジョブ
+        del st.session_state[session_key]
+        return None
+
+    if not job.finished:
+        _progress_fragment(job_id, render_preview)
+        return None
+    if job.status == "failed":
+        st.error("分析中にエラーが発生しました。")
+        with st.expander("エラーの詳細"):
+            st.code(job.error)
+        return None
+    if job.status == "cancelled":
+        st.warning("キャンセルしました。")
+        return None
+    if job.cached:
+        st.info("同じファイル・同じ設定の結果があったので、それを表示しています。")
+    return job
+
+
+# ===== 進捗の表示（この部分だけを一定間隔で再実行する。終わったらページ全体を再実行して結果を出す） =====
+@st.fragment(run_every=POLL_INTERVAL)
+def _progress_fragment(job_id: str, render_preview: Callable[[Any], None] | None):
+    scheduler = get_scheduler()
+    job = scheduler.get(job_id)
+    if job is None or job.finished:
+        st.rerun()
+
+    text = STATUS_LABELS.get(job.status, job.status)
+    if job.message:
+        text = f"{text} {job.message}"
+    st.progress(job.progress, text=text)
+    if st.button("キャンセル", key=f"cancel_{job_id}"):
+        scheduler.cancel(job_id)
+    if render_preview is not None and job.preview is not None:
+        render_preview(job.preview)
+
+
+# ===== プロファイラーの選択（選んだときだけ、次の1回の実行をプロファイルする） =====
+def profile_option() -> str | None:
+    with st.expander("計測"):
+        profile = st.selectbox("プロファイラー（次の実行だけ）", ["なし"] + PROFILERS)
+    return None if profile == "なし" else profile
+
+
+# ===== 処理時間の内訳（ステージごとの時間・回数、件数、ピークメモリ）。JSONでダウンロードもできる =====
+def show_metrics(*runs: RunMetrics | None):
+    metrics = [run.to_dict() for run in runs if run is not None]
+    if not metrics:
+        return
+    with st.expander("処理時間の内訳"):
+        for m in metrics:
+            st.write(f"**{m['name']}**：{m['wall_seconds']:.2f} 秒"
+                     + (f"、ピークメモリ {m['peak_rss_mb']:.0f} MB" if m["peak_rss_mb"] is not None else ""))
+            if m["stages"]:
+                st.dataframe(pd.DataFrame(m["stages"]), use_container_width=True, hide_index=True)
+            if m["counters"]:
+                st.json(m["counters"])
+            if m["profile_path"]:
+                st.caption(f"プロファイル：{m['profile_path']}")
+        st.download_button("JSONでダウンロード", json.dumps(metrics, ensure_ascii=False, indent=2).encode(),
+                           file_name="metrics.json", mime="application/json")
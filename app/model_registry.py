@@ -0,0 +1,273 @@
+from collections import OrderedDict
+from pathlib import Path
+from instrumentation import stage
+import numpy as np
+import importlib.util, threading, time, os, gc, re
+
+# torch・transformersはimportだけで数秒かかるので、モデルを初めてロードするときに関数の中でimportする
+# （BACKENDSなどの設定だけを使うページやCLIの起動を遅くしない）
+
+# ===== アプリで使うモデル（環境変数で差し替え可能。ベンチマークでは小さな代わりのモデルを使う） =====
+SENTIMENT_MODEL = os.environ.get("SENTIMENT_MODEL", "koheiduck/bert-japanese-finetuned-sentiment")
+ZERO_SHOT_MODEL = os.environ.get("ZERO_SHOT_MODEL", "MoritzLaurer/bge-m3-zeroshot-v2.0-c")
+DEFAULT_MODELS = [
+    ("sentiment-analysis", SENTIMENT_MODEL),
+    ("zero-shot-classification", ZERO_SHOT_MODEL),
+]
+
+# メモリ上限（MB）。環境変数 MODEL_RAM_BUDGET_MB で指定、0以下なら無制限
+DEFAULT_RAM_BUDGET_MB = int(os.environ.get("MODEL_RAM_BUDGET_MB", "0"))
+
+# ===== 推論バックエンド（fp32：今まで通り / int8：Linear層を動的量子化 / onnx：ONNX Runtimeに書き出して実行） =====
+# onnxはrequirements.txtに入れていない任意の依存（pip install optimum[onnxruntime]）なので、入っているときだけ選べる
+def _available_backends() -> list[str]:
+    backends = ["fp32", "int8"]
+    if (importlib.util.find_spec("optimum") is not None and importlib.util.find_spec("optimum.onnxruntime") is not None
+            and importlib.util.find_spec("onnxruntime") is not None):
+        backends.append("onnx")
+    return backends
+
+
+BACKENDS = _available_backends()
+DEFAULT_BACKEND = os.environ.get("INFERENCE_BACKEND", "fp32")
+if DEFAULT_BACKEND not in BACKENDS:
+    raise ValueError(f"INFERENCE_BACKEND must be one of {BACKENDS}: {DEFAULT_BACKEND}"
+                     + (" (onnx needs: pip install optimum[onnxruntime])" if DEFAULT_BACKEND == "onnx" else ""))
+ONNX_CACHE_DIR = Path(os.environ.get("ONNX_CACHE_DIR", Path(__file__).parent / ".cache" / "onnx"))  # 書き出したONNXモデルの保存先
+
+# CPUのスレッド数。0ならPyTorch / ONNX Runtimeのデフォルト
+INTRA_OP_THREADS = int(os.environ.get("INTRA_OP_THREADS", "0"))  # 1つの演算（行列積など）を何スレッドで並列にするか
+INTER_OP_THREADS = int(os.environ.get("INTER_OP_THREADS", "0"))  # 独立した演算を何個同時に走らせるか
+
+
+# ===== モデルのメモリ使用量（パラメータ＋バッファのバイト数）を見積もる =====
+def _estimate_size_bytes(obj) -> int:
+    model = getattr(obj, "model", obj)  # pipelineなら中のモデルを見る
+    if hasattr(model, "model_path"):  # ONNX Runtimeはファイルのサイズで見積もる
+        return Path(model.model_path).stat().st_size
+    if hasattr(model, "state_dict"):  # 量子化したLinear層の重みはparameters()に出てこないのでstate_dictで数える
+        return sum(_tensor_bytes(v) for v in model.state_dict().values())
+    return 0
+
+
+def _tensor_bytes(value) -> int:
+    import torch
+    if isinstance(value, torch.Tensor):
+        return value.numel() * value.element_size()
+    if isinstance(value, (tuple, list)):
+        return sum(_tensor_bytes(v) for v in value)
+    return 0
+
+
+# ===== プロセス全体で共有するモデルレジストリ（LRUで追い出し） =====
+class ModelRegistry:
+    def __init__(self, ram_budget_mb: int = DEFAULT_RAM_BUDGET_MB):
+        self.ram_budget_bytes = max(ram_budget_mb, 0) * 1024 * 1024
+        self._models = OrderedDict()  # key -> {"model", "load_seconds", "size_bytes", "hits"}。末尾が最近使ったもの
+        self._lock = threading.Lock()
+        self._loading_locks = {}      # 同じモデルを2回同時にロードしないためのキーごとのロック
+
+    def get(self, key, loader):
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)  # 使ったので最新にする
+                self._models[key]["hits"] += 1
+                return self._models[key]["model"]
+            key_lock = self._loading_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:  # 待っている間に別スレッドがロードし終わっていればそれを使う
+                if key in self._models:
+                    self._models.move_to_end(key)
+                    self._models[key]["hits"] += 1
+                    return self._models[key]["model"]
+
+            start = time.perf_counter()
+            with stage("model_load"):
+                model = loader()
+            load_seconds = time.perf_counter() - start
+
+            with self._lock:
+                self._models[key] = {
+                    "model": model,
+                    "load_seconds": load_seconds,
+                    "size_bytes": _estimate_size_bytes(model),
+                    "hits": 0,
+                }
+                self._evict(keep=key)
+                self._loading_locks.pop(key, None)
+            return model
+
+    # メモリ上限を超えていたら古い順に追い出す（今ロードしたものは残す）
+    def _evict(self, keep=None):
+        if self.ram_budget_bytes <= 0:
+            return
+        evicted = False
+        while self._total_bytes() > self.ram_budget_bytes:
+            victim = next((k for k in self._models if k != keep), None)
+            if victim is None:
+                break
+            del self._models[victim]
+            evicted = True
+        if evicted:
+            gc.collect()
+
+    def _total_bytes(self) -> int:
+        return sum(entry["size_bytes"] for entry in self._models.values())
+
+    def set_ram_budget(self, ram_budget_mb: int):
+        with self._lock:
+            self.ram_budget_bytes = max(ram_budget_mb, 0) * 1024 * 1024
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+        gc.collect()
+
+    # ロード時間と常駐サイズの一覧
+    def stats(self) -> list[dict]:
+        with self._lock:
+            return [
+                {
+                    "task": key[0],
+                    "model": key[1],
+                    "backend": key[2],
+                    "load_seconds": round(entry["load_seconds"], 2),
+                    "size_mb": round(entry["size_bytes"] / 1024 / 1024, 1),
+                    "hits": entry["hits"],
+                }
+                for key, entry in self._models.items()
+            ]
+
+
+registry = ModelRegistry()
+
+
+# ===== スレッド数の設定（プロセス全体に効く。inter-opはPyTorchが並列処理を始める前に1回しか設定できない） =====
+_threads_configured = False
+_threads_lock = threading.Lock()
+
+def configure_threads(intra_op: int = INTRA_OP_THREADS, inter_op: int = INTER_OP_THREADS):
+    global _threads_configured
+    with _threads_lock:
+        if _threads_configured:
+            return
+        import torch
+        if intra_op > 0:
+            torch.set_num_threads(intra_op)
+        if inter_op > 0:
+            try:
+                torch.set_num_interop_threads(inter_op)
+            except RuntimeError:
+                pass  # すでに並列処理が始まっていると設定できない（intra-opだけ効かせる）
+        _threads_configured = True
+
+
+# ===== バックエンドごとのロード =====
+def _onnx_export_dir(model_name: str) -> Path:
+    return ONNX_CACHE_DIR / re.sub(r"[^\w.-]", "_", model_name)
+
+
+def _load_onnx_pipeline(task: str, model_name: str, **pipeline_kwargs):
+    from optimum.onnxruntime import ORTModelForSequenceClassification  # onnxを選んだときだけ読む
+    import onnxruntime
+    from transformers import pipeline, AutoTokenizer
+
+    session_options = onnxruntime.SessionOptions()
+    if INTRA_OP_THREADS > 0:
+        session_options.intra_op_num_threads = INTRA_OP_THREADS
+    if INTER_OP_THREADS > 0:
+        session_options.inter_op_num_threads = INTER_OP_THREADS
+
+    # 1回書き出したらディスクに保存して、次からはそれを読む
+    export_dir = _onnx_export_dir(model_name)
+    if (export_dir / "model.onnx").exists():
+        model = ORTModelForSequenceClassification.from_pretrained(export_dir, session_options=session_options)
+        tokenizer = AutoTokenizer.from_pretrained(export_dir)
+    else:
+        model = ORTModelForSequenceClassification.from_pretrained(model_name, export=True, session_options=session_options)
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model.save_pretrained(export_dir)
+        tokenizer.save_pretrained(export_dir)
+    return pipeline(task, model=model, tokenizer=tokenizer, **pipeline_kwargs)
+
+
+def _load_pipeline(task: str, model_name: str, backend: str, **pipeline_kwargs):
+    if backend == "onnx":
+        return _load_onnx_pipeline(task, model_name, **pipeline_kwargs)
+    import torch
+    from transformers import pipeline
+
+    loaded = pipeline(task, model=model_name, **pipeline_kwargs)
+    if backend == "int8":
+        # Linear層の重みをint8にして、活性化は実行時に量子化する（CPU向け。精度はparity_checkで確認）
+        loaded.model = torch.ao.quantization.quantize_dynamic(loaded.model, {torch.nn.Linear}, dtype=torch.qint8)
+    return loaded
+
+
+# ===== pipelineをレジストリ経由で取得（バックエンドごとに1回だけロード） =====
+def get_pipeline(task: str, model_name: str, backend: str = DEFAULT_BACKEND, **pipeline_kwargs):
+    if backend not in BACKENDS:
+        raise ValueError(f"backend must be one of {BACKENDS}: {backend}")
+    configure_threads()
+    key = (task, model_name, backend, tuple(sorted(pipeline_kwargs.items())))
+    return registry.get(key, lambda: _load_pipeline(task, model_name, backend, **pipeline_kwargs))
+
+
+# ===== fp32との一致確認（ラベルの確率分布の差が許容範囲内か） =====
+def _label_distributions(loaded, texts: list[str], batch_size: int = 32) -> np.ndarray:
+    import torch
+    tokenizer = loaded.tokenizer
+    max_length = min(tokenizer.model_max_length, 512)
+    distributions = []
+    with torch.inference_mode():
+        for start in range(0, len(texts), batch_size):
+            encoded = tokenizer(texts[start:start + batch_size], padding=True, truncation=True,
+                                max_length=max_length, return_tensors="pt")
+            logits = loaded.model(**encoded).logits
+            distributions.append(logits.softmax(dim=-1).float().cpu().numpy())
+    return np.concatenate(distributions) if distributions else np.zeros((0, 0))
+
+
+def parity_check(task: str, model_name: str, texts: list[str], backends: list[str] = BACKENDS,
+                 tolerance: float = 0.02) -> list[dict]:
+    reference = _label_distributions(get_pipeline(task, model_name, "fp32"), texts)
+    rows = []
+    for backend in backends:
+        start = time.perf_counter()
+        distributions = _label_distributions(get_pipeline(task, model_name, backend), texts)
+        seconds = time.perf_counter() - start
+        diff = np.abs(distributions - reference)
+        rows.append({
+            "backend": backend,
+            "seconds": round(seconds, 3),
+            "max_abs_diff": float(diff.max()) if diff.size else 0.0,
+            "mean_abs_diff": float(diff.mean()) if diff.size else 0.0,
+            "top_label_agreement": float(np.mean(distributions.argmax(axis=1) == reference.argmax(axis=1))) if len(texts) else None,
+            "within_tolerance": bool(diff.size == 0 or diff.max() <= tolerance),
+        })
+    return rows
+
+
+# ===== 起動時のウォームアップ =====
+def warmup_models(models: list[tuple[str, str]] = DEFAULT_MODELS):
+    for task, model_name in models:
+        get_pipeline(task, model_name)
+
+
+_warmup_thread = None
+_warmup_lock = threading.Lock()
+
+# app_mainはリランのたびに実行されるので、ウォームアップはプロセスで1回だけバックグラウンドで走らせる
+def start_warmup(models: list[tuple[str, str]] = DEFAULT_MODELS):
+    global _warmup_thread
+    with _warmup_lock:
+        if _warmup_thread is not None:
+            return
+        _warmup_thread = threading.Thread(target=warmup_models, args=(models,), daemon=True)
+    _warmup_thread.start()
+
+
+def model_stats() -> list[dict]:
+    return registry.stats()
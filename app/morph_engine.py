@@ -0,0 +1,144 @@
+from sudachipy import tokenizer, dictionary
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from instrumentation import stage, count
+import multiprocessing, threading, os
+import neologdn, re
+
+# 解析ロジックを変えたら上げる（トークンキャッシュのキーに入る）
+ANALYZER_VERSION = 1
+
+# 平仮名、カナ、数字、英字の1文字（除外対象）
+SINGLE_CHAR_PATTERN = re.compile(r"[ぁ-んァ-ヶー0-9a-z]")
+
+# ワーカープロセス数（環境変数 MORPH_WORKERS で指定、未指定ならCPUコア数）
+DEFAULT_WORKERS = int(os.environ.get("MORPH_WORKERS", "0")) or (os.cpu_count() or 1)
+
+# SudachiDictの種類（環境変数 SUDACHI_DICT で指定、未指定ならfull）
+DEFAULT_DICT_TYPE = os.environ.get("SUDACHI_DICT", "full")
+
+
+# ===== 形態素解析の設定（品詞フィルタ、ストップワード、分割モード、辞書） =====
+@dataclass(frozen=True)
+class MorphConfig:
+    keep_pos: tuple[str, ...]                       # 抽出したい品詞
+    drop_pos: tuple[tuple[str, str], ...] = ()      # 除外したい (品詞, 品詞細分類1) の組み合わせ
+    stopwords: frozenset[str] = frozenset()         # ストップワード
+    split_mode: str = "C"                           # A～C（C：最も長い分割形式）
+    dict_type: str = DEFAULT_DICT_TYPE              # SudachiDictの種類（small / core / full）
+
+    # トークンキャッシュのキー。ストップワードはキャッシュから取り出した後にかけるのでキーに含めない
+    def cache_key(self) -> str:
+        return f"v{ANALYZER_VERSION}|{self.split_mode}|{self.dict_type}|{','.join(self.keep_pos)}|{self.drop_pos}"
+
+
+# ===== トークナイザー（スレッドごと・プロセスごとに辞書ごと1つだけ作る） =====
+_local = threading.local()
+
+def _get_tokenizer(dict_type: str):
+    tokenizers = getattr(_local, "tokenizers", None)
+    if tokenizers is None:
+        tokenizers = _local.tokenizers = {}
+    if dict_type not in tokenizers:
+        with stage("dictionary_load"):
+            tokenizers[dict_type] = dictionary.Dictionary(dict_type=dict_type).create()
+    return tokenizers[dict_type]
+
+
+# ===== 1文書を形態素解析して、品詞と1文字の条件に合う単語（辞書形）を返す（ストップワードは未適用） =====
+def _analyze_base(text: str, config: MorphConfig) -> list[str]:
+    tokenizer_obj = _get_tokenizer(config.dict_type)
+    mode = getattr(tokenizer.Tokenizer.SplitMode, config.split_mode)
+
+    norm_text = neologdn.normalize(text).lower()      # 正規化、小文字化
+    dictionary_form_line = []
+    for token in tokenizer_obj.tokenize(norm_text, mode):  # トークンに分解
+        pos = token.part_of_speech()  # 品詞の抽出
+        if pos[0] not in config.keep_pos or (pos[0], pos[1]) in config.drop_pos:
+            continue
+        dictionary_form = token.dictionary_form()  # 辞書に載ってる形（活用のない元の形）
+        if SINGLE_CHAR_PATTERN.fullmatch(dictionary_form):
+            continue
+        dictionary_form_line.append(dictionary_form)
+    return dictionary_form_line
+
+
+def _remove_stopwords(tokens: list[str], config: MorphConfig) -> list[str]:
+    if not config.stopwords:
+        return tokens
+    return [t for t in tokens if t not in config.stopwords]
+
+
+# ===== 1文書を形態素解析して、条件に合う単語（辞書形）だけ返す =====
+def analyze_text(text: str, config: MorphConfig) -> list[str]:
+    return _remove_stopwords(_analyze_base(text, config), config)
+
+
+def _analyze_chunk(texts: list[str], config: MorphConfig) -> list[list[str]]:
+    return [_analyze_base(text, config) for text in texts]
+
+
+def _init_worker(dict_type: str):
+    _get_tokenizer(dict_type)  # 起動時に辞書を読み込んでおく
+
+
+# ===== プロセスプール（1回作ったら使い回す） =====
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+def _get_pool(n_workers: int, dict_type: str) -> ProcessPoolExecutor:
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != n_workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # Streamlitはスレッドで動いているのでforkではなくspawnでワーカーを起動する
+            _pool = ProcessPoolExecutor(
+                max_workers=n_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(dict_type,),
+            )
+            _pool_workers = n_workers
+        return _pool
+
+
+def _tokenize_uncached(texts: list[str], config: MorphConfig, n_workers: int, chunk_size: int) -> list[list[str]]:
+    # 少量ならプロセス起動のほうが高くつくのでそのまま処理
+    if n_workers <= 1 or len(texts) <= chunk_size:
+        return _analyze_chunk(texts, config)
+
+    pool = _get_pool(n_workers, config.dict_type)
+    chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]  # 文書のかたまりごとにワーカーへ
+    all_tokens = []
+    for chunk_tokens in pool.map(_analyze_chunk, chunks, [config] * len(chunks)):  # mapは投入順に結果を返す
+        all_tokens.extend(chunk_tokens)
+    return all_tokens
+
+
+# ===== 複数文書をまとめて形態素解析（文書の順番どおりに返す。単語が残らなかった文書は空リスト） =====
+def tokenize_documents(texts: list[str], config: MorphConfig, n_workers: int = DEFAULT_WORKERS,
+                       chunk_size: int = 500, cache=None) -> list[list[str]]:
+    if cache is None:
+        with stage("tokenize"):
+            base_tokens = _tokenize_uncached(texts, config, n_workers, chunk_size)
+    else:
+        # キャッシュにある文書はそのまま使い、初めて見る文書だけ形態素解析する
+        config_key = config.cache_key()
+        keys = [cache.make_key(text, config_key) for text in texts]
+        with stage("token_cache"):
+            cached = cache.get_many(list(set(keys)))
+        missing = list({key: i for i, key in enumerate(keys) if key not in cached}.values())  # 同じ本文は1回だけ解析
+        with stage("tokenize"):
+            new_tokens = _tokenize_uncached([texts[i] for i in missing], config, n_workers, chunk_size)
+        with stage("token_cache"):
+            cache.put_many([(keys[i], tokens) for i, tokens in zip(missing, new_tokens)])
+        cached.update((keys[i], tokens) for i, tokens in zip(missing, new_tokens))
+        base_tokens = [cached[key] for key in keys]
+        count("token_cache_hits", len(texts) - len(missing))
+
+    all_tokens = [_remove_stopwords(tokens, config) for tokens in base_tokens]
+    count("docs", len(texts))
+    count("tokens", sum(len(tokens) for tokens in all_tokens))
+    return all_tokens
@@ -0,0 +1,191 @@
+from collections import OrderedDict
+import networkx as nx
+import numpy as np
+import threading
+
+LAYOUTS = ["spring", "spectral"]
+_CACHE_SIZE = 16          # 覚えておくレイアウトの数
+_REUSE_AS_IS = 0.95       # ノードの重なりがこれ以上なら前回の配置をそのまま使う
+_REUSE_AS_INIT = 0.5      # これ以上なら前回の配置を初期値にして少しだけ動かす
+
+
+# ===== ペアのリストからグラフを作る =====
+def build_graph(top_pairs: list[tuple[tuple[str, str], float]]) -> nx.Graph:
+    G = nx.Graph()  # グラフの初期化。無向グラフ（A-BとB-Aは同じとみなす）
+    G.add_weighted_edges_from((word1, word2, weight) for (word1, word2), weight in top_pairs)
+    return G
+
+
+# ===== 枝刈り：重みのしきい値、k-core、ノード数2の孤立したサブネットワーク =====
+def prune_graph(G: nx.Graph, min_weight: float | None = None, k_core: int | None = None) -> nx.Graph:
+    if min_weight is not None:
+        G.remove_edges_from([(u, v) for u, v, w in G.edges(data="weight") if w < min_weight])
+        G.remove_nodes_from([n for n in list(G.nodes) if G.degree(n) == 0])
+    if k_core is not None and k_core > 1:
+        G = nx.k_core(G, k=k_core).copy()  # 次数k未満のノードを繰り返し除いた部分グラフ
+    small_components = [c for c in nx.connected_components(G) if len(c) == 2]  # ノード数が2しかないやつ（=孤立）
+    for c in small_components:
+        G.remove_nodes_from(c)
+    return G
+
+
+# ===== 重み付き次数（strength）を疎行列の行和でまとめて計算 =====
+def node_strengths(G: nx.Graph) -> np.ndarray:
+    if G.number_of_nodes() == 0:
+        return np.zeros(0)
+    A = nx.to_scipy_sparse_array(G, nodelist=list(G.nodes), weight="weight", format="csr")
+    return np.asarray(A.sum(axis=1)).ravel()
+
+
+# ===== 前回の配置のキャッシュ（キーごとに最後の配置を覚える） =====
+_layout_cache = OrderedDict()
+_layout_cache_lock = threading.Lock()
+
+
+def _cached_positions(cache_key):
+    with _layout_cache_lock:
+        if cache_key not in _layout_cache:
+            return None
+        _layout_cache.move_to_end(cache_key)
+        return _layout_cache[cache_key]
+
+
+def _store_positions(cache_key, pos: dict):
+    with _layout_cache_lock:
+        _layout_cache[cache_key] = pos
+        _layout_cache.move_to_end(cache_key)
+        while len(_layout_cache) > _CACHE_SIZE:
+            _layout_cache.popitem(last=False)
+
+
+# 新しく増えたノードは、配置済みの隣のノードの平均位置（なければ原点付近）に置く
+def _fill_new_nodes(G: nx.Graph, previous: dict, seed: int) -> dict:
+    rng = np.random.default_rng(seed)
+    pos = {n: np.asarray(previous[n]) for n in G.nodes if n in previous}
+    for n in G.nodes:
+        if n in pos:
+            continue
+        neighbors = [pos[m] for m in G.neighbors(n) if m in pos]
+        center = np.mean(neighbors, axis=0) if neighbors else np.zeros(2)
+        pos[n] = center + rng.normal(scale=0.05, size=2)
+    return pos
+
+
+_EXACT_REPULSION_LIMIT = 1000  # これより多いノード数では斥力を格子で近似する
+
+
+# ===== 斥力（k²/d）の計算 =====
+# ノードが多いときはBarnes-Hutと同じ考え方で、遠くのノードは格子セルの重心にまとめて近似し、同じセルの中だけ厳密に計算する
+def _repulsion(x: np.ndarray, y: np.ndarray, k2: float) -> tuple[np.ndarray, np.ndarray]:
+    n = len(x)
+    if n <= _EXACT_REPULSION_LIMIT:
+        dx = x[:, None] - x[None, :]
+        dy = y[:, None] - y[None, :]
+        inv = k2 / np.maximum(dx * dx + dy * dy, 1e-4)
+        return (dx * inv).sum(axis=1), (dy * inv).sum(axis=1)
+
+    grid = int(np.ceil(2 * n ** 0.25))  # 1辺のセル数（5000ノードで17×17）
+    gx = np.minimum(((x - x.min()) / max(np.ptp(x), 1e-9) * grid).astype(np.int64), grid - 1)
+    gy = np.minimum(((y - y.min()) / max(np.ptp(y), 1e-9) * grid).astype(np.int64), grid - 1)
+    cell = gx * grid + gy
+    mass = np.bincount(cell, minlength=grid * grid).astype(np.float64)
+    occupied = np.flatnonzero(mass)
+    m = mass[occupied]
+    cx = np.bincount(cell, weights=x, minlength=grid * grid)[occupied] / m
+    cy = np.bincount(cell, weights=y, minlength=grid * grid)[occupied] / m
+
+    # 遠く：セルの重心（ノード数ぶんの重み）からの斥力。自分のセルは除く
+    dx = x[:, None] - cx[None, :]
+    dy = y[:, None] - cy[None, :]
+    inv = k2 * m[None, :] / np.maximum(dx * dx + dy * dy, 1e-4)
+    inv[np.arange(n), np.searchsorted(occupied, cell)] = 0
+    fx = (dx * inv).sum(axis=1)
+    fy = (dy * inv).sum(axis=1)
+
+    # 近く：同じセルの中は厳密に
+    order = np.argsort(cell, kind="stable")
+    bounds = np.searchsorted(cell[order], occupied)
+    for start, end in zip(bounds, np.append(bounds[1:], n)):
+        if end - start < 2:
+            continue
+        members = order[start:end]
+        dx = x[members, None] - x[None, members]
+        dy = y[members, None] - y[None, members]
+        inv = k2 / np.maximum(dx * dx + dy * dy, 1e-4)
+        fx[members] += (dx * inv).sum(axis=1)
+        fy[members] += (dy * inv).sum(axis=1)
+    return fx, fy
+
+
+# ===== 大きなグラフ向け：Fruchterman-Reingold法をベクトル化して回す（引力はエッジだけの疎な計算） =====
+def _vectorized_force_layout(G: nx.Graph, init: dict, iterations: int, seed: int) -> dict:
+    nodes = list(G.nodes)
+    n = len(nodes)
+    if n < 3:
+        return nx.spring_layout(G, seed=seed)
+    index = {node: i for i, node in enumerate(nodes)}
+    pos = np.array([init[node] for node in nodes], dtype=np.float64)
+    edges = np.array([(index[u], index[v], w) for u, v, w in G.edges(data="weight", default=1)], dtype=np.float64)
+    src, dst = edges[:, 0].astype(np.int64), edges[:, 1].astype(np.int64)
+    weights = edges[:, 2] / edges[:, 2].max()
+
+    k = np.sqrt(1.0 / n)  # 理想的なノード間距離
+    temperature = 0.1
+    cooling = temperature / (iterations + 1)
+    for _ in range(iterations):
+        fx, fy = _repulsion(pos[:, 0], pos[:, 1], k * k)
+        disp = np.stack([fx, fy], axis=1)
+        delta = pos[src] - pos[dst]  # 引力：d²/k（重み付き）
+        dist = np.maximum(np.sqrt((delta ** 2).sum(axis=-1)), 1e-2)
+        force = delta * (dist / k * weights)[:, None]
+        np.add.at(disp, src, -force)
+        np.add.at(disp, dst, force)
+        length = np.maximum(np.sqrt((disp ** 2).sum(axis=-1)), 1e-2)
+        pos += disp / length[:, None] * np.minimum(length, temperature)[:, None]  # 1回で動ける距離は温度まで
+        temperature -= cooling
+
+    pos = nx.rescale_layout(pos)
+    return {node: pos[i] for i, node in enumerate(nodes)}
+
+
+# ===== スペクトル配置（疎行列の固有ベクトル）を初期値にして、ベクトル化した力学モデルで整える =====
+def _spectral_force_layout(G: nx.Graph, seed: int, iterations: int) -> dict:
+    if G.number_of_nodes() < 3:
+        return nx.spring_layout(G, seed=seed)
+    init = nx.spectral_layout(G, weight="weight")  # 500ノード以上は内部で疎行列の固有値計算になる
+    rng = np.random.default_rng(seed)
+    init = {n: p + rng.normal(scale=1e-3, size=2) for n, p in init.items()}  # 同じ位置に重なったノードをずらす
+    return _vectorized_force_layout(G, init, iterations, seed)
+
+
+# ===== ノード配置を計算（cache_keyを渡すと、グラフがあまり変わっていなければ前回の配置を使い回す） =====
+def compute_layout(G: nx.Graph, method: str = "spring", cache_key=None, seed: int = 42) -> dict:
+    if method not in LAYOUTS:
+        raise ValueError(f"layout must be one of {LAYOUTS}: {method}")
+
+    previous = _cached_positions((cache_key, method)) if cache_key is not None else None
+    init = None
+    if previous is not None and G.number_of_nodes() > 0:
+        overlap = len(set(G.nodes) & set(previous)) / len(set(G.nodes) | set(previous))
+        if overlap >= _REUSE_AS_IS:
+            pos = _fill_new_nodes(G, previous, seed)
+            _store_positions((cache_key, method), pos)
+            return pos
+        if overlap >= _REUSE_AS_INIT:
+            init = _fill_new_nodes(G, previous, seed)
+
+    if method == "spring":
+        # ノードとエッジをちょうどいい位置に散らばるように計算してくれる関数。Kの値で密集具合が調整できる
+        if init is None:
+            pos = nx.spring_layout(G, k=0.5, seed=seed)
+        else:
+            pos = nx.spring_layout(G, k=0.5, pos=init, iterations=15, seed=seed)
+    else:
+        if init is None:
+            pos = _spectral_force_layout(G, seed, iterations=50)
+        else:
+            pos = _vectorized_force_layout(G, init, iterations=15, seed=seed)
+
+    if cache_key is not None:
+        _store_positions((cache_key, method), pos)
+    return pos
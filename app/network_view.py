@@ -0,0 +1,146 @@
+import json
+import networkx as nx
+import numpy as np
+
+# ===== グラフをブラウザ描画用のJSONに変換（配置はサーバーで計算済みのものを渡す） =====
+def graph_to_json(G: nx.Graph, pos: dict, node_sizes: np.ndarray, measure: str = "count") -> dict:
+    nodes = list(G.nodes)
+    index = {node: i for i, node in enumerate(nodes)}
+    return {
+        "measure": measure,
+        "nodes": [
+            {"id": str(node), "x": round(float(pos[node][0]), 4), "y": round(float(pos[node][1]), 4),
+             "size": round(float(size), 2)}
+            for node, size in zip(nodes, node_sizes)
+        ],
+        "edges": [
+            {"source": index[u], "target": index[v], "weight": round(float(w), 4)}
+            for u, v, w in G.edges(data="weight", default=1)
+        ],
+    }
+
+
+# ===== canvasで描画するHTML（ズーム・パン・重みでの絞り込み・単語検索・ホバーはすべてブラウザ側で処理） =====
+_TEMPLATE = """
+<div id="root" style="font-family: sans-serif; font-size: 13px;">
+  <div style="display: flex; gap: 16px; align-items: center; margin-bottom: 4px;">
+    <label>最小の重み <input id="minWeight" type="range" min="0" max="1" step="any" value="0" style="vertical-align: middle;">
+      <span id="minWeightValue"></span></label>
+    <label>単語を検索 <input id="search" type="text" size="12"></label>
+    <span id="count" style="color: #666;"></span>
+  </div>
+  <canvas id="canvas" style="width: 100%; height: __HEIGHT__px; border: 1px solid #ddd; cursor: grab;"></canvas>
+  <div id="tooltip" style="position: absolute; display: none; pointer-events: none; background: rgba(255,255,255,0.95);
+       border: 1px solid #999; border-radius: 4px; padding: 4px 8px;"></div>
+</div>
+<script>
+const data = __DATA__;
+const canvas = document.getElementById("canvas");
+const ctx = canvas.getContext("2d");
+const tooltip = document.getElementById("tooltip");
+const slider = document.getElementById("minWeight");
+const search = document.getElementById("search");
+const nodes = data.nodes, edges = data.edges;
+const neighbors = nodes.map(() => []);
+edges.forEach((e, i) => { neighbors[e.source].push(i); neighbors[e.target].push(i); });
+
+const weights = edges.map(e => e.weight);
+const minW = weights.length ? Math.min(...weights) : 0, maxW = weights.length ? Math.max(...weights) : 1;
+slider.min = minW; slider.max = maxW; slider.value = minW;
+const maxSize = Math.max(1, ...nodes.map(n => n.size));
+
+let view = {scale: 1, tx: 0, ty: 0}, hover = -1, drag = null;
+
+function resize() {
+  const ratio = window.devicePixelRatio || 1;
+  canvas.width = canvas.clientWidth * ratio;
+  canvas.height = canvas.clientHeight * ratio;
+  ctx.setTransform(ratio, 0, 0, ratio, 0, 0);
+  draw();
+}
+// レイアウト座標（-1～1）→ 画面座標
+function toScreen(n) {
+  const w = canvas.clientWidth, h = canvas.clientHeight, s = Math.min(w, h) * 0.45 * view.scale;
+  return [w / 2 + n.x * s + view.tx, h / 2 - n.y * s + view.ty];
+}
+function esc(s) { return s.replace(/[&<>"']/g, c => ({"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#39;"}[c])); }
+function radius(n) { return 3 + 17 * Math.sqrt(n.size / maxSize); }
+
+function draw() {
+  const threshold = parseFloat(slider.value), query = search.value.trim();
+  const w = canvas.clientWidth, h = canvas.clientHeight;
+  ctx.clearRect(0, 0, w, h);
+  const visible = new Uint8Array(nodes.length);
+  let shown = 0;
+  edges.forEach((e, i) => {
+    if (e.weight < threshold) return;
+    visible[e.source] = visible[e.target] = 1;
+    const highlighted = hover >= 0 && (e.source === hover || e.target === hover);
+    const [x1, y1] = toScreen(nodes[e.source]), [x2, y2] = toScreen(nodes[e.target]);
+    ctx.strokeStyle = highlighted ? "rgba(220,60,60,0.8)" : "rgba(0,0,0,0.25)";
+    ctx.lineWidth = 0.5 + 4 * (e.weight - minW) / ((maxW - minW) || 1);
+    ctx.beginPath(); ctx.moveTo(x1, y1); ctx.lineTo(x2, y2); ctx.stroke();
+    shown++;
+  });
+  nodes.forEach((n, i) => {
+    if (!visible[i]) return;
+    const [x, y] = toScreen(n), matched = query && n.id.includes(query);
+    ctx.fillStyle = i === hover ? "#ff8c69" : matched ? "#ffd24d" : "lightblue";
+    ctx.beginPath(); ctx.arc(x, y, radius(n) * Math.sqrt(view.scale), 0, 2 * Math.PI); ctx.fill();
+    ctx.fillStyle = "#222";
+    ctx.font = (matched || i === hover ? "bold " : "") + "12px sans-serif";
+    ctx.textAlign = "center"; ctx.textBaseline = "middle";
+    ctx.fillText(n.id, x, y);
+  });
+  document.getElementById("minWeightValue").textContent = threshold.toFixed(2);
+  document.getElementById("count").textContent = `${shown} / ${edges.length} ペア`;
+}
+
+function nodeAt(mx, my) {
+  let best = -1, bestDist = Infinity;
+  nodes.forEach((n, i) => {
+    const [x, y] = toScreen(n), d = Math.hypot(x - mx, y - my);
+    if (d < radius(n) * Math.sqrt(view.scale) + 2 && d < bestDist) { best = i; bestDist = d; }
+  });
+  return best;
+}
+
+canvas.addEventListener("wheel", ev => {
+  ev.preventDefault();
+  const rect = canvas.getBoundingClientRect(), factor = ev.deltaY < 0 ? 1.2 : 1 / 1.2;
+  const mx = ev.clientX - rect.left - canvas.clientWidth / 2, my = ev.clientY - rect.top - canvas.clientHeight / 2;
+  view.tx = mx - (mx - view.tx) * factor;  // カーソル位置を中心に拡大縮小
+  view.ty = my - (my - view.ty) * factor;
+  view.scale *= factor;
+  draw();
+}, {passive: false});
+canvas.addEventListener("mousedown", ev => { drag = [ev.clientX - view.tx, ev.clientY - view.ty]; canvas.style.cursor = "grabbing"; });
+window.addEventListener("mouseup", () => { drag = null; canvas.style.cursor = "grab"; });
+canvas.addEventListener("mousemove", ev => {
+  if (drag) { view.tx = ev.clientX - drag[0]; view.ty = ev.clientY - drag[1]; draw(); return; }
+  const rect = canvas.getBoundingClientRect(), found = nodeAt(ev.clientX - rect.left, ev.clientY - rect.top);
+  if (found !== hover) { hover = found; draw(); }
+  if (hover >= 0) {
+    const n = nodes[hover];
+    const top = neighbors[hover].map(i => edges[i]).sort((a, b) => b.weight - a.weight).slice(0, 5)
+      .map(e => `${esc(nodes[e.source === hover ? e.target : e.source].id)} (${e.weight})`);
+    tooltip.innerHTML = `<b>${esc(n.id)}</b><br>ノードの大きさ: ${n.size}<br>${data.measure}: ${top.join(", ")}`;
+    tooltip.style.left = (ev.pageX + 12) + "px"; tooltip.style.top = (ev.pageY + 12) + "px";
+    tooltip.style.display = "block";
+  } else {
+    tooltip.style.display = "none";
+  }
+});
+canvas.addEventListener("mouseleave", () => { tooltip.style.display = "none"; hover = -1; draw(); });
+canvas.addEventListener("dblclick", () => { view = {scale: 1, tx: 0, ty: 0}; draw(); });  // ダブルクリックで元の表示に戻す
+slider.addEventListener("input", draw);
+search.addEventListener("input", draw);
+window.addEventListener("resize", resize);
+resize();
+</script>
+"""
+
+
+def render_network_html(graph_json: dict, height: int = 640) -> str:
+    data = json.dumps(graph_json, ensure_ascii=False).replace("</", "<\\/")  # </script> で途切れないように
+    return _TEMPLATE.replace("__HEIGHT__", str(height)).replace("__DATA__", data)
@@ -1,19 +1,19 @@
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
 from bs4 import BeautifulSoup  # HTMLやXMLをきれいに解析してデータを取り出すためのライブラリ
 import pandas as pd
-from selenium.common.exceptions import TimeoutException     # 要素が待機時間内に見つからなかった場合だすエラー
-from selenium.webdriver.support.ui import WebDriverWait     # 「何かの状態になるまで」明示的に待機するためのクラス
-from selenium.webdriver.support import expected_conditions  # 「どんな状態を待つか」を指定するための関数群
-import requests, json, time, urllib.parse
-from sudachipy import tokenizer, dictionary
-import neologdn, re, itertools
-from collections import Counter
-from matplotlib import rcParams
+import json, logging, os, threading, atexit, urllib.parse
+from article_fetcher import ArticleFetcher
+from article_store import ArticleStore, DEFAULT_MAX_AGE_DAYS
+from morph_engine import MorphConfig, tokenize_documents
+from token_cache import get_token_cache
+from cooccurrence_engine import count_cooccurrence, rank_pairs, CooccurrenceAccumulator
+import re
 import networkx as nx
-import matplotlib.pyplot as plt
+from network_layout import build_graph, prune_graph, node_strengths, compute_layout
+from network_view import graph_to_json
+from instrumentation import stage, count, timed_iter
+# selenium・webdriver_manager（ブラウザを使うときだけ）とmatplotlib（画像で描画するときだけ）は使う関数の中でimportする
+
+logger = logging.getLogger(__name__)
 
 # ===== 検索KWをエンコードして一覧結果のURL作成 =====
 def make_search_url(keyword: str):
@@ -22,166 +22,329 @@ def make_search_url(keyword: str):
     return search_url
 
 
-# ===== 検索結果一覧から会社名と記事URLを取得 =====
-def get_search_results(search_url: str):
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()))  # Chromeを自動操作するためのWebDriverを起動
-    driver.get(search_url)  # URLにアクセス
-
-    for i in range(1):  # もっと見るを1回だけ押下（重いから2ページ分だけ/1ページ40記事）
-        try:
-            wait = WebDriverWait(driver, 10)  # 最長10秒まで「クリックできる状態になる」のを待つ
-            more_button = wait.until(
-                expected_conditions.element_to_be_clickable((By.XPATH, "//button[.//span[normalize-space()='もっと見る']]"))
-            )
-            more_button.click()
-            time.sleep(3)  # 3秒待つ
-        except TimeoutException:  # 10秒たってもボタンが見つからないときにだすエラー
-            break  # もう押せないからループ終了
-
-    page_source = driver.page_source  # ソースコードをまるごと取得
+# ===== 検索結果一覧のHTMLから会社名と記事URLを取り出す =====
+# クラス名の末尾（__No7uQ など）はサイト更新で変わるので前方一致で探す
+def parse_search_results(page_source: str) -> list[tuple[str, str]]:
     soup = BeautifulSoup(page_source, "html.parser")  # HTMLをPythonで扱いやすい形に変換
-    driver.quit()  # ブラウザを閉じる
-
     search_results = []
-    for article in soup.find_all("article", class_="release-card_article__No7uQ"):  # <article>タグの中にある情報を全部取得
+    for article in soup.find_all("article", class_=re.compile(r"^release-card_article")):  # <article>タグの中にある情報を全部取得
         title_tag = article.find("h3")  # タイトル。<h3>タグは一個しかないからクラス名は省略
-        company_tag = article.find("a", class_="release-card_companyLink__jRgSJ")  # 会社名
+        company_tag = article.find("a", class_=re.compile(r"^release-card_companyLink"))  # 会社名
         link_tag = article.find("a", href=True)  # 記事リンク
 
         if title_tag and company_tag and link_tag:  # 3つともそろったら
-            url = "https://prtimes.jp" + link_tag["href"]
+            url = urllib.parse.urljoin("https://prtimes.jp", link_tag["href"])
             company_name = company_tag.text.strip()
             search_results.append((company_name, url))
+    return search_results
+
+
+# ===== 検索結果一覧をHTTPでページ送りしながら取得（ブラウザ不要） =====
+# ページ番号のクエリパラメータはサイトの仕様として公開されていないので、効いているかを毎回確かめる。
+# 2ページ目以降が前のページと同じ記事しか返さない（パラメータが無視された）・取得に失敗したときは
+# SearchPaginationErrorにして、get_search_resultsでSeleniumに切り替える（黙って40記事で止めない）
+# パラメータ名は実際のサイトでまだ確かめていないので、環境変数 PRTIMES_PAGE_PARAM で差し替えられるようにしておく
+# （確認は benchmarks/check_search_pagination.py。Seleniumに切り替えた回数は search_selenium_fallbacks に数える）
+SEARCH_PAGE_PARAM = os.environ.get("PRTIMES_PAGE_PARAM", "search_pagenum")
+SEARCH_PAGE_SIZE = 40  # 1ページの記事数（これより少なければ最終ページ）
+
+
+class SearchPaginationError(RuntimeError):
+    def __init__(self, message: str, results: list[tuple[str, str]]):
+        super().__init__(message)
+        self.results = results  # 失敗するまでに取れた分
+
+
+def get_search_results_http(search_url: str, max_pages: int = 2, fetcher: ArticleFetcher | None = None):
+    fetcher = fetcher or ArticleFetcher()
+    search_results = []
+    seen = set()
+    for page in range(1, max_pages + 1):
+        page_url = search_url if page == 1 else f"{search_url}&{SEARCH_PAGE_PARAM}={page}"
+        try:
+            response = fetcher.fetch(page_url)
+        except Exception as e:
+            count("search_page_errors")
+            if page == 1:  # 1ページ目が取れなければ空で返す（呼び出し側でSeleniumに切り替える）
+                logger.warning("search page 1 failed: %s: %r", page_url, e)
+                return []
+            raise SearchPaginationError(f"search page {page} failed: {page_url}: {e!r}", search_results) from e
+        page_results = parse_search_results(response.text)
+        new_results = [(company, url) for company, url in page_results if url not in seen]
+        if page > 1 and page_results and not new_results:
+            raise SearchPaginationError(
+                f"search page {page} repeated earlier results; is {SEARCH_PAGE_PARAM!r} still honoured? {page_url}",
+                search_results)
+        seen.update(url for _, url in new_results)
+        search_results.extend(new_results)
+        if len(page_results) < SEARCH_PAGE_SIZE:  # 記事が足りないページは最終ページ
+            break
+    return search_results
+
+
+# ===== Seleniumのブラウザ（プロセスで1つだけ起動して使い回す） =====
+_driver = None
+_driver_lock = threading.Lock()
+
+def _get_driver():
+    global _driver
+    if _driver is None:
+        from selenium import webdriver
+        from selenium.webdriver.chrome.service import Service
+        from webdriver_manager.chrome import ChromeDriverManager
+        options = webdriver.ChromeOptions()
+        options.add_argument("--headless=new")
+        options.add_argument("--no-sandbox")
+        options.add_argument("--disable-dev-shm-usage")
+        # ドライバのインストール確認は最初の1回だけ
+        with stage("chrome_launch"):
+            _driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
+        atexit.register(_quit_driver)
+    return _driver
+
+
+def _quit_driver():
+    global _driver
+    if _driver is not None:
+        try:
+            _driver.quit()  # ブラウザを閉じる
+        finally:
+            _driver = None
+
+
+# ===== 検索結果一覧をSeleniumで取得（HTTPで取れなかったときの予備） =====
+def get_search_results_selenium(search_url: str, max_pages: int = 2):
+    from selenium.webdriver.common.by import By
+    from selenium.common.exceptions import TimeoutException, WebDriverException  # 要素が待機時間内に見つからなかった場合だすエラー
+    from selenium.webdriver.support.ui import WebDriverWait     # 「何かの状態になるまで」明示的に待機するためのクラス
+    from selenium.webdriver.support import expected_conditions  # 「どんな状態を待つか」を指定するための関数群
+
+    more_button_xpath = "//button[.//span[normalize-space()='もっと見る']]"
+    with _driver_lock:  # ブラウザは1つなので同時に使わない
+        driver = _get_driver()
+        try:
+            driver.get(search_url)  # URLにアクセス
+            for i in range(max_pages - 1):  # もっと見るを押した回数＋1ページ分（1ページ40記事）
+                try:
+                    wait = WebDriverWait(driver, 10)  # 最長10秒まで「クリックできる状態になる」のを待つ
+                    more_button = wait.until(expected_conditions.element_to_be_clickable((By.XPATH, more_button_xpath)))
+                    card_count = len(driver.find_elements(By.TAG_NAME, "article"))
+                    more_button.click()
+                    # 固定で待たずに、記事カードが増えるまで待つ
+                    wait.until(lambda d: len(d.find_elements(By.TAG_NAME, "article")) > card_count)
+                except TimeoutException:  # 10秒たってもボタンが見つからない・記事が増えないときにだすエラー
+                    break  # もう押せないからループ終了
+            page_source = driver.page_source  # ソースコードをまるごと取得
+        except WebDriverException:
+            _quit_driver()  # ブラウザが壊れたら次回作り直す
+            raise
+    return parse_search_results(page_source)
+
+
+# ===== 検索結果一覧から会社名と記事URLを取得 =====
+def get_search_results(search_url: str, max_pages: int = 2, fetcher: ArticleFetcher | None = None):
+    try:
+        with stage("search_http"):
+            search_results = get_search_results_http(search_url, max_pages, fetcher)
+    except SearchPaginationError as e:  # 途中のページが取れなかったので、ブラウザで全ページを取り直す
+        logger.warning("%s; falling back to Selenium", e)
+        count("search_pagination_fallbacks")
+        count("search_selenium_fallbacks")
+        try:
+            with stage("search_selenium"):
+                search_results = get_search_results_selenium(search_url, max_pages)
+        except Exception:  # ブラウザも使えなければ、HTTPで取れた分だけ返す
+            logger.exception("Selenium fallback failed; using %d results from HTTP", len(e.results))
+            search_results = e.results
+    else:
+        if not search_results:  # HTTPで一覧が取れなかったときだけブラウザを使う
+            logger.warning("no search results over HTTP; falling back to Selenium: %s", search_url)
+            count("search_selenium_fallbacks")
+            with stage("search_selenium"):
+                search_results = get_search_results_selenium(search_url, max_pages)
     articles_list_df = pd.DataFrame(search_results, columns=["company_name", "url"])
     return articles_list_df
 
-# ===== 検索結果一覧から取得したlinkから記事本文を取得 =====
-def get_article_data(articles_list_df: pd.DataFrame):
-    headers = {"User-Agent": "Mozilla/5.0"}  # サーバーに「ブラウザですよ」と伝える。（requestsの時に必要）
+# ===== 記事ページのHTMLからタイトルと本文を取り出す =====
+def parse_article_html(html: str) -> tuple[str, str]:
+    soup = BeautifulSoup(html, "html.parser")  # 記事を文字列として受け取って、HTMLをPythonで扱いやすい形に変換
+    script_tag = soup.select("script#__NEXT_DATA__")[0]     # <script>タグをselectで取得（リストで返るので[0]つける → 中身JSON…
+    json_string = script_tag.string         # <script>タグの中身の文字列だけを取り出す
+    parsed_json = json.loads(json_string)   # JSON文字列をPythonの辞書に変換
+
+    title = parsed_json["props"]["pageProps"]["dehydratedState"]["queries"][0]["state"]["data"]["title"]
+    main_text = parsed_json["props"]["pageProps"]["dehydratedState"]["queries"][0]["state"]["data"]["text"]  # 中身がhtml…
+
+    body_soup = BeautifulSoup(main_text, "html.parser")  # 本文がHTMLなのでテキストだけを取得
+    clean_text = body_soup.get_text(strip=False)  # get_text:タグ内の文字列だけを取得。改行を削除したくないのであえてstripしないでいく
+    return title, clean_text
+
+
+# ===== 検索結果一覧から取得したlinkから記事本文を、取れた順に1件ずつ返す =====
+# 静的だから記事の取得はrequestsでいく。並列数と1秒あたりのリクエスト数はfetcherで調整（レイテンシもfetcherに記録される）
+# storeを渡すと、保存済みで古くなっていない記事は取得せずにストアから使い、新しく取った記事は保存する
+# 返す値：(company_name, title, main_text, url)
+def iter_article_data(articles_list_df: pd.DataFrame, fetcher: ArticleFetcher | None = None,
+                      store: ArticleStore | None = None, max_age_days: float = DEFAULT_MAX_AGE_DAYS):
     url_list = articles_list_df["url"].tolist()
+    company_names = dict(zip(articles_list_df["url"], articles_list_df["company_name"]))
 
-    titles = []
-    main_texts = []
+    with stage("article_store"):
+        stored = store.get_fresh(url_list, max_age_days) if store is not None else {}
+    count("articles_from_store", len(stored))
     for url in url_list:
-        response = requests.get(url, headers=headers)       # 静的だから記事の取得はrequestsでいく
-        soup = BeautifulSoup(response.text, "html.parser")  # response.text:記事を文字列として取得して、HTMLをPythonで扱いやすい形に変換
-        script_tag = soup.select("script#__NEXT_DATA__")[0]     # <script>タグをselectで取得（リストで返るので[0]つける → 中身JSON…
-        json_string = script_tag.string         # <script>タグの中身の文字列だけを取り出す
-        parsed_json = json.loads(json_string)   # JSON文字列をPythonの辞書に変換
-
-        title = parsed_json["props"]["pageProps"]["dehydratedState"]["queries"][0]["state"]["data"]["title"]
-        main_text = parsed_json["props"]["pageProps"]["dehydratedState"]["queries"][0]["state"]["data"]["text"]  # 中身がhtml…
-        
-        body_soup = BeautifulSoup(main_text, "html.parser")  # 本文がHTMLなのでテキストだけを取得
-        clean_text = body_soup.get_text(strip=False)  # get_text:タグ内の文字列だけを取得。改行を削除したくないのであえてstripしないでいく
-        titles.append(title)
-        main_texts.append(clean_text)
-        time.sleep(3)  # 3秒間待つ
-
-    articles_detail_df = articles_list_df.copy()  # 上書き回避のためにコピー
-    articles_detail_df["title"] = titles
-    articles_detail_df["main_text"] = main_texts
-    articles_detail_df = articles_detail_df[["company_name", "title", "main_text", "url"]]  # 列並び替え
-    return articles_detail_df
+        if url in stored:
+            _, title, main_text = stored[url]
+            yield company_names[url], title, main_text, url
 
-# ===== 共起ネットワーク用 形態素解析 =====
-def morph_for_cooccurrence(articles_detail_df: pd.DataFrame):
-    data = articles_detail_df["main_text"].tolist()
-    tokenizer_obj = dictionary.Dictionary(dict_type="full").create()
-    mode = tokenizer.Tokenizer.SplitMode.C  # C：最も長い分割形式（A～C）
+    urls_to_fetch = [url for url in url_list if url not in stored]
+    if not urls_to_fetch:
+        return
+    fetcher = fetcher or ArticleFetcher()
+    for url, result in timed_iter(fetcher.fetch_all(urls_to_fetch), "fetch_wait"):  # 取得を待っていた時間
+        if isinstance(result, Exception):  # リトライしても取れなかった記事は飛ばす
+            count("fetch_errors")
+            continue
+        try:
+            with stage("parse_html"):
+                title, main_text = parse_article_html(result.text)
+        except (IndexError, KeyError, TypeError, json.JSONDecodeError):  # 記事ページの形式が違うものも飛ばす
+            count("parse_errors")
+            continue
+        if store is not None:
+            with stage("article_store"):
+                store.put_many([(url, company_names[url], title, main_text)])
+        yield company_names[url], title, main_text, url
+
+
+# ===== 検索結果一覧から取得したlinkから記事本文を取得 =====
+def get_article_data(articles_list_df: pd.DataFrame, fetcher: ArticleFetcher | None = None,
+                     store: ArticleStore | None = None, max_age_days: float = DEFAULT_MAX_AGE_DAYS):
+    rows = list(iter_article_data(articles_list_df, fetcher, store, max_age_days))
+    articles_detail_df = pd.DataFrame(rows, columns=["company_name", "title", "main_text", "url"])
+    order = {url: i for i, url in enumerate(articles_list_df["url"])}  # 取れた順ではなく一覧の順に並べ直す
+    articles_detail_df = articles_detail_df.sort_values("url", key=lambda urls: urls.map(order))
+    return articles_detail_df.reset_index(drop=True)
 
-    keep_pos = ["名詞"]  # 抽出したい品詞
-    stopwords = ["事", "こと", "年", "月", "時", "分", "日", "以下", "所在地", "円", "ため", "為", "URL", "url", 
+# ===== 共起ネットワーク用 形態素解析 =====
+COOCCURRENCE_CONFIG = MorphConfig(
+    keep_pos=("名詞",),  # 抽出したい品詞
+    stopwords=frozenset(["事", "こと", "年", "月", "時", "分", "日", "以下", "所在地", "円", "ため", "為", "URL", "url", 
                 "内容", "詳細", "もの", "物", "概要", "HTTPS", "開始", "対象","代表者", "JP", "jp", "株式会社",
-                "今後", "%", "皆", "兼", "他", "階", "もと", "以上", "以下","前", "後", "中"]  # ストップワード
-
-    all_tokens = []
-    for i, text in enumerate(data):
-        text = neologdn.normalize(text).lower()      # 正規化、小文字化
-        tokens = tokenizer_obj.tokenize(text, mode)  # トークンに分解
-        dictionary_form_line = []
-        for token in tokens:
-            pos = token.part_of_speech()  # 品詞の抽出
-            if pos[0] in keep_pos:  # 必要な品詞かつ不要単語でなければ抽出
-                dictionary_form = token.dictionary_form()  # 辞書に載ってる形（活用のない元の形）
-                if not re.fullmatch(r"[ぁ-んァ-ヶー0-9a-z]", dictionary_form) and dictionary_form not in stopwords:  # 平仮名、カナ、数字で1文字を除外
-                    dictionary_form_line.append(dictionary_form)
-        if dictionary_form_line:
-            all_tokens.append(dictionary_form_line)
+                "今後", "%", "皆", "兼", "他", "階", "もと", "以上", "以下","前", "後", "中"]),  # ストップワード
+)
+
+# 文単位で共起を見るときの文の区切り
+SENTENCE_SPLIT_PATTERN = re.compile(r"[。！？!?\n]+")
+
+def morph_for_cooccurrence(articles_detail_df: pd.DataFrame, unit: str = "document"):
+    return morph_texts_for_cooccurrence(articles_detail_df["main_text"].tolist(), unit)
+
+
+def morph_texts_for_cooccurrence(data: list[str], unit: str = "document"):
+    if unit == "sentence":  # 文ごとに分けて、1文を1つの単位として扱う
+        data = [sentence for text in data for sentence in SENTENCE_SPLIT_PATTERN.split(text) if sentence.strip()]
+    all_tokens = [line for line in tokenize_documents(data, COOCCURRENCE_CONFIG, cache=get_token_cache()) if line]  # 単語が残らなかった記事は除く
     return all_tokens
 
 # ===== 単語同士のペアを作成してTOP200を抽出 =====
-def make_word_pairs(all_tokens: list):
-    combi_list = []
-    for sentence in all_tokens:
-        unique_sentence = list(set(sentence))  # 気になったとこ。文書内の重複はどのくらい影響する？set()で重複削除できるらしい。
-        combi = list(itertools.combinations(unique_sentence, 2))  # itertools.combinations( ,2)でペアが作れるらしい、そしてリストに戻す
-        combi_list.append(combi)  # リストのリストのタプル…
+# window=Noneなら文書（または文）の中で一緒に出た単語、window=kならk語以内に並んだ単語をペアにする
+# measure：count（共起回数）/ pmi / npmi / jaccard / dice。min_count・min_word_countより少ないペアと単語は先に除外
+def make_word_pairs(all_tokens: list, top_n: int = 200, window: int | None = None,
+                    measure: str = "count", min_count: int = 1, min_word_count: int = 1):
+    cooc = count_cooccurrence(all_tokens, window=window)  # 単語をIDにして疎行列で数える
+    top200 = rank_pairs(cooc, measure, top_n, min_count, min_word_count)  # 上位200組抽出
+    return top200
 
-    combi_flat_list = list(itertools.chain.from_iterable(combi_list))  # リストのリストを1つのリストに結合する
-    counter = Counter(combi_flat_list)  # リストのタプルのタプル…
+# ===== 記事が届くたびに形態素解析して共起回数を足し込む =====
+# refresh_every件ごとに (これまでの記事のリスト, 集計器) を返す（最後にも必ず返す）
+# 記事の取得はfetcherのスレッドで進むので、待ち時間と形態素解析・集計が重なる
+def stream_cooccurrence(articles_list_df: pd.DataFrame, fetcher: ArticleFetcher | None = None,
+                        store: ArticleStore | None = None, max_age_days: float = DEFAULT_MAX_AGE_DAYS,
+                        unit: str = "document", window: int | None = None, refresh_every: int = 10):
+    accumulator = CooccurrenceAccumulator(window=window)
+    articles = []
+    pending = []  # まだ集計していない記事の本文
+    for row in iter_article_data(articles_list_df, fetcher, store, max_age_days):
+        articles.append(row)
+        pending.append(row[2])
+        if len(pending) >= refresh_every:
+            accumulator.add(morph_texts_for_cooccurrence(pending, unit))
+            pending = []
+            yield articles, accumulator
+    if pending or not articles:
+        accumulator.add(morph_texts_for_cooccurrence(pending, unit))
+        yield articles, accumulator
 
-    top200 = counter.most_common(200)  # 上位200組抽出
-    return top200
+# ===== 描画用のグラフ・ノードサイズ・配置をまとめて用意（matplotlib描画とブラウザ描画で共通） =====
+def prepare_cooccurrence_network(top200: list[tuple[tuple[str, str], float]], measure: str = "count",
+                                 layout: str = "spring", min_weight: float | None = None,
+                                 k_core: int | None = None, layout_key=None):
+    # 回数以外の指標はスケールがばらばらなので、描画用に1～100に揃える（回数はそのまま）
+    if measure != "count" and top200:
+        scores = [score for _, score in top200]
+        low, high = min(scores), max(scores)
+        top200 = [(pair, 1 + 99 * (score - low) / (high - low) if high > low else 100) for pair, score in top200]
 
-# ===== 共起ネットワーク描画 =====
-def plot_cooccurrence_network(top200: list[tuple[tuple[str, str], int]]):
-    G = nx.Graph()  # グラフの初期化。無向グラフ（A-BとB-Aは同じとみなす）
+    # ノードとエッジを追加して枝刈り（ノード数2の孤立したサブネットワークも除外）
+    G = prune_graph(build_graph(top200), min_weight=min_weight, k_core=k_core)
 
-    # ノードとエッジを追加
-    for (word1, word2), count in top200:
-        G.add_edge(word1, word2, weight=count)  # グラフGにノードword1とword2をつなぐエッジを追加。weight属性に共起回数を入れる
+    # 重み付き次数（strength）でノードサイズを決める（数値変更でノードサイズかわる）
+    node_sizes = node_strengths(G) * 0.5
 
-    # 独立したサブネットワークを除外（孤立しちゃうやつ）
-    components = list(nx.connected_components(G))  # 無向グラフGを分解してお互いに繋がっているノードの集まりを返す。リストのセット…
+    # NetworkX のノード配置（レイアウト）を設定
+    with stage("layout"):
+        pos = compute_layout(G, layout, cache_key=layout_key)
+    return G, node_sizes, pos
 
-    small_components = []
-    for c in components:
-        if len(c) == 2:  # ノード数が2しかないやつを探す（=孤立）
-            small_components.append(c)
 
-    for s_c in small_components:  # そのノードをすべて削除
-        G.remove_nodes_from(s_c)  # 既存のグラフからノード数2を直接削除。appendは不要
+# ===== ブラウザ描画用のJSON（ズームや絞り込みはブラウザ側でやるのでPythonの再実行はいらない） =====
+def cooccurrence_network_json(top200: list[tuple[tuple[str, str], float]], measure: str = "count",
+                              layout: str = "spring", min_weight: float | None = None, k_core: int | None = None,
+                              layout_key=None) -> dict:
+    G, node_sizes, pos = prepare_cooccurrence_network(top200, measure, layout, min_weight, k_core, layout_key)
+    with stage("graph_json"):
+        return graph_to_json(G, pos, node_sizes, measure)
 
-    # 重み付き次数（strength）でノードサイズを決める
-    node_sizes = []
-    for node in G.nodes():  # グラフにある全ノードを順番に取り出す
-        strength = 0  # このノードの強さ（エッジ重み合計）を入れる変数を初期化
-        for u, v, d in G.edges(node, data=True):  # G.edges(node, data=True):そのノードにつながっているエッジ全部を返す。u, v, d:JAL ANA {'weight': 10}
-            strength = strength + d['weight']  # dは属性の辞書、d['weight']が共起回数
-        size = strength * 0.5  # 見やすいようにスケーリングしてリストに追加（数値変更でノードサイズかわる）
-        node_sizes.append(size)
-    print(f'node_sizes:{node_sizes}')
 
-    # NetworkX のノード配置（レイアウト）を設定
-    pos = nx.spring_layout(G, k=0.5, seed=42)  # ノードとエッジをちょうどいい位置に散らばるように計算してくれる関数。Kの値で密集具合が調整できる
-
-    # 描画サイズ
-    fig, ax = plt.subplots(figsize=(10, 8))
-
-    # ノード描画
-    nx.draw_networkx_nodes(G, pos, node_size=node_sizes, node_color='lightblue')
-
-    # エッジ描画（weightに応じて太さ変える）
-    nx.draw_networkx_edges(
-        G,
-        pos,
-        width=[G[u][v]['weight'] * 0.008 for u, v in G.edges()],  # width=[G[u][v]['weight'] * 0.002 の数値部分でエッジの太さ調整
-        edge_color='black',
-        alpha=0.4  # 透明度
-    )
-
-    # ラベル描画（ノード名）
-    nx.draw_networkx_labels(
-        G,
-        pos,
-        font_family='Meiryo',
-        font_size=8
-    )
-
-    # # エッジラベル（共起回数）も表示するなら：
-    # edge_labels = nx.get_edge_attributes(G, 'weight')
-    # nx.draw_networkx_edge_labels(G, pos, edge_labels=edge_labels, font_size=9)
+# ===== 共起ネットワーク描画（matplotlibで画像として描画） =====
+# layout：spring（これまでどおり）/ spectral（スペクトル初期化＋ベクトル化した力学モデル、数千エッジ向け）
+# min_weight・k_coreで枝刈り、layout_keyを渡すとグラフがあまり変わらないときは前回の配置を使い回す
+def plot_cooccurrence_network(top200: list[tuple[tuple[str, str], float]], measure: str = "count",
+                              layout: str = "spring", min_weight: float | None = None, k_core: int | None = None,
+                              layout_key=None):
+    import matplotlib.pyplot as plt
+    import japanize_matplotlib  # IPAexGothicを登録する
+
+    G, node_sizes, pos = prepare_cooccurrence_network(top200, measure, layout, min_weight, k_core, layout_key)
+
+    with stage("draw"):
+        # 描画サイズ
+        fig, ax = plt.subplots(figsize=(10, 8))
+
+        # ノード描画
+        nx.draw_networkx_nodes(G, pos, node_size=node_sizes, node_color='lightblue')
+
+        # エッジ描画（weightに応じて太さ変える）
+        nx.draw_networkx_edges(
+            G,
+            pos,
+            width=[w * 0.008 for _, _, w in G.edges(data="weight")],  # 0.008 の数値部分でエッジの太さ調整
+            edge_color='black',
+            alpha=0.4  # 透明度
+        )
+
+        # ラベル描画（ノード名）
+        nx.draw_networkx_labels(
+            G,
+            pos,
+            font_family='IPAexGothic',  # japanize_matplotlibが登録するフォント（MeiryoはLinuxにないので探しにいって遅くなる）
+            font_size=8
+        )
+
+        # # エッジラベル（共起回数）も表示するなら：
+        # edge_labels = nx.get_edge_attributes(G, 'weight')
+        # nx.draw_networkx_edge_labels(G, pos, edge_labels=edge_labels, font_size=9)
 
     ax.set_title("Co-occurrence network")
     ax.axis('off')  # 軸線・目盛り全部消す
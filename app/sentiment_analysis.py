@@ -1,24 +1,11 @@
-from transformers import pipeline
-import torch
 import pandas as pd
+import numpy as np
+from model_registry import get_pipeline, SENTIMENT_MODEL, DEFAULT_BACKEND
+from instrumentation import stage, count
 
-# ===== ポジネガ分類 =====
-def sentiment_analysis(input_texts: list[str]) -> pd.DataFrame:
-
-    # 感情分析用のパイプラインをロード（事前学習済み日本語モデルを指定）
-    classifier = pipeline(
-        "sentiment-analysis",
-        model="koheiduck/bert-japanese-finetuned-sentiment",  # Hugging Faceが自動でモデルに対応するトークナイザーをロード
-        top_k=None  # top_k=Noneにするとすべてのクラスのスコアが返る（確率分布）
-    )
-    
-    # 推論
-    results = classifier(
-        input_texts,
-        truncation=True    # 長すぎる文章は強制的に512トークンに切り詰め。切り詰められた文章は情報が失われる
-    )
-
-    # 出力がリストのリストの辞書なので、dfにするため辞書に変換
+
+# ===== 推論結果（リストのリストの辞書）をデータフレームに変換 =====
+def _results_to_dataframe(results: list, input_texts: list[str], index: list[int]) -> pd.DataFrame:
     dict_list = []
     for row, t in zip(results, input_texts):
         row_dict = {}           # 空の辞書を用意
@@ -28,6 +15,153 @@ def sentiment_analysis(input_texts: list[str]) -> pd.DataFrame:
             score = d['score']
             row_dict[label] = score  # 1つずつ追加
         dict_list.append(row_dict)
-        
-    df_result = pd.DataFrame(dict_list)
-    return df_result
\ No newline at end of file
+    return pd.DataFrame(dict_list, index=index)
+
+
+# ===== ポジネガ分類（長さ順バッチで推論して、終わったバッチから順に返す） =====
+def sentiment_analysis_stream(input_texts: list[str], batch_size: int = 32, backend: str = DEFAULT_BACKEND):
+    # 感情分析用のパイプラインをレジストリから取得（初回だけロード、2回目以降は使い回し）
+    classifier = get_pipeline("sentiment-analysis", SENTIMENT_MODEL, backend)
+    label_columns = ["text"] + list(classifier.model.config.id2label.values())
+
+    # 文字数で並べ替えて、長さの近いテキスト同士を同じバッチにする（短いレビューが長文に合わせてパディングされないように）
+    order = sorted(range(len(input_texts)), key=lambda i: len(input_texts[i]))
+    count("docs", len(input_texts))
+
+    done = 0
+    for start in range(0, len(order), batch_size):
+        batch_index = order[start:start + batch_size]
+        batch_texts = [input_texts[i] for i in batch_index]
+
+        # 推論
+        with stage("inference"):
+            results = classifier(
+                batch_texts,
+                top_k=None,        # top_k=Noneにするとすべてのクラスのスコアが返る（確率分布）
+                truncation=True,   # 長すぎる文章は強制的に512トークンに切り詰め。切り詰められた文章は情報が失われる
+                batch_size=batch_size
+            )
+        count("batches")
+        done += len(batch_index)
+
+        # indexは元の行番号。呼び出し側で連結してsort_indexすれば元の順番に戻る
+        df_batch = _results_to_dataframe(results, batch_texts, batch_index)
+        yield done, df_batch.reindex(columns=label_columns)
+
+
+# ===== ポジネガ分類 =====
+def sentiment_analysis(input_texts: list[str], batch_size: int = 32, backend: str = DEFAULT_BACKEND) -> pd.DataFrame:
+    batches = [df_batch for _, df_batch in sentiment_analysis_stream(input_texts, batch_size, backend)]
+    if not batches:
+        return pd.DataFrame(columns=["text"])
+    df_result = pd.concat(batches).sort_index()  # 元の行順に戻す
+    return df_result
+
+
+# ===== 長文用：トークン列を重なりありのウィンドウに分割 =====
+def _split_windows(token_ids: list[int], window_size: int, stride: int) -> list[list[int]]:
+    starts = [0]
+    while starts[-1] + window_size < len(token_ids):  # 末尾まで届くまでstrideずつずらす（最後のウィンドウは短くなる）
+        starts.append(starts[-1] + stride)
+    return [token_ids[s:s + window_size] for s in starts]
+
+
+# ===== ウィンドウ総数の上限を超えたら、各文書から等間隔に間引く（合計は必ずmax_windows以下） =====
+# まず1文書1ウィンドウずつ割り当て、残りを文書の長さ（追加のウィンドウ数）に比例して配る。
+# 文書数が上限より多いときは、先頭からmax_windows件だけ1ウィンドウずつ読み、残りの文書はウィンドウなし（スコアはNaN）
+def _cap_windows(windows_per_doc: list[list[list[int]]], max_windows: int) -> list[list[list[int]]]:
+    total = sum(len(w) for w in windows_per_doc)
+    if total <= max_windows:
+        return windows_per_doc
+    if len(windows_per_doc) >= max_windows:
+        return [windows[:1] if d < max_windows else [] for d, windows in enumerate(windows_per_doc)]
+    extra_budget = max_windows - len(windows_per_doc)
+    extra_total = total - len(windows_per_doc)
+    capped = []
+    for windows in windows_per_doc:
+        quota = 1 + (len(windows) - 1) * extra_budget // extra_total
+        picks = np.unique(np.linspace(0, len(windows) - 1, quota).round().astype(int))
+        capped.append([windows[i] for i in picks])
+    return capped
+
+
+# ===== 1文を入れたときに前後につく特殊トークン（[CLS]・[SEP]など）を調べる =====
+# 短い文を特殊トークンあり・なしでトークナイズして、ありの方で前後に増えた分を取り出す（トークナイザーの種類によらない）
+def _special_tokens_around(tokenizer, probe: str = "テスト") -> tuple[list[int], list[int]]:
+    with_special = tokenizer(probe, add_special_tokens=True)["input_ids"]
+    without_special = tokenizer(probe, add_special_tokens=False)["input_ids"]
+    for start in range(len(with_special) - len(without_special) + 1):
+        if with_special[start:start + len(without_special)] == without_special:
+            return with_special[:start], with_special[start + len(without_special):]
+    raise ValueError("could not locate special tokens around the probe text")
+
+
+# ===== ポジネガ分類（長文はスライディングウィンドウで全体を読む） =====
+def sentiment_analysis_chunked(input_texts: list[str], aggregation: str = "mean", stride: int = 384,
+                               max_windows: int = 50_000, batch_size: int = 32,
+                               backend: str = DEFAULT_BACKEND) -> pd.DataFrame:
+    if aggregation not in ("mean", "max", "weighted"):
+        raise ValueError(f"aggregation must be 'mean', 'max' or 'weighted': {aggregation}")
+
+    classifier = get_pipeline("sentiment-analysis", SENTIMENT_MODEL, backend)
+    tokenizer = classifier.tokenizer
+    model = classifier.model
+    labels = list(model.config.id2label.values())
+    if not input_texts:
+        return pd.DataFrame(columns=["text"] + labels)
+
+    # 1ウィンドウのトークン数（[CLS][SEP]の分を引く）。strideはウィンドウの開始位置のずらし幅（window_size - stride が重なり）
+    max_length = min(tokenizer.model_max_length, model.config.max_position_embeddings)
+    prefix, suffix = _special_tokens_around(tokenizer)
+    window_size = max_length - len(prefix) - len(suffix)
+    stride = max(1, min(stride, window_size))
+
+    # 全文書をトークン化してウィンドウに分割
+    with stage("tokenize_windows"):
+        token_ids_list = tokenizer(input_texts, add_special_tokens=False)["input_ids"]
+        windows_per_doc = [_split_windows(ids, window_size, stride) for ids in token_ids_list]
+        windows_per_doc = _cap_windows(windows_per_doc, max_windows)  # 巨大な文書があっても計算量が読めるように上限をかける
+
+    # 全文書の全ウィンドウを1本の推論ストリームにまとめ、長さ順にバッチ化
+    windows = [(doc_idx, w) for doc_idx, doc_windows in enumerate(windows_per_doc) for w in doc_windows]
+    windows.sort(key=lambda x: len(x[1]))
+    count("docs", len(input_texts))
+    count("windows", len(windows))
+    count("docs_over_window_budget", sum(1 for doc_windows in windows_per_doc if not doc_windows))
+
+    doc_probs = [[] for _ in input_texts]    # 文書ごとのウィンドウの確率分布
+    doc_weights = [[] for _ in input_texts]  # 文書ごとのウィンドウのトークン数
+    import torch  # モデルをロードした後なのでimport済み（ページを開いただけではtorchを読まない）
+    with torch.inference_mode():
+        for start in range(0, len(windows), batch_size):
+            batch = windows[start:start + batch_size]
+            with stage("inference"):
+                encoded = tokenizer.pad(
+                    [{"input_ids": prefix + w + suffix} for _, w in batch],
+                    return_tensors="pt",
+                ).to(model.device)
+                probs = model(**encoded).logits.softmax(dim=-1).float().cpu().numpy()
+            count("batches")
+            for (doc_idx, w), p in zip(batch, probs):
+                doc_probs[doc_idx].append(p)
+                doc_weights[doc_idx].append(max(len(w), 1))
+
+    # ウィンドウのスコアを文書ごとに1つの確率分布にまとめる
+    dict_list = []
+    for t, probs, weights in zip(input_texts, doc_probs, doc_weights):
+        probs = np.array(probs)
+        if len(probs) == 0:  # ウィンドウ数の上限で読まなかった文書
+            dist = np.full(len(labels), np.nan)
+        elif aggregation == "mean":
+            dist = probs.mean(axis=0)
+        elif aggregation == "max":
+            dist = probs.max(axis=0)
+            dist = dist / dist.sum()  # 各ラベルの最大値を取ったあと合計1に正規化
+        else:
+            dist = np.average(probs, axis=0, weights=weights)  # トークン数で重み付け（末尾の短いウィンドウの影響を小さく）
+        row_dict = {"text": t}
+        for label, score in zip(labels, dist):
+            row_dict[label] = float(score)
+        dict_list.append(row_dict)
+
+    return pd.DataFrame(dict_list, columns=["text"] + labels)
@@ -0,0 +1,126 @@
+from pathlib import Path
+import sqlite3, threading, hashlib, zlib, time, os
+
+# キャッシュの保存先と容量上限（MB）。TOKEN_CACHE_MAX_MB=0 でキャッシュ無効
+DEFAULT_CACHE_PATH = Path(os.environ.get("TOKEN_CACHE_PATH", Path(__file__).parent / ".cache" / "tokens.sqlite3"))
+DEFAULT_MAX_MB = int(os.environ.get("TOKEN_CACHE_MAX_MB", "512"))
+
+_SEPARATOR = "\x1f"  # トークン区切り（テキストに出てこない制御文字）
+_SQL_BATCH = 500     # 1回のSQLに渡すキーの数（SQLiteの変数上限対策）
+
+
+# ===== トークン列 <-> バイト列（長いものだけzlib圧縮、先頭1バイトで判別） =====
+def _encode_tokens(tokens: list[str]) -> bytes:
+    raw = _SEPARATOR.join(tokens).encode("utf-8")
+    if len(raw) > 256:
+        return b"z" + zlib.compress(raw)
+    return b"r" + raw
+
+
+def _decode_tokens(data: bytes) -> list[str]:
+    raw = zlib.decompress(data[1:]) if data[:1] == b"z" else data[1:]
+    if not raw:
+        return []
+    return raw.decode("utf-8").split(_SEPARATOR)
+
+
+# ===== 本文ハッシュ＋解析設定をキーにしたトークンキャッシュ（SQLite、容量超過で古い順に削除） =====
+class TokenCache:
+    def __init__(self, path: Path = DEFAULT_CACHE_PATH, max_mb: int = DEFAULT_MAX_MB):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_mb * 1024 * 1024
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tokens ("
+            "key BLOB PRIMARY KEY, data BLOB NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_tokens_last_access ON tokens(last_access)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM tokens").fetchone()[0]
+
+    @staticmethod
+    def make_key(text: str, config_key: str) -> bytes:
+        return hashlib.blake2b(config_key.encode("utf-8") + b"\0" + text.encode("utf-8"), digest_size=16).digest()
+
+    # 見つかったものだけ {key: tokens} で返す
+    def get_many(self, keys: list[bytes]) -> dict[bytes, list[str]]:
+        found = {}
+        now = time.time()
+        with self._lock:
+            for start in range(0, len(keys), _SQL_BATCH):
+                batch = keys[start:start + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(f"SELECT key, data FROM tokens WHERE key IN ({placeholders})", batch).fetchall()
+                for key, data in rows:
+                    found[key] = _decode_tokens(data)
+                if rows:  # 使ったものは最終アクセス時刻を更新（LRU用）
+                    self._conn.execute(
+                        f"UPDATE tokens SET last_access = ? WHERE key IN ({','.join('?' * len(rows))})",
+                        [now] + [key for key, _ in rows],
+                    )
+            self._conn.commit()
+        return found
+
+    def put_many(self, items: list[tuple[bytes, list[str]]]):
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            for start in range(0, len(items), _SQL_BATCH):
+                rows = []
+                for key, tokens in items[start:start + _SQL_BATCH]:
+                    data = _encode_tokens(tokens)
+                    rows.append((key, data, len(data), now))
+                keys = [r[0] for r in rows]
+                # 上書きされる分のサイズを差し引いてから入れる
+                replaced = self._conn.execute(
+                    f"SELECT COALESCE(SUM(size), 0) FROM tokens WHERE key IN ({','.join('?' * len(keys))})", keys
+                ).fetchone()[0]
+                self._conn.executemany("INSERT OR REPLACE INTO tokens VALUES (?, ?, ?, ?)", rows)
+                self._total_bytes += sum(r[2] for r in rows) - replaced
+            self._evict()
+            self._conn.commit()
+
+    # 容量上限を超えたら、最終アクセスが古い順に上限の9割まで削除
+    def _evict(self):
+        if self._total_bytes <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)
+        cursor = self._conn.execute("SELECT key, size FROM tokens ORDER BY last_access")
+        victims = []
+        for key, size in cursor:
+            if self._total_bytes <= target:
+                break
+            victims.append((key,))
+            self._total_bytes -= size
+        cursor.close()
+        self._conn.executemany("DELETE FROM tokens WHERE key = ?", victims)
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM tokens").fetchone()[0]
+        return {"entries": entries, "size_mb": round(self._total_bytes / 1024 / 1024, 1),
+                "max_mb": round(self.max_bytes / 1024 / 1024, 1)}
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM tokens")
+            self._conn.commit()
+            self._total_bytes = 0
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+# ===== プロセスで共有するキャッシュ（無効設定ならNone） =====
+def get_token_cache():
+    global _cache
+    if DEFAULT_MAX_MB <= 0:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = TokenCache()
+        return _cache
@@ -0,0 +1,56 @@
+from dataclasses import dataclass
+from functools import cached_property
+from token_ids import encode_tokens, top_k_indices
+import numpy as np
+
+
+# ===== 単語ID配列で持つコーパス（文字列は語彙に1回だけ持つ。出現数は1回だけ数えて使い回す） =====
+@dataclass
+class TokenCorpus:
+    vocab: list[str]      # 単語ID -> 単語
+    ids: np.ndarray       # 全トークンの単語ID（int32）
+    offsets: np.ndarray   # 文書の区切り位置（文書dのトークンは ids[offsets[d]:offsets[d+1]]）
+
+    @property
+    def n_documents(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def n_tokens(self) -> int:
+        return len(self.ids)
+
+    # 単語IDごとの出現数（np.bincountで1回だけ計算）
+    @cached_property
+    def counts(self) -> np.ndarray:
+        return np.bincount(self.ids, minlength=len(self.vocab))
+
+    # 出現数の多い順に上位n語を (単語, 出現数) で返す（同数なら先に出てきた単語が先）
+    def most_common(self, n: int) -> list[tuple[str, int]]:
+        return [(self.vocab[i], int(self.counts[i])) for i in top_k_indices(self.counts, n)]
+
+    def document(self, d: int) -> list[str]:
+        return [self.vocab[i] for i in self.ids[self.offsets[d]:self.offsets[d + 1]]]
+
+    # 配列と語彙のおおよそのメモリ使用量（バイト）
+    def nbytes(self) -> int:
+        return self.ids.nbytes + self.offsets.nbytes + sum(len(word.encode("utf-8")) for word in self.vocab)
+
+
+# ===== チャンクごとに文書を受け取って、TokenCorpusを組み立てる =====
+class TokenCorpusBuilder:
+    def __init__(self):
+        self.word_to_id = {}
+        self._ids = []      # チャンクごとの単語ID配列
+        self._lengths = []  # チャンクごとの文書の長さ
+
+    def add(self, all_tokens: list[list[str]]):
+        _, ids, offsets = encode_tokens(all_tokens, self.word_to_id)
+        self._ids.append(ids)
+        self._lengths.append(np.diff(offsets))
+
+    def build(self) -> TokenCorpus:
+        ids = np.concatenate(self._ids) if self._ids else np.zeros(0, dtype=np.int32)
+        lengths = np.concatenate(self._lengths) if self._lengths else np.zeros(0, dtype=np.int64)
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(lengths)
+        return TokenCorpus(list(self.word_to_id), ids, offsets)
@@ -0,0 +1,28 @@
+import numpy as np
+
+# トークンのID化と上位k件の取り出し（numpyだけで動く。単語頻度と共起の両方で使う）
+
+
+# ===== 単語にIDを振って、全トークンをID配列と文書の区切り位置に変換 =====
+# word_to_idを渡すと、そのIDの続きから振る（追加読み込み用）
+def encode_tokens(all_tokens: list[list[str]], word_to_id: dict[str, int] | None = None):
+    word_to_id = {} if word_to_id is None else word_to_id
+    ids = np.fromiter(
+        (word_to_id.setdefault(word, len(word_to_id)) for sentence in all_tokens for word in sentence),
+        dtype=np.int32,
+    )
+    offsets = np.zeros(len(all_tokens) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(sentence) for sentence in all_tokens])
+    vocab = list(word_to_id)
+    return vocab, ids, offsets
+
+
+# ===== 上位k件を部分選択（argpartition）で取り出し、スコア降順に並べる =====
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if len(scores) > k:
+        idx = np.sort(np.argpartition(-scores, k - 1)[:k])  # 同じスコアは番号順に並ぶように
+    else:
+        idx = np.arange(len(scores))
+    return idx[np.argsort(-scores[idx], kind="stable")]
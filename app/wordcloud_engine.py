@@ -0,0 +1,122 @@
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from instrumentation import stage, count
+import numpy as np
+import hashlib, threading
+
+# この.pyファイルと同じ階層にfontsフォルダを作っておく
+FONT_PATH = Path(__file__).parent / "fonts" / "NotoSansJP-VariableFont_wght.ttf"
+SHAPES = ["ellipse", "rectangle"]
+PREVIEW_SCALE = 0.4       # プレビューは縦横をこの倍率に縮めて配置する（配置の計算量は面積に比例）
+PREVIEW_FONT_STEP = 3     # プレビューはフォントサイズを3ずつ落として試す（本番は1ずつ）
+_LAYOUT_CACHE_SIZE = 8    # 覚えておく単語配置の数
+_IMAGE_CACHE_SIZE = 32    # 覚えておく色付け済み画像の数
+
+
+# ===== マスク（白＝255のところには単語を置かない）。サイズと形ごとに1回だけ作る =====
+@lru_cache(maxsize=16)
+def make_mask(width: int, height: int, shape: str = "ellipse") -> np.ndarray | None:
+    if shape not in SHAPES:
+        raise ValueError(f"shape must be one of {SHAPES}: {shape}")
+    if shape == "rectangle":
+        return None
+    y, x = np.ogrid[:height, :width]
+    center_x = (width - 1) / 2
+    center_y = (height - 1) / 2
+    a = center_x  # 横半径
+    b = center_y  # 縦半径
+
+    # 楕円の方程式：(x - cx)^2/a^2 + (y - cy)^2/b^2 <= 1
+    mask = ((x - center_x)**2) / (a**2) + ((y - center_y)**2) / (b**2) > 1
+    mask = 255 * mask.astype(np.uint8)  # 白（255）＝単語を置かない
+    mask.flags.writeable = False  # キャッシュを共有するので書き換え禁止
+    return mask
+
+
+# ===== 頻度表のハッシュ（同じ頻度表なら同じ配置を使い回す） =====
+def frequency_key(frequencies: dict[str, int]) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for word, count in sorted(frequencies.items()):
+        h.update(f"{word}\t{count}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+# ===== 単語配置のキャッシュ（色だけ変えるときはrecolorで塗り直す） =====
+class WordCloudCache:
+    def __init__(self, layout_size: int = _LAYOUT_CACHE_SIZE, image_size: int = _IMAGE_CACHE_SIZE):
+        self.layout_size = layout_size
+        self.image_size = image_size
+        self._layouts = OrderedDict()  # (頻度表, 幅, 高さ, 形, 最大単語数, フォント刻み) -> 配置済みのWordCloud
+        self._images = OrderedDict()   # (配置のキー, カラーマップ) -> 画像（numpy配列）
+        self._lock = threading.Lock()
+
+    # 本番サイズの配置がもうあるか（あれば色付けだけなのですぐ描ける）
+    def has_layout(self, frequencies: dict[str, int], width: int = 1000, height: int = 600,
+                   shape: str = "ellipse", max_words: int = 100) -> bool:
+        with self._lock:
+            return (frequency_key(frequencies), width, height, shape, max_words, 1) in self._layouts
+
+    def _layout(self, frequencies: dict[str, int], width: int, height: int, shape: str, max_words: int,
+                font_step: int = 1):
+        key = (frequency_key(frequencies), width, height, shape, max_words, font_step)
+        with self._lock:
+            if key in self._layouts:
+                self._layouts.move_to_end(key)
+                count("wordcloud_layout_cache_hits")
+                return key, self._layouts[key]
+
+        from wordcloud import WordCloud  # 初めて配置するときにimportする（ページを開いただけでは読まない）
+        with stage("wordcloud_layout"):
+            wordcloud = WordCloud(
+                width=width,
+                height=height,
+                mask=make_mask(width, height, shape),
+                font_path=str(FONT_PATH),
+                background_color="white",
+                max_words=max_words,
+                font_step=font_step,
+                random_state=0,  # 同じ頻度表なら同じ配置になるように
+            ).fit_words(frequencies)
+
+        with self._lock:
+            self._layouts[key] = wordcloud
+            self._layouts.move_to_end(key)
+            while len(self._layouts) > self.layout_size:
+                self._layouts.popitem(last=False)
+        return key, wordcloud
+
+    # 頻度表から画像を作る（配置はキャッシュ、色はcolormapで塗り直し）
+    def render(self, frequencies: dict[str, int], colormap: str, width: int = 1000, height: int = 600,
+               shape: str = "ellipse", max_words: int = 100, preview: bool = False) -> np.ndarray:
+        font_step = 1
+        if preview:
+            width, height = int(width * PREVIEW_SCALE), int(height * PREVIEW_SCALE)
+            font_step = PREVIEW_FONT_STEP
+        layout_key, wordcloud = self._layout(frequencies, width, height, shape, max_words, font_step)
+
+        image_key = (layout_key, colormap)
+        with self._lock:
+            if image_key in self._images:
+                self._images.move_to_end(image_key)
+                count("wordcloud_image_cache_hits")
+                return self._images[image_key]
+            # 同じWordCloudオブジェクトを塗り直すので、画像にするまでロックしておく
+            with stage("wordcloud_recolor"):
+                image = wordcloud.recolor(colormap=colormap, random_state=0).to_array()
+            image.flags.writeable = False
+            self._images[image_key] = image
+            while len(self._images) > self.image_size:
+                self._images.popitem(last=False)
+        return image
+
+    def clear(self):
+        with self._lock:
+            self._layouts.clear()
+            self._images.clear()
+
+
+_cache = WordCloudCache()
+
+def get_wordcloud_cache() -> WordCloudCache:
+    return _cache
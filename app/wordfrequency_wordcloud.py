@@ -1,13 +1,10 @@
-from wordcloud import WordCloud
 import pandas as pd
 import numpy as np
-from sudachipy import tokenizer, dictionary
-import neologdn, re
-from collections import Counter
-import matplotlib.pyplot as plt
-import seaborn as sns
-import japanize_matplotlib
-from pathlib import Path
+from morph_engine import MorphConfig, tokenize_documents
+from token_cache import get_token_cache
+from wordcloud_engine import get_wordcloud_cache
+from token_corpus import TokenCorpus, TokenCorpusBuilder
+# matplotlib・seaborn・japanize_matplotlibは描画するときだけ使うので、描画する関数の中でimportする
 
 # カラー一覧（単色 / カラーマップ）
 def list_matplotlib_colors(): 
@@ -25,39 +22,36 @@ def list_matplotlib_colors():
     return colormap_list
 
 # ===== 頻出単語&ワードクラウド用 形態素解析、データクレンジング =====
-def morph_for_freq_wordcloud(df_wf: pd.DataFrame, selected_column: str, free_stopwords: list[str]):
-    tokenizer_obj = dictionary.Dictionary(dict_type="full").create()
-    mode = tokenizer.Tokenizer.SplitMode.C  # C：最も長い分割形式（A～C）
-
-    stopwords = ["事","為","気","方","前","いう","こと","ため","ところ","ほう","とき","もの","思う","言う"]  # ストップワード
-    keep_pos = ["名詞", "動詞", "形容詞"]  # 抽出したい品詞
-    drop_pos = ["非自立可能"]  # 除外したい品詞（動詞の一部）
-    
-    all_tokens_flattened = []
-    for i, text in enumerate(df_wf[selected_column]):
-        norm_text = neologdn.normalize(text).lower()      # 正規化、小文字化
-        tokens = tokenizer_obj.tokenize(norm_text, mode)  # トークンに分解
-
-        dictionary_form_line = []
-        for token in tokens:
-            pos = token.part_of_speech()  # 品詞の抽出
-            if pos[0] == "動詞" and pos[1] in drop_pos:  # 動詞でかつ品詞細分類1が非自立可能だったらスキップ
-                continue
-            if pos[0] in keep_pos:  # 必要な品詞かつ不要単語でなければ抽出
-                dictionary_form = token.dictionary_form()  # 辞書に載ってる形（活用のない元の形）
-                if not re.fullmatch(r"[ぁ-んァ-ヶー0-9a-z]", dictionary_form) and dictionary_form not in stopwords + free_stopwords:  # 平仮名、カナ、数字で1文字を除外
-                    dictionary_form_line.append(dictionary_form)
-        if dictionary_form_line:
-            all_tokens_flattened.extend(dictionary_form_line)
-    return all_tokens_flattened
+FREQ_STOPWORDS = ["事","為","気","方","前","いう","こと","ため","ところ","ほう","とき","もの","思う","言う"]  # ストップワード
+
+def morph_for_freq_wordcloud(df_wf: pd.DataFrame, selected_column: str, free_stopwords: list[str]) -> TokenCorpus:
+    texts = df_wf[selected_column].dropna().astype(str).tolist()
+    return morph_chunks_for_freq_wordcloud([texts], free_stopwords)
+
+
+# テキストのチャンクを順番に受け取って形態素解析（CSV全体をメモリに載せない）
+def morph_chunks_for_freq_wordcloud(text_chunks, free_stopwords: list[str]) -> TokenCorpus:
+    config = MorphConfig(
+        keep_pos=("名詞", "動詞", "形容詞"),     # 抽出したい品詞
+        drop_pos=(("動詞", "非自立可能"),),     # 除外したい品詞（動詞でかつ品詞細分類1が非自立可能）
+        stopwords=frozenset(FREQ_STOPWORDS + free_stopwords),
+    )
+
+    # 文字列のリストではなく、単語ID配列のコーパスに詰めていく
+    builder = TokenCorpusBuilder()
+    for texts in text_chunks:
+        builder.add(tokenize_documents(texts, config, cache=get_token_cache()))  # 複数プロセスで並列に形態素解析（文書順で返る）
+    return builder.build()
 
 
 # ===== 単語頻度グラフ =====
-def plot_word_frequency(all_tokens_flattened: list[str], selected_color: str):
-    counter = Counter(all_tokens_flattened)  # カウント
-    top30 = counter.most_common(30)          # top30抽出
+def plot_word_frequency(corpus: TokenCorpus, selected_color: str):
+    top30 = corpus.most_common(30)  # top30抽出（出現数はコーパスで1回だけ数える）
     df_top30 = pd.DataFrame(top30, columns=["words", "Frequency"])
 
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    import japanize_matplotlib  # 日本語フォントを登録する
     fig, ax = plt.subplots(figsize=(10, 8))
     sns.barplot(x="Frequency",
                 y="words",
@@ -68,46 +62,32 @@ def plot_word_frequency(all_tokens_flattened: list[str], selected_color: str):
     return fig
 
 # ===== カウンタの表示 =====
-def counter_df(all_tokens_flattened: list[str]) -> pd.DataFrame:
-    counter = Counter(all_tokens_flattened)  # カウント
-    top30 = counter.most_common(30)          # top30抽出
+def counter_df(corpus: TokenCorpus) -> pd.DataFrame:
+    top30 = corpus.most_common(30)  # top30抽出
     df_top30 = pd.DataFrame(top30, columns=["words", "Frequency"])
     df_top30.index = df_top30.index + 1
     return df_top30
 
 # ===== ワードクラウド生成 =====
-def make_wordcloud(all_tokens_flattened: list[str], selected_color: str):
-    # 楕円マスクの生成関数
-    def make_ellipse_mask(width, height):
-        y, x = np.ogrid[:height, :width]
-        center_x = (width - 1) / 2
-        center_y = (height - 1) / 2
-        a = center_x  # 横半径
-        b = center_y  # 縦半径
-
-        # 楕円の方程式：(x - cx)^2/a^2 + (y - cy)^2/b^2 <= 1
-        mask = ((x - center_x)**2) / (a**2) + ((y - center_y)**2) / (b**2) > 1
-        mask = 255 * mask.astype(int)  # 白（255）＝単語を置かない
-        return mask
-
-    counter = Counter(all_tokens_flattened)  # カウント
-    dic_result = dict(counter)  # ワードクラウド取込用に辞書型ヘ変換
-    mask_ellipse = make_ellipse_mask(1000, 600)  # 楕円マスク関数の呼び出し
-
-    # この.pyファイルと同じ階層にfontsフォルダを作っておく
-    FONT_PATH = Path(__file__).parent / "fonts" / "NotoSansJP-VariableFont_wght.ttf"
-
-    wordcloud = WordCloud(
-        width=1000,
-        height=600,
-        mask=mask_ellipse,
-        font_path=str(FONT_PATH),  # 相対パスを指定
-        background_color="white",
-        colormap=selected_color.split(" / ")[1].split("（")[0],
-        max_words=100
-    ).fit_words(dic_result)
+# マスク・単語配置・色付け済み画像はwordcloud_engineでキャッシュするので、色を変えただけなら配置し直さない
+WORDCLOUD_MAX_WORDS = 100
 
+def wordcloud_image(corpus: TokenCorpus, selected_color: str, preview: bool = False) -> np.ndarray:
+    dic_result = dict(corpus.most_common(WORDCLOUD_MAX_WORDS))  # ワードクラウドに載るのは上位の単語だけなので、それだけ渡す
+    colormap = selected_color.split(" / ")[1].split("（")[0]
+    return get_wordcloud_cache().render(dic_result, colormap, width=1000, height=600,
+                                        max_words=WORDCLOUD_MAX_WORDS, preview=preview)
+
+
+# 本番サイズの配置がキャッシュにあるか（あれば色を塗り直すだけなので、ジョブにせずその場で描く）
+def wordcloud_ready(corpus: TokenCorpus) -> bool:
+    dic_result = dict(corpus.most_common(WORDCLOUD_MAX_WORDS))
+    return get_wordcloud_cache().has_layout(dic_result, width=1000, height=600, max_words=WORDCLOUD_MAX_WORDS)
+
+
+def make_wordcloud(corpus: TokenCorpus, selected_color: str):
+    import matplotlib.pyplot as plt
     fig, ax = plt.subplots(figsize=(12, 8))
-    ax.imshow(wordcloud)
+    ax.imshow(wordcloud_image(corpus, selected_color))
     ax.axis("off")
-    return fig
\ No newline at end of file
+    return fig
@@ -1,52 +1,252 @@
-from transformers import pipeline
 import pandas as pd
-import torch
-import streamlit as st
+import numpy as np
+from collections import OrderedDict
+from model_registry import get_pipeline, ZERO_SHOT_MODEL, DEFAULT_BACKEND
+from instrumentation import stage, count
+import threading, time
 
-def zero_shot_classification(input_texts: list[str], categories: list[str]) -> pd.DataFrame:
+# モデルに渡すプロンプトテンプレート。ラベル名をこのテンプレートに埋め込む。精度が向上する可能性があるらしい。
+HYPOTHESIS_TEMPLATE = "このテキストは {} について書かれています。"
+MODES = ["exact", "embedding", "rerank"]
+EMBEDDING_MAX_LENGTH = 512     # 埋め込みを作るときのテキストの最大トークン数
+_HYPOTHESIS_CACHE_SIZE = 4096  # 覚えておく仮説文の埋め込みの数
+# モードごとのスコアの意味（compare_modesの結果にも出す）。embeddingはNLI用に学習したモデルのエンコーダーの[CLS]ベクトルで、
+# 文の埋め込みとして学習したものではない。類似度の順位は目安で、値そのものは確率ではない
+SCORE_TYPES = {
+    "exact": "NLIのentailment確率",
+    "embedding": "NLIエンコーダーの[CLS]ベクトルのコサイン類似度（文埋め込みとして学習したものではない・目安）",
+    "rerank": "上位k件はNLIのentailment確率、それ以外は空欄",
+}
 
-    # ゼロショット分類モデルを読み込む
-    zero_shot_classifier = pipeline(
-        "zero-shot-classification",
-        model="MoritzLaurer/bge-m3-zeroshot-v2.0-c"
+
+# ===== NLIモデルのentailment/contradictionのラベル番号を取得（pipelineと同じ決め方） =====
+def _entailment_ids(model_config) -> tuple[int, int]:
+    entailment_id = -1
+    for label, idx in model_config.label2id.items():
+        if label.lower().startswith("entail"):
+            entailment_id = idx
+    contradiction_id = -1 if entailment_id == 0 else 0
+    return entailment_id, contradiction_id
+
+
+# ===== 仮説文の埋め込みのキャッシュ（(モデル, テンプレート, カテゴリ)ごとに1回だけ計算） =====
+class HypothesisCache:
+    def __init__(self, max_entries: int = _HYPOTHESIS_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # (種類, モデル, テンプレート, カテゴリ) -> 埋め込み
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # まだないカテゴリだけcomputeでまとめて計算する
+    def get_many(self, kind: str, model_name: str, template: str, categories: list[str], compute) -> list:
+        keys = [(kind, model_name, template, c) for c in categories]
+        with self._lock:
+            found = {}
+            for key in keys:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    found[key] = self._entries[key]
+            self.hits += len(found)
+        missing = list(dict.fromkeys(key for key in keys if key not in found))
+        if missing:
+            values = compute([key[3] for key in missing])
+            with self._lock:
+                self.misses += len(missing)
+                for key, value in zip(missing, values):
+                    self._entries[key] = value
+                    found[key] = value
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return [found[key] for key in keys]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+hypothesis_cache = HypothesisCache()
+
+
+# モデルが受け付ける最大トークン数（トークナイザーによっては巨大な仮の値が入っているので押さえる）
+def _max_length(tokenizer) -> int:
+    return tokenizer.model_max_length if tokenizer.model_max_length < 100_000 else 512
+
+
+# ===== (テキスト, 仮説文)ペアを全テキストまとめて長さ順にバッチ推論 =====
+# pairsを渡すとそのペアだけ推論する（渡さなかったペアのスコアはNaN）
+def _batched_nli_scores(zero_shot_classifier, input_texts: list[str], categories: list[str],
+                        template: str, batch_size: int, pairs: list[tuple[int, int]] | None = None):
+    tokenizer = zero_shot_classifier.tokenizer
+    model = zero_shot_classifier.model
+    entailment_id, contradiction_id = _entailment_ids(model.config)
+    if not input_texts or not categories:
+        return np.zeros((len(input_texts), len(categories)))
+
+    hypotheses = [template.format(c) for c in categories]
+
+    # ペアの長さ＝テキストのトークン数＋仮説文のトークン数（並べ替え用なので特殊トークンは無視）
+    text_lengths = [len(ids) for ids in tokenizer(input_texts, add_special_tokens=False)["input_ids"]]
+    hypothesis_lengths = [len(ids) for ids in tokenizer(hypotheses, add_special_tokens=False)["input_ids"]]
+    if pairs is None:
+        pairs = [(i, j) for i in range(len(input_texts)) for j in range(len(hypotheses))]
+        scores = np.zeros((len(input_texts), len(hypotheses)))
+    else:
+        scores = np.full((len(input_texts), len(hypotheses)), np.nan)
+    pairs = sorted(pairs, key=lambda p: text_lengths[p[0]] + hypothesis_lengths[p[1]])  # 長さが近いもの同士でバッチにしてパディングを減らす
+
+    import torch  # モデルをロードした後なのでimport済み
+    with torch.inference_mode():
+        for start in range(0, len(pairs), batch_size):
+            batch = pairs[start:start + batch_size]
+            with stage("nli"):
+                encoded = tokenizer(
+                    [input_texts[i] for i, _ in batch],
+                    [hypotheses[j] for _, j in batch],
+                    padding=True,
+                    truncation="only_first",  # pipelineと同じく、長すぎる場合はテキスト側だけ切り詰める
+                    return_tensors="pt",
+                ).to(model.device)
+                logits = model(**encoded).logits
+            count("batches")
+            # multi_label=True と同じ計算：ペアごとに[contradiction, entailment]でsoftmaxしてentailmentの確率を取る
+            entail_contr_logits = logits[:, [contradiction_id, entailment_id]]
+            probs = entail_contr_logits.softmax(dim=-1)[:, 1].float().cpu().numpy()
+            rows = [i for i, _ in batch]
+            cols = [j for _, j in batch]
+            scores[rows, cols] = probs
+    return scores
+
+
+# ===== 文の埋め込み（NLIモデルのエンコーダー部分の[CLS]ベクトルを正規化。別のモデルはロードしない） =====
+# 文埋め込み用に学習したベクトルではないので、類似度は厳密モードの代わりではなく絞り込みの目安として使う
+def _embed(zero_shot_classifier, texts: list[str], batch_size: int) -> np.ndarray:
+    tokenizer = zero_shot_classifier.tokenizer
+    encoder = getattr(zero_shot_classifier.model, "base_model", None)
+    if encoder is None:
+        raise ValueError("embedding mode needs a PyTorch backend (fp32 or int8)")
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))  # 長さ順にバッチにしてパディングを減らす
+    embeddings = np.zeros((len(texts), encoder.config.hidden_size), dtype=np.float32)
+    import torch
+    with torch.inference_mode():
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            with stage("embed"):
+                encoded = tokenizer(
+                    [texts[i] for i in batch],
+                    padding=True,
+                    truncation=True,
+                    max_length=min(_max_length(tokenizer), EMBEDDING_MAX_LENGTH),
+                    return_tensors="pt",
+                ).to(encoder.device)
+                cls = encoder(**encoded).last_hidden_state[:, 0]
+            count("batches")
+            embeddings[batch] = torch.nn.functional.normalize(cls, dim=-1).float().cpu().numpy()
+    return embeddings
+
+
+def _category_embeddings(zero_shot_classifier, template: str, categories: list[str], batch_size: int,
+                         model_key: str) -> np.ndarray:
+    vectors = hypothesis_cache.get_many(
+        "embedding", model_key, template, categories,
+        lambda cs: list(_embed(zero_shot_classifier, [template.format(c) for c in cs], batch_size)),
     )
+    return np.stack(vectors)
+
+
+# ===== 高速モード：テキストの埋め込みとカテゴリの埋め込みのコサイン類似度を1回の行列積で計算 =====
+def _embedding_scores(zero_shot_classifier, input_texts: list[str], categories: list[str],
+                      template: str, batch_size: int, model_key: str) -> np.ndarray:
+    if not input_texts or not categories:
+        return np.zeros((len(input_texts), len(categories)))
+    category_embeddings = _category_embeddings(zero_shot_classifier, template, categories, batch_size, model_key)
+    return _embed(zero_shot_classifier, input_texts, batch_size) @ category_embeddings.T
+
 
-    # モデルに渡すプロンプトテンプレート。ラベル名をこのテンプレートに埋め込む。精度が向上する可能性があるらしい。
-    template = "このテキストは {} について書かれています。"
-
-    results = []
-    for i, input_text in enumerate(input_texts):
-        output = zero_shot_classifier(
-            input_text,
-            categories,
-            hypothesis_template=template,  # テンプレート
-            multi_label=True  # True:複数のカテゴリにまたがっている可能性がある場合。スコアの合計は1.0にはならない（Sigmoidでスコア化される）
-        )                     # False:1つのカテゴリだけに属するとみなせる場合。スコアの合計は1.0（Softmax関数で正規化）
-        #print(output,"\n")   # 辞書で返る（sequenc, labels, scores）
-        results.append(output)
-    
-    # スコアが降順に返ってくるので、元のラベル順に並べ替える
+# ===== 埋め込みで絞った上位k件のカテゴリだけNLIで計算し直す（それ以外はNaN） =====
+def _reranked_scores(zero_shot_classifier, input_texts: list[str], categories: list[str],
+                     template: str, batch_size: int, model_key: str, top_k: int) -> np.ndarray:
+    similarity = _embedding_scores(zero_shot_classifier, input_texts, categories, template, batch_size, model_key)
+    if similarity.size == 0:
+        return similarity
+    top_k = min(top_k, len(categories))
+    top = np.argpartition(-similarity, top_k - 1, axis=1)[:, :top_k]
+    pairs = [(i, int(j)) for i in range(len(input_texts)) for j in top[i]]
+    return _batched_nli_scores(zero_shot_classifier, input_texts, categories, template, batch_size, pairs=pairs)
+
+
+# ===== 結果をデータフレームに変換（text, カテゴリごとのスコア, top_label） =====
+def _scores_to_dataframe(input_texts: list[str], categories: list[str], scores) -> pd.DataFrame:
     rows = []
-    for r in results:
-        row = {"text": r["sequence"]}
-        for c in categories:
-            idx = r["labels"].index(c)  # cが何番目か調べる
-            score = r["scores"][idx]    # idx番目のスコアを格納
-            row[c] = score              # このラベルの列にスコアを入れる
+    for text, text_scores in zip(input_texts, scores):
+        row = {"text": text}
+        for c, score in zip(categories, text_scores):
+            row[c] = float(score)  # このラベルの列にスコアを入れる
         rows.append(row)
 
     df_results = pd.DataFrame(rows)
-    # print(df_results.columns)
 
     # 各行からスコア最大値のラベル名を取得
-    top_labels = []
-    for idx, df_row in df_results.iterrows():  # rowが1行分のデータ（Series）でとれる。iterrowsは(インデックス,行のデータ)をタプルで返す
-        scores = df_row.drop("text").astype(float)  # なぜかスコアが文字列だから、text列を除いてfloatに変換
-        # print(scores)
-        top = scores.idxmax()  # スコア最大値のラベル名を取得
-        # print(f"top:{top}")
-        # print(f"type(top):{type(top)}")
-        top_labels.append(top)
-        # print(top_labels)
-    df_results["top_label"] = top_labels
-    return df_results
\ No newline at end of file
+    label_columns = [c for c in df_results.columns if c != "text"]
+    if len(df_results) > 0:
+        df_results["top_label"] = df_results[label_columns].astype(float).idxmax(axis=1)
+    else:
+        df_results["top_label"] = pd.Series(dtype=object)
+    return df_results
+
+
+def _scores(zero_shot_classifier, input_texts: list[str], categories: list[str], mode: str,
+            batch_size: int, top_k: int, backend: str) -> np.ndarray:
+    model_key = f"{ZERO_SHOT_MODEL}:{backend}"  # バックエンドが違うと埋め込みも変わるので分けてキャッシュする
+    if mode == "exact":
+        # 全テキスト×全カテゴリのペアをまとめてバッチ推論
+        # （multi_label=True相当：複数のカテゴリにまたがっている可能性がある場合。スコアの合計は1.0にはならない）
+        return _batched_nli_scores(zero_shot_classifier, input_texts, categories, HYPOTHESIS_TEMPLATE, batch_size)
+    if mode == "embedding":
+        return _embedding_scores(zero_shot_classifier, input_texts, categories, HYPOTHESIS_TEMPLATE, batch_size, model_key)
+    return _reranked_scores(zero_shot_classifier, input_texts, categories, HYPOTHESIS_TEMPLATE, batch_size, model_key, top_k)
+
+
+# mode: "exact"（NLIで全ペア） / "embedding"（埋め込みのコサイン類似度） / "rerank"（埋め込みで上位top_k件に絞ってNLI）
+def zero_shot_classification(input_texts: list[str], categories: list[str], batch_size: int = 32,
+                             mode: str = "exact", top_k: int = 3, backend: str = DEFAULT_BACKEND) -> pd.DataFrame:
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}: {mode}")
+
+    # ゼロショット分類モデルをレジストリから取得（初回だけロード）
+    zero_shot_classifier = get_pipeline("zero-shot-classification", ZERO_SHOT_MODEL, backend)
+
+    with stage("inference"):
+        scores = _scores(zero_shot_classifier, input_texts, categories, mode, batch_size, top_k, backend)
+    count("docs", len(input_texts))
+    return _scores_to_dataframe(input_texts, categories, scores)
+
+
+# ===== 高速モードと厳密モードの比較（処理時間と、厳密モードの1位とどれだけ一致するか） =====
+def compare_modes(input_texts: list[str], categories: list[str], batch_size: int = 32, top_k: int = 3,
+                  backend: str = DEFAULT_BACKEND) -> pd.DataFrame:
+    zero_shot_classifier = get_pipeline("zero-shot-classification", ZERO_SHOT_MODEL, backend)
+    results = {}
+    for mode in MODES:
+        start = time.perf_counter()
+        scores = _scores(zero_shot_classifier, input_texts, categories, mode, batch_size, top_k, backend)
+        results[mode] = (time.perf_counter() - start, scores)
+
+    exact_seconds, exact_scores = results["exact"]
+    exact_top = np.nanargmax(exact_scores, axis=1) if len(input_texts) else np.zeros(0, dtype=int)
+    rows = []
+    for mode, (seconds, scores) in results.items():
+        top = np.nanargmax(scores, axis=1) if len(input_texts) else np.zeros(0, dtype=int)
+        # 埋め込みのスコアで上位k件に厳密モードの1位が入っている割合（rerankで取りこぼさない割合）
+        k = min(top_k, len(categories))
+        ranked = np.argsort(-np.nan_to_num(scores, nan=-np.inf), axis=1)[:, :k]
+        rows.append({
+            "mode": mode,
+            "score_type": SCORE_TYPES[mode],
+            "seconds": round(seconds, 3),
+            "texts_per_sec": round(len(input_texts) / seconds, 1) if seconds > 0 else None,
+            "speedup": round(exact_seconds / seconds, 2) if seconds > 0 else None,
+            "top1_agreement": float(np.mean(top == exact_top)) if len(input_texts) else None,
+            f"exact_top1_in_top{k}": float(np.mean((ranked == exact_top[:, None]).any(axis=1))) if len(input_texts) else None,
+        })
+    return pd.DataFrame(rows)
@@ -0,0 +1,60 @@
+# ===== PR TIMESの検索結果のページ送りを実際のサイトで確かめる（ネットワークに出る。ベンチマークからは呼ばない） =====
+# 使い方（リポジトリの直下で実行）:
+#   python benchmarks/check_search_pagination.py --keyword AI                  # アプリのSEARCH_PAGE_PARAMを確かめる
+#   python benchmarks/check_search_pagination.py --keyword AI --param page     # 別のパラメータ名を試す
+#   python benchmarks/check_search_pagination.py --keyword AI --save           # 効いていればfixtureとして保存する
+# 1ページ目と、パラメータを付けた2ページ目を取得して、2ページ目に1ページ目にない記事があるかを見る。
+# 終了コード0：パラメータが効いている / 1：効いていない（2ページ目が空か、1ページ目と同じ記事だけ）
+# --save は検索結果の2ページと、使ったパラメータ名（prtimes_search.json）をfixturesに書き出す
+from pathlib import Path
+import argparse, json, sys
+
+BENCH_DIR = Path(__file__).resolve().parent
+APP_DIR = BENCH_DIR.parent / "app"
+FIXTURE_DIR = BENCH_DIR / "fixtures"
+
+
+def main(argv: list[str] | None = None) -> int:
+    sys.path.insert(0, str(APP_DIR))
+    from article_fetcher import ArticleFetcher
+    from scraping_co_occurrence_network import make_search_url, parse_search_results, SEARCH_PAGE_PARAM, SEARCH_PAGE_SIZE
+
+    parser = argparse.ArgumentParser(description="Check the PR TIMES search pagination parameter against the live site")
+    parser.add_argument("--keyword", required=True, help="search keyword with at least two pages of results")
+    parser.add_argument("--param", default=SEARCH_PAGE_PARAM, help="page number parameter to try (default: the app's)")
+    parser.add_argument("--save", action="store_true", help="save both pages as benchmark fixtures if pagination works")
+    args = parser.parse_args(argv)
+
+    search_url = make_search_url(args.keyword)
+    fetcher = ArticleFetcher(requests_per_second=1.0)
+    try:
+        first = fetcher.fetch(search_url).text
+        second = fetcher.fetch(f"{search_url}&{args.param}=2").text
+    finally:
+        fetcher.close()
+
+    first_urls = {url for _, url in parse_search_results(first)}
+    second_urls = {url for _, url in parse_search_results(second)}
+    new_urls = second_urls - first_urls
+    print(f"page 1: {len(first_urls)} articles, page 2 ({args.param}=2): {len(second_urls)} articles, "
+          f"{len(new_urls)} not on page 1")
+    if len(first_urls) < SEARCH_PAGE_SIZE:
+        print(f"page 1 has fewer than {SEARCH_PAGE_SIZE} articles; try a keyword with more results")
+        return 1
+    if not new_urls:
+        print(f"NG: {args.param!r} is ignored by the search page")
+        return 1
+    print(f"OK: {args.param!r} pages the search results")
+
+    if args.save:
+        (FIXTURE_DIR / "prtimes_search.html").write_text(first, encoding="utf-8")
+        (FIXTURE_DIR / "prtimes_search_page2.html").write_text(second, encoding="utf-8")
+        meta = {"page_param": args.param, "source": search_url}
+        (FIXTURE_DIR / "prtimes_search.json").write_text(json.dumps(meta, ensure_ascii=False, indent=2) + "\n",
+                                                         encoding="utf-8")
+        print(f"saved fixtures to {FIXTURE_DIR}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+from itertools import accumulate
+import random, re
+
+# ===== 合成の日本語コーパス（プレスリリース風の文を乱数で組み立てる。seedが同じなら毎回同じ文書になる） =====
+# 単語の出現頻度は実際の文章と同じように偏らせる（順位rの単語がおよそ 1/r に比例して出る）
+
+COMPANIES = ["株式会社サンプル", "テスト工業株式会社", "未来テクノロジー株式会社", "さくら食品株式会社", "青空物流株式会社",
+             "株式会社みなとデザイン", "北斗エネルギー株式会社", "株式会社ひかり教育", "東西メディカル株式会社", "株式会社つばさ観光"]
+
+NOUNS = [
+    "サービス", "システム", "商品", "事業", "開発", "提供", "販売", "技術", "情報", "企業", "顧客", "地域", "社会", "環境", "市場",
+    "製品", "導入", "活用", "支援", "運営", "施設", "店舗", "イベント", "キャンペーン", "プロジェクト", "データ", "研究", "教育",
+    "健康", "医療", "食品", "観光", "旅行", "物流", "エネルギー", "脱炭素", "人材", "採用", "働き方", "デジタル", "アプリ", "会員",
+    "価格", "品質", "安全", "設計", "生産", "工場", "材料", "資金", "投資", "成長", "業界", "課題", "解決", "価値", "体験", "未来",
+    "子ども", "家族", "高齢者", "学生", "自治体", "大学", "病院", "農業", "漁業", "海外", "日本", "東京", "大阪", "北海道", "沖縄",
+    "記念", "発売", "受賞", "提携", "連携", "協業", "調査", "結果", "報告", "発表", "予約", "限定", "特典", "割引", "無料",
+    "期間", "全国", "新型", "人工知能", "クラウド", "セキュリティ", "ロボット", "自動化", "効率", "品揃え", "ブランド", "デザイン",
+    "コンテンツ", "動画", "音楽", "映画", "書籍", "雑誌", "スポーツ", "大会", "選手", "チーム", "天気", "季節", "春", "夏", "秋", "冬",
+]
+SUFFIXES = ["サービス", "システム", "センター", "プラン", "プログラム", "シリーズ", "モデル", "ラボ", "ネットワーク", "ステーション"]
+VERBS = ["開始しました", "発表しました", "発売します", "提供します", "開催します", "導入しました", "実施します", "公開しました",
+         "拡大します", "強化します", "設立しました", "受賞しました", "締結しました", "刷新しました", "展開します"]
+ADJECTIVES = ["新しい", "便利な", "大きな", "安全な", "快適な", "手軽な", "本格的な", "画期的な", "身近な", "持続可能な"]
+TEMPLATES = [
+    "{company}は、{adj}{noun}の{noun2}を{verb}。",
+    "{noun}と{noun2}を組み合わせた{noun3}を{verb}。",
+    "{month}月{day}日より、{noun}向けの{noun2}{suffix}を{verb}。",
+    "本{noun}では、{noun2}の{noun3}に関する{adj}{noun4}を{verb}。",
+    "{noun}の{noun2}は前年比{percent}%増となりました。",
+    "{company}と{company2}は、{noun}分野での{noun2}について{verb}。",
+    "詳しくは{noun}の{noun2}ページをご覧ください。",
+]
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+
+def parse_size(text: str) -> int:
+    return SIZES.get(text.lower()) or int(text)
+
+
+# 累積の重み（choicesに毎回重みを渡すと累積を計算し直すので、先に1回だけ計算しておく）
+def _zipf_cum_weights(n: int, exponent: float = 1.0) -> list[float]:
+    return list(accumulate(1 / (rank ** exponent) for rank in range(1, n + 1)))
+
+
+def _sentence(rng: random.Random, cum_weights: list[float]) -> str:
+    nouns = rng.choices(NOUNS, cum_weights=cum_weights, k=4)
+    return rng.choice(TEMPLATES).format(
+        company=rng.choice(COMPANIES), company2=rng.choice(COMPANIES), adj=rng.choice(ADJECTIVES),
+        noun=nouns[0], noun2=nouns[1], noun3=nouns[2], noun4=nouns[3], suffix=rng.choice(SUFFIXES),
+        verb=rng.choice(VERBS), month=rng.randint(1, 12), day=rng.randint(1, 28), percent=rng.randint(1, 300),
+    )
+
+
+# 1文書は1～8文（平均すると約4.5文、130字前後）
+def generate_corpus(n_docs: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    cum_weights = _zipf_cum_weights(len(NOUNS))
+    return ["".join(_sentence(rng, cum_weights) for _ in range(rng.randint(1, 8))) for _ in range(n_docs)]
+
+
+# 長文モード用（512トークンを超える長い文書）
+def generate_long_documents(n_docs: int, sentences: int = 60, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    cum_weights = _zipf_cum_weights(len(NOUNS))
+    return ["".join(_sentence(rng, cum_weights) for _ in range(sentences)) for _ in range(n_docs)]
+
+
+# コーパスに出てくる文字（小さな代わりのモデルの語彙に使う）
+def corpus_characters() -> set[str]:
+    templates = [re.sub(r"\{\w+\}", "", template) for template in TEMPLATES]
+    return set("".join(COMPANIES + NOUNS + SUFFIXES + VERBS + ADJECTIVES + templates)) | set("0123456789%")
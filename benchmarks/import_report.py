@@ -0,0 +1,98 @@
+# ===== 起動時のimport時間のレポート（ページを開いたときに何がimportされて、どれだけ時間がかかったか） =====
+# 使い方（リポジトリの直下で実行）:
+#   python benchmarks/import_report.py                   # 全ページ
+#   python benchmarks/import_report.py --pages app_home.py,app_wordfrequency_wordcloud.py --top 20 --json imports.json
+# ページごとに新しいPythonプロセスで（python -X importtime）、Streamlitを読み込んだ後にページを1回実行する。
+# Streamlit自体のimportは数えず、ページを開いたことで増えたimportだけを数えて、重いパッケージを時間の大きい順に出す。
+# Top Page・単語頻度のページでtorchやseleniumがimportされていたら終了コード1（CIでの確認用）
+from pathlib import Path
+import argparse, json, os, subprocess, sys, time
+
+APP_DIR = Path(__file__).resolve().parent.parent / "app"
+PAGES = ["app_main.py", "app_home.py", "app_wordfrequency_wordcloud.py", "app_sentiment_analysis.py",
+         "app_zero_shot_classification.py", "app_scraping_co_occurrence_network.py"]
+# 開いただけではimportしてはいけない重いライブラリ（分析を実行したときに初めて読む）
+FORBIDDEN = {
+    "app_main.py": ["torch", "transformers", "selenium", "webdriver_manager"],
+    "app_home.py": ["torch", "transformers", "selenium", "webdriver_manager"],
+    "app_wordfrequency_wordcloud.py": ["torch", "transformers", "selenium", "webdriver_manager"],
+}
+MARKER = "----- page starts -----"
+
+
+# ===== 子プロセス側：Streamlitを読み込んでから目印を出して、ページを1回実行する =====
+def _run_page(page: str):
+    from streamlit.testing.v1 import AppTest
+    os.chdir(APP_DIR)
+    sys.path.insert(0, str(APP_DIR))
+    print(MARKER, file=sys.stderr, flush=True)
+    start = time.perf_counter()
+    AppTest.from_file(str(APP_DIR / page), default_timeout=120).run()
+    seconds = time.perf_counter() - start
+    print(json.dumps({"seconds": seconds, "modules": sorted(sys.modules)}), flush=True)
+
+
+# -X importtime の出力（"import time: self [us] | cumulative | imported package"）から、目印より後の行を読む
+def _parse_importtime(stderr: str) -> list[dict]:
+    lines = stderr.split(MARKER, 1)[-1].splitlines()
+    imports = []
+    for line in lines:
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if not self_us.strip().isdigit():  # 見出しの行
+            continue
+        depth = (len(name) - len(name.lstrip())) // 2  # 入れ子の深さはインデントで表される
+        imports.append({"module": name.strip(), "depth": depth, "self_ms": int(self_us) / 1000,
+                        "cumulative_ms": int(cumulative_us) / 1000})
+    return imports
+
+
+def report_page(page: str, top: int) -> dict:
+    env = {**os.environ, "APP_PASSWORD": os.environ.get("APP_PASSWORD", "")}  # app_mainはパスワードの先まで進める
+    process = subprocess.run([sys.executable, "-X", "importtime", __file__, "--child", page],
+                             capture_output=True, text=True, env=env)
+    if process.returncode != 0:
+        raise SystemExit(f"{page} failed:\n{process.stderr[-2000:]}")
+    child = json.loads(process.stdout.strip().splitlines()[-1])
+    imports = _parse_importtime(process.stderr)
+    shallowest = min((i["depth"] for i in imports), default=0)
+    direct = [i for i in imports if i["depth"] == shallowest]  # ページを実行して直接importしたもの（合計がページのimport時間）
+    packages = [i for i in imports if "." not in i["module"]]  # パッケージ単位（入れ子になっている分は重ねて数える）
+    modules = set(child["modules"])
+    return {
+        "page": page,
+        "seconds": round(child["seconds"], 3),
+        "import_ms": round(sum(i["cumulative_ms"] for i in direct), 1),
+        "new_modules": len(imports),
+        "heaviest": sorted(packages, key=lambda i: -i["cumulative_ms"])[:top],
+        "forbidden_imported": [name for name in FORBIDDEN.get(page, []) if name in modules],
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Report import time per Streamlit page")
+    parser.add_argument("--pages", help="comma separated page files (default: all pages)")
+    parser.add_argument("--top", type=int, default=10, help="number of heaviest imports to list per page")
+    parser.add_argument("--json", help="write the report to this JSON file")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        _run_page(args.child)
+        return 0
+
+    reports = [report_page(page, args.top) for page in (args.pages.split(",") if args.pages else PAGES)]
+    for r in reports:
+        print(f"{r['page']}: {r['seconds']:.2f}s to first render, {r['import_ms']:.0f} ms in "
+              f"{r['new_modules']} imports")
+        for i in r["heaviest"]:
+            print(f"    {i['cumulative_ms']:>9.1f} ms  {i['module']}")
+        if r["forbidden_imported"]:
+            print(f"    NG: imported {', '.join(r['forbidden_imported'])}")
+    if args.json:
+        Path(args.json).write_text(json.dumps(reports, ensure_ascii=False, indent=2), encoding="utf-8")
+    return 1 if any(r["forbidden_imported"] for r in reports) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,244 @@
+# ===== ベンチマーク（合成コーパス・保存したPR TIMESのページ・小さな代わりのモデルで、各段階をオフラインで計測する） =====
+# 使い方（リポジトリの直下で実行）:
+#   python benchmarks/run_benchmarks.py                              # 1k文書で全段階
+#   python benchmarks/run_benchmarks.py --sizes 1k,100k,1m --stages morph,make_word_pairs
+#   python benchmarks/run_benchmarks.py --baseline benchmarks/results/before.json --fail-on-regression
+# 結果は benchmarks/results/<日時>.json に書き出す（段階×コーパスの大きさごとに、スループット・レイテンシの分位点・ピークメモリ）
+# --baseline を渡すと前回の結果とp50を比べて、--threshold（既定20%）より遅くなった段階を表示する
+# Transformerの段階は乱数の重みの小さなBERTで動かす（精度ではなく前処理・バッチ化・後処理の速さを見るため）。
+# 本物のモデルで計測したいときは SENTIMENT_MODEL / ZERO_SHOT_MODEL を指定する
+from pathlib import Path
+import argparse, datetime, gc, importlib.util, json, os, platform, statistics, subprocess, sys, time, tracemalloc
+
+BENCH_DIR = Path(__file__).resolve().parent
+APP_DIR = BENCH_DIR.parent / "app"
+CACHE_DIR = BENCH_DIR / ".cache"
+RESULTS_DIR = BENCH_DIR / "results"
+DICT_TYPES = ["small", "core", "full"]
+PACKAGES = ["numpy", "pandas", "sudachipy", "networkx", "matplotlib", "wordcloud", "torch", "transformers"]
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Benchmark each pipeline stage on synthetic data")
+    parser.add_argument("--sizes", default="1k", help="comma separated corpus sizes (1k, 10k, 100k, 1m or a number)")
+    parser.add_argument("--stages", help="comma separated name prefixes of the stages to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per stage")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed runs per stage before measuring")
+    parser.add_argument("--model-docs", type=int, default=2000,
+                        help="documents fed to the transformer stages (capped at the corpus size)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dict", choices=DICT_TYPES,
+                        help="Sudachi dictionary (default: the app's setting, SUDACHI_DICT or full)")
+    parser.add_argument("--no-memory", action="store_true", help="skip the extra tracemalloc run per stage")
+    parser.add_argument("--output", help="result JSON (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--baseline", help="previous result JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="slowdown ratio reported as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit with status 1 on regressions")
+    return parser
+
+
+# ===== アプリのキャッシュ・モデルをベンチマーク用に差し替える（appのモジュールをimportする前に呼ぶ） =====
+def _configure_environment(args):
+    os.environ["TOKEN_CACHE_PATH"] = str(CACHE_DIR / "tokens.sqlite3")  # 普段のキャッシュを汚さない・使わない
+    os.environ["ARTICLE_STORE_PATH"] = str(CACHE_DIR / "articles.sqlite3")
+    os.environ.pop("METRICS_LOG", None)
+    # 辞書はアプリと同じ決め方（SUDACHI_DICT、なければfull）。入っていなければ計測を始める前に止める
+    dict_type = args.dict or os.environ.get("SUDACHI_DICT", "full")
+    if importlib.util.find_spec(f"sudachidict_{dict_type}") is None:
+        installed = [name for name in DICT_TYPES if importlib.util.find_spec(f"sudachidict_{name}") is not None]
+        raise SystemExit(f"Sudachi dictionary '{dict_type}' is not installed (pip install sudachidict_{dict_type}); "
+                         f"installed: {', '.join(installed) or 'none'}. Choose one with --dict or SUDACHI_DICT.")
+    os.environ["SUDACHI_DICT"] = dict_type
+    if "SENTIMENT_MODEL" not in os.environ or "ZERO_SHOT_MODEL" not in os.environ:
+        from tiny_models import build_tiny_models
+        models = build_tiny_models(CACHE_DIR / "models")
+        os.environ.setdefault("SENTIMENT_MODEL", str(models["sentiment"]))
+        os.environ.setdefault("ZERO_SHOT_MODEL", str(models["zero_shot"]))
+    sys.path.insert(0, str(APP_DIR))
+
+
+def _percentile(sorted_values: list[float], p: float) -> float:
+    return sorted_values[min(int(len(sorted_values) * p), len(sorted_values) - 1)]
+
+
+# ===== 1つの段階を計測（warmup回は捨てて、repeat回の時間・件数・内訳を集める） =====
+def measure(benchmark, repeat: int, warmup: int, memory: bool) -> dict:
+    from instrumentation import track_run, peak_rss_mb
+
+    for _ in range(warmup):
+        if benchmark.setup:
+            benchmark.setup()
+        benchmark.run()
+
+    run_seconds, item_latencies, items, last_run = [], [], 0, None
+    for _ in range(repeat):
+        if benchmark.setup:
+            benchmark.setup()
+        gc.collect()
+        with track_run(benchmark.name) as last_run:
+            start = time.perf_counter()
+            result = benchmark.run()
+            run_seconds.append(time.perf_counter() - start)
+        items, latencies = result if isinstance(result, tuple) else (result, None)
+        item_latencies.extend(latencies or [])
+
+    # tracemallocは遅くなるので、時間を計った実行とは別にもう1回だけ動かす
+    peak_traced_mb = None
+    if memory:
+        if benchmark.setup:
+            benchmark.setup()
+        gc.collect()
+        tracemalloc.start()
+        try:
+            benchmark.run()
+            peak_traced_mb = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        finally:
+            tracemalloc.stop()
+
+    # 1件ごとの時間があればその分位点、なければ1回の実行ごとの時間の分位点
+    latencies = sorted(item_latencies or run_seconds)
+    p50 = statistics.median(run_seconds)
+    breakdown = last_run.to_dict()
+    return {
+        "unit": benchmark.unit,
+        "items": items,
+        "runs": len(run_seconds),
+        "seconds": [round(s, 6) for s in run_seconds],
+        "p50_sec": round(p50, 6),
+        "throughput_per_sec": round(items / p50, 2) if p50 > 0 else None,
+        "latency_basis": "item" if item_latencies else "run",
+        "latency_p50_sec": round(_percentile(latencies, 0.5), 6),
+        "latency_p95_sec": round(_percentile(latencies, 0.95), 6),
+        "latency_p99_sec": round(_percentile(latencies, 0.99), 6),
+        "latency_max_sec": round(latencies[-1], 6),
+        "peak_traced_mb": None if peak_traced_mb is None else round(peak_traced_mb, 1),
+        "peak_rss_mb": None if peak_rss_mb() is None else round(peak_rss_mb(), 1),  # プロセス起動からの最大値
+        "stages": breakdown["stages"],
+        "counters": breakdown["counters"],
+    }
+
+
+def _selected(name: str, prefixes: list[str] | None) -> bool:
+    return prefixes is None or any(name.startswith(prefix) for prefix in prefixes)
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=BENCH_DIR, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _package_versions() -> dict:
+    from importlib.metadata import version, PackageNotFoundError
+    versions = {}
+    for name in PACKAGES:
+        try:
+            versions[name] = version(name)
+        except PackageNotFoundError:
+            versions[name] = None
+    return versions
+
+
+def _metadata(args) -> dict:
+    return {
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "packages": _package_versions(),
+        "sudachi_dict": os.environ["SUDACHI_DICT"],
+        "sentiment_model": os.environ["SENTIMENT_MODEL"],
+        "zero_shot_model": os.environ["ZERO_SHOT_MODEL"],
+        "search_fixture": json.loads((BENCH_DIR / "fixtures" / "prtimes_search.json").read_text(encoding="utf-8")),
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "warmup": args.warmup,
+    }
+
+
+def _log(message: str):
+    print(message, file=sys.stderr, flush=True)
+
+
+def _report(record: dict):
+    _log(f"  {record['stage']:<32} {record['p50_sec']:>10.4f}s  {record['throughput_per_sec'] or 0:>12.1f} "
+         f"{record['unit']}/s  p95 {record['latency_p95_sec']:.4f}s  "
+         f"mem {record['peak_traced_mb'] if record['peak_traced_mb'] is not None else '-'} MB")
+
+
+def run_all(args, benchmarks_by_size) -> list[dict]:
+    prefixes = args.stages.split(",") if args.stages else None
+    records = []
+    for size, benchmarks in benchmarks_by_size:
+        _log(f"[{size}]")
+        for benchmark in benchmarks():
+            if not _selected(benchmark.name, prefixes):
+                continue
+            record = {"stage": benchmark.name, "size": size}
+            if benchmark.skip_reason:
+                records.append({**record, "skipped": benchmark.skip_reason})
+                _log(f"  {benchmark.name:<32} skipped ({benchmark.skip_reason})")
+                continue
+            record.update(measure(benchmark, args.repeat, args.warmup, not args.no_memory))
+            records.append(record)
+            _report(record)
+    return records
+
+
+# ===== 前回の結果と比べる（同じ段階・同じ大きさのp50の比。threshold以上遅くなったらregression） =====
+def compare(records: list[dict], baseline: dict, threshold: float) -> list[dict]:
+    previous = {(r["stage"], r["size"]): r for r in baseline["results"] if "p50_sec" in r}
+    comparison = []
+    for record in records:
+        before = previous.get((record["stage"], record["size"]))
+        if before is None or "p50_sec" not in record or before["p50_sec"] <= 0:
+            continue
+        ratio = record["p50_sec"] / before["p50_sec"]
+        status = "regression" if ratio > 1 + threshold else "improvement" if ratio < 1 - threshold else "same"
+        comparison.append({"stage": record["stage"], "size": record["size"], "baseline_p50_sec": before["p50_sec"],
+                           "p50_sec": record["p50_sec"], "ratio": round(ratio, 3), "status": status})
+    return comparison
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    sys.path.insert(0, str(BENCH_DIR))
+    _configure_environment(args)
+
+    from corpus import generate_corpus, parse_size
+    from stages import corpus_benchmarks, fixed_benchmarks, fixture_server
+
+    sizes = [size.strip() for size in args.sizes.split(",")]
+    with fixture_server() as server_url:
+        benchmarks_by_size = [("fixed", lambda: fixed_benchmarks(server_url))]
+        for size in sizes:
+            # コーパスと下準備はその大きさの番が来てから作る（1mのときに全部の大きさを同時にメモリに置かない）
+            def benchmarks(n_docs=parse_size(size)):
+                return corpus_benchmarks(generate_corpus(n_docs, seed=args.seed), min(args.model_docs, n_docs))
+            benchmarks_by_size.append((size, benchmarks))
+        records = run_all(args, benchmarks_by_size)
+
+    result = {"meta": _metadata(args), "results": records}
+    status = 0
+    if args.baseline:
+        comparison = compare(records, json.loads(Path(args.baseline).read_text(encoding="utf-8")), args.threshold)
+        result["comparison"] = comparison
+        _log(f"compared with {args.baseline}")
+        for c in comparison:
+            _log(f"  {c['stage']:<32} [{c['size']}] {c['baseline_p50_sec']:.4f}s -> {c['p50_sec']:.4f}s "
+                 f"x{c['ratio']:.2f} {c['status']}")
+        if args.fail_on_regression and any(c["status"] == "regression" for c in comparison):
+            status = 1
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+    _log(f"wrote {output}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
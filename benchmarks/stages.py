@@ -0,0 +1,238 @@
+from contextlib import contextmanager
+from dataclasses import dataclass
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+from typing import Callable
+from corpus import generate_long_documents
+import io, json, subprocess, sys, threading, time, urllib.parse
+
+FIXTURE_DIR = Path(__file__).parent / "fixtures"
+ZERO_SHOT_CATEGORIES = ["経済", "スポーツ", "天気", "健康", "教育"]
+PARSE_LOOPS = 50         # 1回の計測でfixtureを何回パースするか
+FETCH_ARTICLES = 200     # ローカルサーバーから取得する記事数
+
+
+# ===== 1つの段階のベンチマーク =====
+# runは処理した件数を返す。(件数, 1件ごとの秒数のリスト) を返すと、レイテンシの分位点は1件ごとの時間で計算する
+@dataclass
+class Benchmark:
+    name: str
+    run: Callable[[], int | tuple[int, list[float]]]
+    unit: str = "docs"
+    setup: Callable[[], None] | None = None  # 毎回の計測の前に呼ぶ（キャッシュを空にするなど。時間には含めない）
+    skip_reason: str | None = None
+
+
+def _timed_calls(func, args_list) -> tuple[int, list[float]]:
+    latencies = []
+    for args in args_list:
+        start = time.perf_counter()
+        func(*args)
+        latencies.append(time.perf_counter() - start)
+    return len(latencies), latencies
+
+
+# ===== コーパスの大きさごとのベンチマーク（形態素解析・単語頻度・共起・レイアウト・描画・モデル） =====
+def corpus_benchmarks(texts: list[str], model_docs: int) -> list[Benchmark]:
+    import pandas as pd
+    import matplotlib.pyplot as plt
+    from token_cache import get_token_cache
+    from token_corpus import TokenCorpus
+    from wordfrequency_wordcloud import morph_for_freq_wordcloud, make_wordcloud, list_matplotlib_colors
+    from wordcloud_engine import get_wordcloud_cache, FONT_PATH
+    from scraping_co_occurrence_network import (morph_texts_for_cooccurrence, make_word_pairs,
+                                                prepare_cooccurrence_network, plot_cooccurrence_network)
+
+    df = pd.DataFrame({"text": texts})
+    color = list_matplotlib_colors()[0]
+
+    def clear_token_cache():
+        cache = get_token_cache()
+        if cache is not None:
+            cache.clear()
+
+    # 後の段階の入力（ここは計測しない）
+    corpus = morph_for_freq_wordcloud(df, "text", [])
+    all_tokens = morph_texts_for_cooccurrence(texts)
+    top200 = make_word_pairs(all_tokens, top_n=200)
+    top2000 = make_word_pairs(all_tokens, top_n=2000)
+
+    def recount():
+        fresh = TokenCorpus(corpus.vocab, corpus.ids, corpus.offsets)  # 出現数のキャッシュを持たない状態から数える
+        fresh.most_common(100)
+        return fresh.n_tokens
+
+    def word_pairs(window):
+        def run():
+            make_word_pairs(all_tokens, window=window)
+            return len(all_tokens)
+        return run
+
+    def layout(top_pairs, method):
+        def run():
+            G, _, _ = prepare_cooccurrence_network(top_pairs, layout=method)
+            return G.number_of_edges()
+        return run
+
+    def plot_network():
+        fig = plot_cooccurrence_network(top200)
+        fig.savefig(io.BytesIO(), format="png")  # 実際に画像にするところまで
+        plt.close(fig)
+        return 1
+
+    def wordcloud():
+        fig = make_wordcloud(corpus, color)
+        plt.close(fig)
+        return 1
+
+    benchmarks = [
+        Benchmark("morph_for_freq_wordcloud_cold", lambda: len(morph_for_freq_wordcloud(df, "text", []).offsets) - 1,
+                  setup=clear_token_cache),
+        Benchmark("morph_for_freq_wordcloud_warm", lambda: len(morph_for_freq_wordcloud(df, "text", []).offsets) - 1),
+        Benchmark("word_frequency_count", recount, unit="tokens"),
+        Benchmark("make_word_pairs_document", word_pairs(None)),
+        Benchmark("make_word_pairs_window5", word_pairs(5)),
+        Benchmark("layout_spring_200", layout(top200, "spring"), unit="edges"),
+        Benchmark("layout_spectral_200", layout(top200, "spectral"), unit="edges"),
+        Benchmark("layout_spectral_2000", layout(top2000, "spectral"), unit="edges"),
+        Benchmark("plot_cooccurrence_network", plot_network, unit="images"),
+        Benchmark("make_wordcloud", wordcloud, unit="images", setup=get_wordcloud_cache().clear,
+                  skip_reason=None if FONT_PATH.exists() else f"font not found: {FONT_PATH}"),
+    ]
+    return benchmarks + model_benchmarks(texts[:model_docs])
+
+
+# ===== Transformerの段階（小さな代わりのモデルで、前処理・バッチ化・後処理を含めた流れの速さを見る） =====
+def model_benchmarks(texts: list[str]) -> list[Benchmark]:
+    from sentiment_analysis import sentiment_analysis_stream, sentiment_analysis_chunked
+    from zero_shot_classification import zero_shot_classification
+
+    long_texts = generate_long_documents(max(len(texts) // 20, 1))
+
+    def sentiment():
+        latencies = []
+        start = time.perf_counter()
+        for _, df_batch in sentiment_analysis_stream(texts, batch_size=32):
+            latencies.extend([(time.perf_counter() - start) / len(df_batch)] * len(df_batch))  # バッチの時間を1件あたりに
+            start = time.perf_counter()
+        return len(texts), latencies
+
+    def zero_shot(mode):
+        return lambda: len(zero_shot_classification(texts, ZERO_SHOT_CATEGORIES, batch_size=32, mode=mode))
+
+    return [
+        Benchmark("sentiment_analysis", sentiment),
+        Benchmark("sentiment_analysis_chunked", lambda: len(sentiment_analysis_chunked(long_texts, batch_size=32))),
+        Benchmark("zero_shot_exact", zero_shot("exact")),
+        Benchmark("zero_shot_embedding", zero_shot("embedding")),
+        Benchmark("zero_shot_rerank", zero_shot("rerank")),
+    ]
+
+
+# torch・transformersのimportだけにかかる時間（importは1プロセスで1回きりなので、毎回新しいプロセスで測る）
+# 実行の時間（p50_sec）はプロセスの起動も含む。importだけの時間は子プロセスで測って、レイテンシの分位点に入れる
+IMPORT_MODELS_CODE = ("import time; start = time.perf_counter(); import torch; from transformers import pipeline; "
+                      "print(time.perf_counter() - start)")
+
+def import_torch_transformers() -> tuple[int, list[float]]:
+    process = subprocess.run([sys.executable, "-c", IMPORT_MODELS_CODE], capture_output=True, text=True, check=True)
+    return 1, [float(process.stdout.strip().splitlines()[-1])]
+
+
+# ===== コーパスの大きさによらないベンチマーク（fixtureのパース、ローカルサーバーからの取得、モデルのロード） =====
+def fixed_benchmarks(server_url: str) -> list[Benchmark]:
+    import pandas as pd
+    # モデルのロードの計測にimportの時間が混ざらないように、先にimportしておく（importの時間は別の段階で測る）
+    import torch
+    from transformers import pipeline
+    from article_fetcher import ArticleFetcher
+    from model_registry import get_pipeline, registry, SENTIMENT_MODEL, ZERO_SHOT_MODEL
+    from scraping_co_occurrence_network import (parse_search_results, parse_article_html, stream_cooccurrence,
+                                                get_search_results_http)
+
+    search_html = (FIXTURE_DIR / "prtimes_search.html").read_text(encoding="utf-8")
+    article_html = (FIXTURE_DIR / "prtimes_article.html").read_text(encoding="utf-8")
+    articles_list_df = pd.DataFrame(
+        [("株式会社サンプル", f"{server_url}/article/{i}") for i in range(FETCH_ARTICLES)], columns=["company_name", "url"]
+    )
+
+    def fetch_and_count():
+        # 記事の取得・パース・形態素解析・共起の集計まで（レート制限はかけずに、並列取得と集計の重なりを見る）
+        fetcher = ArticleFetcher(requests_per_second=10_000, concurrency=8)
+        try:
+            articles = []
+            for articles, _ in stream_cooccurrence(articles_list_df, fetcher, refresh_every=20):
+                pass
+            return len(articles), [r["seconds"] for r in fetcher.latencies]
+        finally:
+            fetcher.close()
+
+    def search_pages():
+        # 検索結果を2ページ分。サーバーはfixtureを保存したときのパラメータでしかページ送りしないので、
+        # アプリのSEARCH_PAGE_PARAMが違えばSearchPaginationErrorで止まる
+        fetcher = ArticleFetcher(requests_per_second=10_000)
+        try:
+            return len(get_search_results_http(f"{server_url}/search?search_word=x", max_pages=2, fetcher=fetcher))
+        finally:
+            fetcher.close()
+
+    def model_load(task, model_name):
+        def run():
+            get_pipeline(task, model_name)
+            return 1
+        return run
+
+    return [
+        Benchmark("parse_search_results", lambda: _timed_calls(parse_search_results, [(search_html,)] * PARSE_LOOPS),
+                  unit="pages"),
+        Benchmark("parse_article_html", lambda: _timed_calls(parse_article_html, [(article_html,)] * PARSE_LOOPS),
+                  unit="pages"),
+        Benchmark("search_results_http", search_pages, unit="articles"),
+        Benchmark("fetch_articles_local", fetch_and_count, unit="articles"),
+        Benchmark("import_torch_transformers", import_torch_transformers, unit="imports"),
+        Benchmark("model_load_sentiment", model_load("sentiment-analysis", SENTIMENT_MODEL), unit="models",
+                  setup=registry.clear),
+        Benchmark("model_load_zero_shot", model_load("zero-shot-classification", ZERO_SHOT_MODEL), unit="models",
+                  setup=registry.clear),
+    ]
+
+
+# ===== fixtureを返すローカルHTTPサーバー（ネットワークに出ずに取得の流れを計測する） =====
+# /search は検索結果の1ページ目、ページ番号が2なら2ページ目（3ページ目以降は404）、それ以外は記事ページを返す
+# ページ番号のパラメータ名は prtimes_search.json に、検索結果のページと一緒に記録しておく
+# （check_search_pagination.py --save で実際のページを保存したときのもの。合成のfixtureのあいだは "source": "synthetic"）
+SEARCH_FIXTURES = {None: "prtimes_search.html", "2": "prtimes_search_page2.html"}
+SEARCH_FIXTURE_META = json.loads((FIXTURE_DIR / "prtimes_search.json").read_text(encoding="utf-8"))
+
+class _FixtureHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        if url.path.startswith("/search"):
+            page = urllib.parse.parse_qs(url.query).get(SEARCH_FIXTURE_META["page_param"], [None])[0]
+            name = SEARCH_FIXTURES.get(page)
+        else:
+            name = "prtimes_article.html"
+        if name is None:
+            self.send_error(404)
+            return
+        body = (FIXTURE_DIR / name).read_bytes()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def fixture_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FixtureHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
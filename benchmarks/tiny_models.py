@@ -0,0 +1,40 @@
+from pathlib import Path
+from corpus import corpus_characters
+
+# ===== Transformerの段階用の小さな代わりのモデル（乱数の重み。精度ではなく処理の流れと速さを見るためのもの） =====
+# 本物と同じBERT系のアーキテクチャ・ラベルで、語彙はコーパスの文字だけ。ダウンロードせずにその場で作る
+SENTIMENT_LABELS = ["NEUTRAL", "NEGATIVE", "POSITIVE"]
+NLI_LABELS = ["entailment", "neutral", "contradiction"]
+TINY_CONFIG = dict(hidden_size=32, num_hidden_layers=2, num_attention_heads=2, intermediate_size=64,
+                   max_position_embeddings=512)
+
+
+def _write_vocab(path: Path) -> Path:
+    chars = sorted(corpus_characters() | set("このテキストはについて書かれています。"))
+    tokens = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + chars + [f"##{c}" for c in chars]
+    path.write_text("\n".join(tokens) + "\n", encoding="utf-8")
+    return path
+
+
+def build_tiny_model(output_dir: Path, labels: list[str], seed: int = 0) -> Path:
+    if (output_dir / "config.json").exists():
+        return output_dir
+    import torch
+    from transformers import BertConfig, BertForSequenceClassification, BertTokenizerFast
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    tokenizer = BertTokenizerFast(vocab_file=str(_write_vocab(output_dir / "vocab.txt")), do_lower_case=False,
+                                  tokenize_chinese_chars=True, model_max_length=512)
+    torch.manual_seed(seed)
+    config = BertConfig(vocab_size=tokenizer.vocab_size, id2label=dict(enumerate(labels)),
+                        label2id={label: i for i, label in enumerate(labels)}, **TINY_CONFIG)
+    BertForSequenceClassification(config).save_pretrained(output_dir)
+    tokenizer.save_pretrained(output_dir)
+    return output_dir
+
+
+def build_tiny_models(cache_dir: Path) -> dict[str, Path]:
+    return {
+        "sentiment": build_tiny_model(cache_dir / "sentiment", SENTIMENT_LABELS),
+        "zero_shot": build_tiny_model(cache_dir / "nli", NLI_LABELS),
+    }